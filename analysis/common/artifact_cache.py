@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of intermediate pipeline artifacts with LRU eviction.
+
+An artifact (one or more files plus a small JSON metadata dict) is stored under a key that hashes
+everything it was computed from: the content of the input files, the parameters and the code
+version (a hash of the source files of the computing script). A stage computes the key first and
+restores the cached files if the key is known, so re-running the pipeline after changing one
+parameter only recomputes the artifacts that depend on it.
+
+Layout of the cache directory:
+
+    objects/<k[:2]>/<key>/meta.json   files, sizes and metadata of the entry; its mtime is the
+                                      last use for the LRU eviction
+    objects/<k[:2]>/<key>/<name>      the cached files
+    digests.json                      sha256 of input files, keyed by path, size and mtime, so
+                                      unchanged inputs are only hashed once
+
+Entries may also hold no files, e.g. the HTTP validators (ETag, Last-Modified) of a download.
+When the total size exceeds --cache-max-mb, the least recently used entries are evicted.
+
+Scripts enable the cache with --cache-dir (or the ARTIFACT_CACHE_DIR environment variable):
+
+    from artifact_cache import add_cache_arguments, open_cache, code_version
+
+    cache = open_cache(args)
+    key = cache.key(inputs=[csv_file], params={'window': 7}, code=code_version(__file__))
+    if cache.restore(key, {'result.csv': output_file}) is None:
+        ...compute output_file...
+        cache.put(key, {'result.csv': output_file})
+
+Commands:
+    python artifact_cache.py stats --cache-dir ./data/cache
+    python artifact_cache.py evict --cache-dir ./data/cache --max-mb 2048
+    python artifact_cache.py clear --cache-dir ./data/cache
+"""
+
+import os
+import json
+import time
+import atexit
+import shutil
+import hashlib
+import argparse
+from pathlib import Path
+
+from instrumentation import count
+
+# Bump to invalidate all keys, e.g. when the key derivation changes
+KEY_VERSION = 1
+DEFAULT_MAX_MB = 10240
+META_NAME = 'meta.json'
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Inspect and maintain the artifact cache.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    stats = subparsers.add_parser('stats', help='Print the number and size of the cached artifacts')
+    stats.add_argument('--cache-dir', type=str, required=True, help='Cache directory')
+
+    evict = subparsers.add_parser('evict', help='Evict the least recently used artifacts down to a size')
+    evict.add_argument('--cache-dir', type=str, required=True, help='Cache directory')
+    evict.add_argument('--max-mb', type=float, required=True, help='Size to evict down to in MB')
+
+    clear = subparsers.add_parser('clear', help='Remove all cached artifacts')
+    clear.add_argument('--cache-dir', type=str, required=True, help='Cache directory')
+    return parser.parse_args()
+
+
+def sha256_file(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def code_version(*paths):
+    """Hash of source files, used as the code part of a key."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class ArtifactCache:
+    """Content-addressed artifacts in a directory, evicted least recently used first."""
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.root = Path(root)
+        self.objects = self.root / 'objects'
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._total_bytes = None
+        self._digests_path = self.root / 'digests.json'
+        self._digests = {}
+        self._digests_changed = False
+        if self._digests_path.exists():
+            with open(self._digests_path, 'r', encoding='utf-8') as f:
+                self._digests = json.load(f)
+
+    def file_digest(self, path):
+        """sha256 of a file, computed once per path, size and modification time."""
+        path = Path(path).resolve()
+        stat = path.stat()
+        cached = self._digests.get(str(path))
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = sha256_file(path)
+        self._digests[str(path)] = [stat.st_size, stat.st_mtime_ns, digest]
+        self._digests_changed = True
+        return digest
+
+    def save_digests(self):
+        if not self._digests_changed:
+            return
+        tmp_path = self._digests_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._digests, f)
+        tmp_path.replace(self._digests_path)
+        self._digests_changed = False
+
+    def key(self, inputs=(), params=None, code=None):
+        """Key of an artifact computed from the given input files, parameters and code version."""
+        digest = hashlib.sha256(f"artifact-cache-v{KEY_VERSION}".encode())
+        for path in inputs:
+            digest.update(self.file_digest(path).encode())
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        digest.update(str(code).encode())
+        return digest.hexdigest()
+
+    def entry_dir(self, key):
+        return self.objects / key[:2] / key
+
+    def lookup(self, key):
+        """Return the metadata of an entry and mark it as used, or None if the key is unknown."""
+        meta_path = self.entry_dir(key) / META_NAME
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            count(cache_misses=1)
+            return None
+        os.utime(meta_path)
+        count(cache_hits=1)
+        return entry['meta']
+
+    def path(self, key, name):
+        """Path of a cached file, or None if the entry has no such file."""
+        path = self.entry_dir(key) / name
+        return path if path.exists() else None
+
+    def copy_out(self, key, name, destination):
+        """Copy a cached file to its destination atomically, returns False if it is not cached."""
+        source = self.path(key, name)
+        if source is None:
+            return False
+        Path(destination).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = Path(f"{destination}.tmp")
+        shutil.copyfile(source, tmp_path)
+        tmp_path.replace(destination)
+        return True
+
+    def restore(self, key, destinations=None):
+        """Copy the files of an entry to their destinations ({name: path}).
+
+        Returns the metadata of the entry, or None if the key is unknown or a file is missing.
+        """
+        meta = self.lookup(key)
+        if meta is None:
+            return None
+        for name, destination in (destinations or {}).items():
+            if not self.copy_out(key, name, destination):
+                return None
+        return meta
+
+    def put(self, key, files=None, meta=None):
+        """Store files ({name: path}) and metadata under a key, then evict down to the size limit."""
+        files = files or {}
+        entry_dir = self.entry_dir(key)
+        tmp_dir = self.root / 'tmp' / f"{key}.{os.getpid()}"
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+
+        size = 0
+        for name, path in files.items():
+            shutil.copyfile(path, tmp_dir / name)
+            size += (tmp_dir / name).stat().st_size
+        with open(tmp_dir / META_NAME, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'created': time.time(), 'size': size, 'files': sorted(files),
+                       'meta': meta or {}}, f, default=str)
+
+        old_size = self._entry_size(entry_dir)
+        if old_size is not None:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        entry_dir.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            tmp_dir.rename(entry_dir)
+        except OSError:
+            # Stored by a concurrent run in the meantime
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        if self._total_bytes is not None:
+            self._total_bytes += size - (old_size or 0)
+        if self.total_bytes() > self.max_bytes:
+            self.evict(self.max_bytes)
+
+    def _entry_size(self, entry_dir):
+        try:
+            with open(entry_dir / META_NAME, 'r', encoding='utf-8') as f:
+                return json.load(f)['size']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def entries(self):
+        """Return (last use, size, entry directory) of all entries."""
+        entries = []
+        for meta_path in self.objects.glob(f"*/*/{META_NAME}"):
+            size = self._entry_size(meta_path.parent)
+            if size is not None:
+                entries.append((meta_path.stat().st_mtime, size, meta_path.parent))
+        return entries
+
+    def total_bytes(self):
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self.entries())
+        return self._total_bytes
+
+    def evict(self, max_bytes):
+        """Remove the least recently used entries until the cache is at most max_bytes large."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, entry_dir in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            evicted += 1
+        self._total_bytes = total
+        if evicted:
+            count(cache_evictions=evicted)
+        return evicted
+
+    def clear(self):
+        shutil.rmtree(self.objects, ignore_errors=True)
+        self._digests_path.unlink(missing_ok=True)
+        self._digests, self._total_bytes = {}, 0
+
+
+def conditional_headers(validators):
+    """Request headers that make a server answer 304 if a download is unchanged."""
+    headers = {}
+    if validators and validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators and validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+def http_validators(response):
+    """ETag and Last-Modified of a response, stored as cache metadata of a download."""
+    return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+
+def add_cache_arguments(parser):
+    """Add --cache-dir and --cache-max-mb to an argument parser."""
+    parser.add_argument('--cache-dir', type=str, default=os.environ.get('ARTIFACT_CACHE_DIR'),
+                        help='Reuse results of earlier runs with the same inputs, parameters and code from this cache')
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_MB,
+                        help='Size limit of the cache, least recently used artifacts are evicted beyond it')
+
+
+def open_cache(args):
+    """Open the cache configured by add_cache_arguments(), or return None if it is disabled."""
+    if not getattr(args, 'cache_dir', None):
+        return None
+    cache = ArtifactCache(args.cache_dir, int(args.cache_max_mb * 1024 * 1024))
+    atexit.register(cache.save_digests)
+    return cache
+
+
+def main():
+    args = parse_arguments()
+    cache = ArtifactCache(args.cache_dir)
+
+    if args.command == 'stats':
+        entries = cache.entries()
+        print(f"{len(entries)} artifacts, {sum(size for _, size, _ in entries) / 1e6:.1f} MB in {cache.root}")
+    elif args.command == 'evict':
+        evicted = cache.evict(int(args.max_mb * 1024 * 1024))
+        print(f"Evicted {evicted} artifacts, {cache.total_bytes() / 1e6:.1f} MB left")
+    else:
+        cache.clear()
+        print(f"Cleared {cache.root}")
+
+
+if __name__ == "__main__":
+    main()
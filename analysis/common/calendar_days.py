@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Leap-year calendar of the day-of-year climatology.
+
+Every date is mapped to one of 366 calendar days, 0 (Jan 1) to 365 (Dec 31), as if every year
+were a leap year: Feb 29 is 59 and Mar 1 is 60 in every year, common years skip index 59. The
+same calendar day therefore has the same index in all years. calculate_climatology.py writes the
+climatology on this calendar, compute_live_anomalies.py and the day-of-year queries of
+climate_store.py read it.
+"""
+
+CALENDAR_DAYS = 366
+# Index of Mar 1 on the leap-year calendar
+MARCH_FIRST = 60
+
+
+def is_leap_year(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def calendar_day_index(date):
+    """Map a date (or datetime) to 0..365 on the leap-year calendar."""
+    index = date.timetuple().tm_yday - 1
+    return index + 1 if not is_leap_year(date.year) and index >= MARCH_FIRST - 1 else index
+
+
+def calendar_day_indices(dates):
+    """Map an array of dates (datetime64, DatetimeIndex) to 0..365 on the leap-year calendar."""
+    # numpy is imported on use, the store and the station job only need calendar_day_index()
+    import numpy as np
+
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    years = dates.astype('datetime64[Y]')
+    index = (dates - years.astype('datetime64[D]')).astype(np.int64)
+    year = years.astype(np.int64) + 1970
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    # In common years every day from Mar 1 on is shifted by the missing Feb 29
+    return np.where(~leap & (index >= MARCH_FIRST - 1), index + 1, index)
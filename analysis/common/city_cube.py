@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped cube of daily city time series (city x day x param, float32).
+
+A cube consists of two files:
+
+    <name>.f32   raw little-endian float32 values in C order, NaN for missing values
+    <name>.json  header with the shape, the date origin, the parameter names and one entry
+                 per city (id, name, grid cell)
+
+Readers map the data file with `numpy.memmap`, so slicing a city or a date range neither parses
+nor copies anything until the values are used.
+
+Commands:
+    python city_cube.py info --cube ./data/cities
+    python city_cube.py export --cube ./data/cities --city-id berlin --output-file berlin.csv
+"""
+
+import json
+import argparse
+import datetime
+from pathlib import Path
+
+import numpy as np
+
+CUBE_VERSION = 1
+DTYPE = '<f4'
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Inspect and export memory-mapped city cubes.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    info = subparsers.add_parser('info', help='Print the header of a cube')
+    info.add_argument('--cube', type=str, required=True, help='Path of the cube without extension')
+
+    export = subparsers.add_parser('export', help='Export the series of one city as CSV')
+    export.add_argument('--cube', type=str, required=True, help='Path of the cube without extension')
+    export.add_argument('--city-id', type=str, required=True, help='City to export')
+    export.add_argument('--start-date', type=str, help='First date to export (YYYY-MM-DD)')
+    export.add_argument('--end-date', type=str, help='Last date to export (YYYY-MM-DD)')
+    export.add_argument('--output-file', type=str, required=True, help='Output CSV file')
+    return parser.parse_args()
+
+
+def to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+class CityCube:
+    """A city x day x param float32 array on disk with its header."""
+
+    def __init__(self, path, header, data):
+        self.path = Path(path)
+        self.header = header
+        self.data = data
+        self.origin = to_date(header['date_origin'])
+        self.params = list(header['params'])
+        self.cities = header['cities']
+        self._rows = {city['id']: row for row, city in enumerate(self.cities)}
+
+    @staticmethod
+    def header_path(path):
+        return Path(f"{path}.json")
+
+    @staticmethod
+    def data_path(path):
+        return Path(f"{path}.f32")
+
+    @classmethod
+    def create(cls, path, cities, params, start_date, end_date):
+        """Create an empty (all NaN) cube for the given cities and parameters.
+
+        `cities` is a list of dicts with at least an 'id' and optionally 'name', 'grid_y', 'grid_x'.
+        """
+        start_date, end_date = to_date(start_date), to_date(end_date)
+        days = (end_date - start_date).days + 1
+        header = {
+            'version': CUBE_VERSION,
+            'dtype': DTYPE,
+            'shape': [len(cities), days, len(params)],
+            'date_origin': start_date.isoformat(),
+            'params': list(params),
+            'cities': [{'id': city['id'], 'name': city.get('name', city['id']),
+                        'grid_y': city.get('grid_y'), 'grid_x': city.get('grid_x')} for city in cities],
+        }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = np.memmap(cls.data_path(path), dtype=DTYPE, mode='w+', shape=tuple(header['shape']))
+        data[:] = np.nan
+        cube = cls(path, header, data)
+        cube.write_header()
+        return cube
+
+    @classmethod
+    def open(cls, path, mode='r'):
+        """Open an existing cube read-only ('r') or for updates ('r+')."""
+        with open(cls.header_path(path), 'r', encoding='utf-8') as f:
+            header = json.load(f)
+        if header.get('version') != CUBE_VERSION:
+            raise ValueError(f"Unsupported city cube version {header.get('version')} in {path}")
+        data = np.memmap(cls.data_path(path), dtype=header['dtype'], mode=mode, shape=tuple(header['shape']))
+        return cls(path, header, data)
+
+    def write_header(self):
+        """Write the header atomically, e.g. after updating the grid cells of the cities."""
+        header_path = self.header_path(self.path)
+        tmp_path = header_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.header, f, indent=1, ensure_ascii=False)
+        tmp_path.replace(header_path)
+
+    def flush(self):
+        self.data.flush()
+        self.write_header()
+
+    @property
+    def days(self):
+        return self.data.shape[1]
+
+    def row(self, city_id):
+        return self._rows[city_id]
+
+    def day_index(self, date):
+        return (to_date(date) - self.origin).days
+
+    def day_range(self, start_date=None, end_date=None):
+        """Return the slice of days between two dates (inclusive), clamped to the cube."""
+        start = 0 if start_date is None else max(self.day_index(start_date), 0)
+        stop = self.days if end_date is None else min(self.day_index(end_date) + 1, self.days)
+        return slice(start, max(start, stop))
+
+    def dates(self, start_date=None, end_date=None):
+        """Return the dates of a day range as a numpy datetime64[D] array."""
+        days = self.day_range(start_date, end_date)
+        return np.datetime64(self.origin, 'D') + np.arange(days.start, days.stop)
+
+    def series(self, city_id, start_date=None, end_date=None, param=None):
+        """Return a zero-copy (days, params) view of a city, or (days,) for a single parameter."""
+        view = self.data[self.row(city_id), self.day_range(start_date, end_date)]
+        return view if param is None else view[:, self.params.index(param)]
+
+    def write(self, city_id, dates, param, values):
+        """Write the values of one parameter of a city at the given dates."""
+        offsets = (np.asarray(dates, dtype='datetime64[D]') - np.datetime64(self.origin, 'D')).astype(np.int64)
+        inside = (offsets >= 0) & (offsets < self.days)
+        self.data[self.row(city_id), offsets[inside], self.params.index(param)] = np.asarray(values)[inside]
+
+    def set_city(self, city_id, **fields):
+        """Update header fields of a city (e.g. grid_y, grid_x). Call flush() to persist them."""
+        self.cities[self.row(city_id)].update(fields)
+
+
+def main():
+    args = parse_arguments()
+    cube = CityCube.open(args.cube)
+
+    if args.command == 'info':
+        cities, days, params = cube.data.shape
+        print(f"{cities} cities x {days} days x {params} params ({cube.data.nbytes / 1e6:.1f} MB)")
+        print(f"Dates: {cube.origin} to {cube.origin + datetime.timedelta(days=days - 1)}")
+        print(f"Params: {', '.join(cube.params)}")
+        return
+
+    values = cube.series(args.city_id, args.start_date, args.end_date)
+    dates = cube.dates(args.start_date, args.end_date)
+    with open(args.output_file, 'w', encoding='utf-8') as f:
+        f.write(','.join(['date'] + cube.params) + '\n')
+        for date, row in zip(dates, values):
+            f.write(','.join([str(date)] + ['' if np.isnan(v) else f"{v:.2f}" for v in row]) + '\n')
+    print(f"Exported {len(dates)} days of {args.city_id} to {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Vectorized quality checks of station and grid series.
+
+Every check works on an array with time on the first axis, so the same code checks the
+(readings, columns) matrix of a station product file (dwd_datasets.read_product_file() in
+analysis/stations) and (time, y, x) blocks of a HYRAS grid:
+
+    missing        missing value marker of the DWD files, NaN in a grid cell inside the domain
+    malformed      field that is neither a number nor the missing value marker
+    unverified     reading with QN_* quality level 1, only formal checks by the DWD
+    out_of_range   outside the physical range of the measurement
+    spike          jumps away from both neighbours by more than the step limit, in opposite directions
+    step           jumps by more than the step limit and stays there
+    stuck          part of a run of identical readings at least as long as the stuck limit
+
+Range, step and stuck limits depend on the measurement and the resolution of the series, see
+QUALITY_RULES; measurements without a rule are only checked for missing and malformed values.
+Consecutive readings are compared in file order, a missing reading ends a comparison.
+Out-of-range readings and spikes are invalid, the other checks only count suspicious readings.
+
+check_product() returns one summary row per file and column, summarize() adds them up per
+station, file or source. The station extractors write them with --quality-file, grid files are
+checked with this script:
+
+    python data_quality.py --files ./data/netcdf/tasmax_hyras_5_2020_v5-0_de.nc --output-file grid_quality.csv
+"""
+
+import csv
+import argparse
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from instrumentation import add_report_arguments, configure_report, count, stage
+
+CHECKS = ('missing', 'malformed', 'unverified', 'out_of_range', 'spike', 'step', 'stuck')
+INVALID_CHECKS = ('out_of_range', 'spike')
+# QN 1: only formal control, all higher levels have passed the DWD's own checks
+UNVERIFIED_QUALITY_LEVELS = (1,)
+QUALITY_FIELDS = ['source', 'station_id', 'column', 'name', 'readings', *CHECKS, 'valid']
+
+
+class QualityRule(NamedTuple):
+    min_value: float
+    max_value: float
+    # Largest plausible change between consecutive readings by resolution ('10min', 'hourly', 'daily')
+    max_step: dict = None
+    # Shortest run of identical readings that counts as a stuck sensor, by resolution
+    stuck_run: dict = None
+
+
+TEMPERATURE = QualityRule(-45.0, 45.0, {'10min': 4.0, 'hourly': 8.0, 'daily': 15.0},
+                          {'10min': 36, 'hourly': 8, 'daily': 5})
+GROUND_TEMPERATURE = QualityRule(-50.0, 60.0, {'10min': 6.0, 'hourly': 12.0, 'daily': 20.0},
+                                 {'10min': 36, 'hourly': 8, 'daily': 5})
+
+# Output names of dwd_datasets.py and GRID_VARIABLES -> rule
+QUALITY_RULES = {
+    'temperature': TEMPERATURE,
+    'max_temperature': TEMPERATURE,
+    'min_temperature': TEMPERATURE,
+    'dew_point': QualityRule(-50.0, 35.0, TEMPERATURE.max_step, TEMPERATURE.stuck_run),
+    'ground_temperature': GROUND_TEMPERATURE,
+    'min_ground_temperature': GROUND_TEMPERATURE,
+    # Fog and dry spells keep humidity constant for hours, only long runs are suspicious
+    'humidity': QualityRule(0.0, 100.0, {'10min': 25.0, 'hourly': 40.0}, {'10min': 144, 'hourly': 24}),
+    # Station height pressure, down to ~700 hPa on the Zugspitze
+    'pressure': QualityRule(600.0, 1100.0, {'10min': 3.0, 'hourly': 6.0, 'daily': 30.0},
+                            {'10min': 36, 'hourly': 12}),
+    'vapour_pressure': QualityRule(0.0, 60.0),
+    'cloud_cover': QualityRule(0.0, 8.0),
+    'wind_speed': QualityRule(0.0, 60.0),
+    'max_wind_gust': QualityRule(0.0, 90.0),
+    'precipitation': QualityRule(0.0, 300.0),
+    'sunshine_duration': QualityRule(0.0, 24.0),
+    'snow_depth': QualityRule(0.0, 1000.0),
+}
+
+# HYRAS variable -> rule name, grids are daily
+GRID_VARIABLES = {
+    'tas': 'temperature',
+    'tasmax': 'max_temperature',
+    'tasmin': 'min_temperature',
+    'hurs': 'humidity',
+    'pr': 'precipitation',
+}
+GRID_RESOLUTION = 'daily'
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Check HYRAS grid files and write a quality summary.')
+    parser.add_argument('--files', type=str, nargs='+', required=True, help='HYRAS NetCDF files')
+    parser.add_argument('--variable', type=str,
+                        help=f"Variable to check, default: all of {', '.join(GRID_VARIABLES)} in the file")
+    parser.add_argument('--output-file', type=str, help='Optional CSV file for the summary of every file')
+    parser.add_argument('--rows-per-chunk', type=int, default=64,
+                        help='Grid rows read at once, all time steps of a chunk are held in memory')
+    add_report_arguments(parser)
+    return parser.parse_args()
+
+
+def spikes_and_steps(values, max_step):
+    """Masks of spikes and steps along the first axis."""
+    spike = np.zeros(values.shape, dtype=bool)
+    step = np.zeros(values.shape, dtype=bool)
+    if len(values) < 2:
+        return spike, step
+    jumps = np.diff(values, axis=0)
+    large = np.abs(jumps) > max_step
+    # Reading i is a spike if the jumps into and out of it are both large and in opposite directions
+    spike[1:-1] = large[:-1] & large[1:] & (np.sign(jumps[:-1]) != np.sign(jumps[1:]))
+    # Other large jumps are steps, flagged at the reading after the jump
+    step[1:] = large & ~spike[1:] & ~spike[:-1]
+    return spike, step
+
+
+def stuck_runs(values, min_run):
+    """Mask of the readings in runs of at least min_run identical values along the first axis."""
+    length = len(values)
+    if length < min_run:
+        return np.zeros(values.shape, dtype=bool)
+    same = values[1:] == values[:-1]
+    edge = np.zeros((1,) + values.shape[1:], dtype=bool)
+    index = np.broadcast_to(np.arange(length).reshape((-1,) + (1,) * (values.ndim - 1)), values.shape)
+    # Index of the first and the last reading of the run every reading belongs to
+    first = np.maximum.accumulate(np.where(np.concatenate([edge, same]), 0, index), axis=0)
+    last = np.minimum.accumulate(np.where(np.concatenate([same, edge]), length - 1, index)[::-1], axis=0)[::-1]
+    return np.isfinite(values) & (last - first + 1 >= min_run)
+
+
+def check_values(values, rule, resolution):
+    """Masks {check: bool array} of the range, spike, step and stuck checks of a series.
+
+    values has time on the first axis and any number of other axes (columns, grid cells) that
+    share the rule. Returns an empty dict without a rule.
+    """
+    if rule is None:
+        return {}
+    masks = {'out_of_range': (values < rule.min_value) | (values > rule.max_value)}
+    max_step = (rule.max_step or {}).get(resolution)
+    if max_step is not None:
+        masks['spike'], masks['step'] = spikes_and_steps(values, max_step)
+    stuck_run = (rule.stuck_run or {}).get(resolution)
+    if stuck_run is not None:
+        masks['stuck'] = stuck_runs(values, stuck_run)
+    return masks
+
+
+def invalid_mask(masks, shape):
+    """Readings that fail one of the INVALID_CHECKS."""
+    invalid = np.zeros(shape, dtype=bool)
+    for check in INVALID_CHECKS:
+        if check in masks:
+            invalid |= masks[check]
+    return invalid
+
+
+def check_product(product, spec, source='', station_id=''):
+    """Check a parsed station product file (dwd_datasets.ProductFile).
+
+    Returns (rows, invalid): a summary row per measurement column with the counts of every check,
+    and a mask of the invalid readings in the shape of product.values.
+    """
+    values = product.values
+    malformed = np.isnan(values) & ~product.markers
+    unverified = np.isin(product.flags, UNVERIFIED_QUALITY_LEVELS) & np.isfinite(values)
+    invalid = np.zeros(values.shape, dtype=bool)
+
+    rows = []
+    for position, column in enumerate(product.columns):
+        name = spec.column_name(column)
+        masks = check_values(values[:, position], QUALITY_RULES.get(name), spec.name)
+        masks.update(missing=product.markers[:, position], malformed=malformed[:, position],
+                     unverified=unverified[:, position])
+        invalid[:, position] = invalid_mask(masks, len(values))
+        counts = {check: int(masks[check].sum()) if check in masks else 0 for check in CHECKS}
+        rows.append({'source': str(source), 'station_id': station_id, 'column': column, 'name': name,
+                     'readings': len(values), **counts,
+                     'valid': int(np.isfinite(values[:, position]).sum() - invalid[:, position].sum())})
+    return rows, invalid
+
+
+def check_grid_file(file_path, variable=None, rows_per_chunk=64):
+    """Check the variables of a HYRAS NetCDF file, returns a summary row per variable.
+
+    Cells that are NaN at every time step lie outside the domain and are not counted. The grid is
+    read in chunks of rows_per_chunk rows with all time steps, the checks run along time.
+    """
+    # xarray is only needed for grids (the 'grids' extra), the station job never imports it
+    import xarray as xr
+
+    rows = []
+    with xr.open_dataset(file_path) as ds:
+        variables = [variable] if variable else [name for name in GRID_VARIABLES if name in ds.data_vars]
+        for name in variables:
+            data = ds[name]
+            if 'bnds' in data.dims:
+                data = data.isel(bnds=0)
+            data = data.transpose('time', ...)
+            rule_name = GRID_VARIABLES.get(name, name)
+            rule = QUALITY_RULES.get(rule_name)
+            row_dim = data.dims[1]
+
+            counts = dict.fromkeys(CHECKS, 0)
+            readings = valid = 0
+            for start in range(0, data.sizes[row_dim], rows_per_chunk):
+                block = data.isel({row_dim: slice(start, start + rows_per_chunk)}).values
+                domain = np.isfinite(block).any(axis=0)
+                masks = check_values(block, rule, GRID_RESOLUTION)
+                masks['missing'] = np.isnan(block) & domain
+                for check, mask in masks.items():
+                    counts[check] += int(mask.sum())
+                readings += len(block) * int(domain.sum())
+                valid += int(np.isfinite(block).sum() - invalid_mask(masks, block.shape).sum())
+            rows.append({'source': Path(file_path).name, 'station_id': '', 'column': name, 'name': rule_name,
+                         'readings': readings, **counts, 'valid': valid})
+    return rows
+
+
+def summarize(rows, key='source'):
+    """Add up the readings and check counts of summary rows per key, e.g. 'station_id' or 'source'."""
+    totals = {}
+    for row in rows:
+        total = totals.setdefault(row[key], dict.fromkeys(['readings', *CHECKS, 'valid'], 0))
+        for field in total:
+            total[field] += row[field]
+    return totals
+
+
+def format_totals(total):
+    """One-line description of the totals of summarize()."""
+    flagged = ', '.join(f"{total[check]} {check}" for check in CHECKS if total[check])
+    return f"{total['readings']} readings, {total['valid']} valid" + (f", {flagged}" if flagged else '')
+
+
+def quality_counters(rows):
+    """Counters of all rows for instrumentation.count(), e.g. quality_missing."""
+    total = dict.fromkeys(CHECKS, 0)
+    for row in rows:
+        for check in CHECKS:
+            total[check] += row[check]
+    return {f"quality_{check}": value for check, value in total.items()}
+
+
+def write_quality_csv(rows, output_file):
+    """Write summary rows to a CSV file, replacing it in one step."""
+    output_path = Path(output_file)
+    tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=QUALITY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    tmp_path.replace(output_path)
+    print(f"Wrote quality summary of {len(rows)} columns to {output_file}")
+
+
+def main():
+    args = parse_arguments()
+    configure_report('data_quality', args)
+
+    rows = []
+    for file_path in args.files:
+        with stage('check'):
+            file_rows = check_grid_file(file_path, args.variable, args.rows_per_chunk)
+            count(files=1, rows=sum(row['readings'] for row in file_rows), **quality_counters(file_rows))
+        for row in file_rows:
+            print(f"{row['source']} {row['column']}: {format_totals(summarize([row])[row['source']])}")
+        rows.extend(file_rows)
+
+    if args.output_file:
+        write_quality_csv(rows, args.output_file)
+
+
+if __name__ == "__main__":
+    main()
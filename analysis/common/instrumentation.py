@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Stage-level timing and resource accounting for the analysis scripts.
+
+Scripts wrap their phases in stages and report what they processed:
+
+    from instrumentation import add_report_arguments, configure_report, stage, count
+
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    configure_report('fetch_station_data', args)
+
+    with stage('download'):
+        response = requests.get(url)
+        count(http_requests=1, http_bytes=len(response.content))
+
+Every stage records its wall time, CPU time (including finished child processes), the bytes
+read and written by the process (rchar/wchar of /proc/self/io, so socket traffic is included;
+zero where /proc is not available), the peak RSS of the process at the end of the stage and the
+counters passed to count(). A stage that is entered repeatedly, e.g. once per city, accumulates
+its totals; nested stages are named 'outer/inner'. Counters outside of any stage are added to
+the run totals only.
+
+With --report-file (or the RUN_REPORT_FILE environment variable) the report is written as JSON
+when the script exits, with --prometheus-file (or RUN_PROMETHEUS_FILE) additionally in the
+Prometheus text format for the node_exporter textfile collector. The status of the run is
+'failed' when the script exits through an uncaught exception or sys.exit() with a non-zero
+status, or calls set_status('failed') for an error it handles itself.
+
+Commands:
+    python instrumentation.py show --report-file ./data/reports/extract_hyras_data.json
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import datetime
+import resource
+import contextlib
+from pathlib import Path
+
+REPORT_VERSION = 1
+# Prefix of the Prometheus metric names
+METRIC_PREFIX = 'ziemlichwarmhier'
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Show run reports of the analysis scripts.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    show = subparsers.add_parser('show', help='Print the stages of a run report')
+    show.add_argument('--report-file', type=str, required=True, help='JSON run report')
+    return parser.parse_args()
+
+
+def read_io_counters():
+    """Return (bytes read, bytes written) of this process so far, (0, 0) without /proc."""
+    try:
+        with open('/proc/self/io', 'r', encoding='ascii') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def cpu_seconds():
+    """User and system CPU time of this process and its finished children."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+class RunReport:
+    """Stages and counters of one run of a script."""
+
+    def __init__(self, job):
+        self.job = job
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self.start_wall = time.perf_counter()
+        self.start_cpu = cpu_seconds()
+        self.start_io = read_io_counters()
+        self.stages = {}
+        self.counters = {}
+        self.status = 'ok'
+        self._active = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Measure the enclosed block as the stage `name`."""
+        full_name = '/'.join(self._active + [name])
+        entry = self.stages.setdefault(full_name, {
+            'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+            'bytes_read': 0, 'bytes_written': 0, 'peak_rss_mb': 0.0, 'counters': {},
+        })
+        self._active.append(name)
+        start_wall, start_cpu, (start_read, start_written) = time.perf_counter(), cpu_seconds(), read_io_counters()
+        try:
+            yield entry
+        except BaseException as e:
+            if not (isinstance(e, SystemExit) and e.code in (0, None)):
+                self.status = 'failed'
+            raise
+        finally:
+            end_read, end_written = read_io_counters()
+            entry['calls'] += 1
+            entry['wall_seconds'] += time.perf_counter() - start_wall
+            entry['cpu_seconds'] += cpu_seconds() - start_cpu
+            entry['bytes_read'] += end_read - start_read
+            entry['bytes_written'] += end_written - start_written
+            entry['peak_rss_mb'] = max(entry['peak_rss_mb'], peak_rss_mb())
+            self._active.pop()
+
+    def count(self, **counters):
+        """Add to the counters of the innermost active stage and of the run."""
+        targets = [self.counters]
+        if self._active:
+            targets.append(self.stages['/'.join(self._active)]['counters'])
+        for target in targets:
+            for key, value in counters.items():
+                target[key] = target.get(key, 0) + value
+
+    def to_dict(self):
+        end_read, end_written = read_io_counters()
+        return {
+            'version': REPORT_VERSION,
+            'job': self.job,
+            'host': os.uname().nodename,
+            'pid': os.getpid(),
+            'started': self.started.isoformat(timespec='seconds'),
+            'status': self.status,
+            'wall_seconds': round(time.perf_counter() - self.start_wall, 6),
+            'cpu_seconds': round(cpu_seconds() - self.start_cpu, 6),
+            'bytes_read': end_read - self.start_io[0],
+            'bytes_written': end_written - self.start_io[1],
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'counters': self.counters,
+            'stages': [dict(name=name, **{key: round(value, 6) if isinstance(value, float) else value
+                                          for key, value in entry.items()})
+                       for name, entry in self.stages.items()],
+        }
+
+    def to_prometheus(self):
+        """Render the report in the Prometheus text exposition format."""
+        data = self.to_dict()
+        job = data['job']
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{METRIC_PREFIX}_{name}{{{label_text}}} {value}")
+
+        metric('run_wall_seconds', 'Wall time of the run.', [({'job': job}, data['wall_seconds'])])
+        metric('run_cpu_seconds', 'CPU time of the run.', [({'job': job}, data['cpu_seconds'])])
+        metric('run_peak_rss_megabytes', 'Peak resident set size of the run.', [({'job': job}, data['peak_rss_mb'])])
+        metric('run_success', 'Whether the run finished without an error.',
+               [({'job': job}, int(data['status'] == 'ok'))])
+        metric('run_last_start_timestamp_seconds', 'Start of the run.',
+               [({'job': job}, int(self.started.timestamp()))])
+
+        stages = data['stages']
+        for key, help_text in (('wall_seconds', 'Wall time of the stage.'),
+                               ('cpu_seconds', 'CPU time of the stage.'),
+                               ('bytes_read', 'Bytes read during the stage.'),
+                               ('bytes_written', 'Bytes written during the stage.'),
+                               ('calls', 'Times the stage was entered.')):
+            metric(f"stage_{key}", help_text, [({'job': job, 'stage': entry['name']}, entry[key]) for entry in stages])
+
+        counter_samples = [({'job': job, 'stage': entry['name'], 'counter': name}, value)
+                           for entry in stages for name, value in entry['counters'].items()]
+        if counter_samples:
+            metric('stage_counter', 'Counters reported by the stage, e.g. rows or http_requests.', counter_samples)
+        return '\n'.join(lines) + '\n'
+
+
+def write_atomic(path, text):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    tmp_path.replace(path)
+
+
+# Report of the current process, used by the module-level functions below
+report = RunReport(Path(sys.argv[0]).stem or 'python')
+
+
+def stage(name):
+    """Measure the enclosed block as a stage of the current run, see RunReport.stage()."""
+    return report.stage(name)
+
+
+def count(**counters):
+    """Add counters, e.g. rows=1000 or http_requests=1, to the active stage of the current run."""
+    report.count(**counters)
+
+
+def set_status(status):
+    """Set the status of the current run, e.g. 'failed' for errors that are handled without an exception."""
+    report.status = status
+
+
+def record_exit_status():
+    """Mark the current run as failed when the process ends with an uncaught exception or a non-zero sys.exit().
+
+    atexit handlers do not see how the process ends, so the exception hook and sys.exit() are
+    wrapped instead, once per process.
+    """
+    if getattr(sys.excepthook, 'records_exit_status', False):
+        return
+    previous_excepthook, previous_exit = sys.excepthook, sys.exit
+
+    def excepthook(exc_type, exc, traceback):
+        report.status = 'failed'
+        previous_excepthook(exc_type, exc, traceback)
+
+    def exit(status=None):
+        if status not in (0, None):
+            report.status = 'failed'
+        previous_exit(status)
+
+    excepthook.records_exit_status = True
+    sys.excepthook, sys.exit = excepthook, exit
+
+
+def add_report_arguments(parser):
+    """Add --report-file and --prometheus-file to an argument parser."""
+    parser.add_argument('--report-file', type=str, default=os.environ.get('RUN_REPORT_FILE'),
+                        help='Write a JSON run report with per-stage timings to this file')
+    parser.add_argument('--prometheus-file', type=str, default=os.environ.get('RUN_PROMETHEUS_FILE'),
+                        help='Write the run report as a Prometheus textfile to this file')
+
+
+def configure_report(job, args):
+    """Name the current run and write its report files when the process exits."""
+    report.job = job
+    record_exit_status()
+    report_file = getattr(args, 'report_file', None)
+    prometheus_file = getattr(args, 'prometheus_file', None)
+    if report_file or prometheus_file:
+        atexit.register(write_report, report_file, prometheus_file)
+
+
+def write_report(report_file=None, prometheus_file=None):
+    """Write the report of the current run."""
+    if report_file:
+        write_atomic(report_file, json.dumps(report.to_dict(), indent=1) + '\n')
+    if prometheus_file:
+        write_atomic(prometheus_file, report.to_prometheus())
+
+
+def print_report(data):
+    print(f"{data['job']} started {data['started']} ({data['status']}): {data['wall_seconds']:.1f}s wall, "
+          f"{data['cpu_seconds']:.1f}s CPU, peak RSS {data['peak_rss_mb']:.0f} MB")
+    print(f"{'stage':<32} {'calls':>7} {'wall s':>9} {'cpu s':>9} {'read MB':>9} {'written MB':>10}  counters")
+    for entry in data['stages']:
+        counters = ', '.join(f"{key}={value}" for key, value in entry['counters'].items())
+        print(f"{entry['name']:<32} {entry['calls']:>7} {entry['wall_seconds']:>9.2f} {entry['cpu_seconds']:>9.2f} "
+              f"{entry['bytes_read'] / 1e6:>9.1f} {entry['bytes_written'] / 1e6:>10.1f}  {counters}")
+
+
+def main():
+    args = parse_arguments()
+    with open(args.report_file, 'r', encoding='utf-8') as f:
+        print_report(json.load(f))
+
+
+if __name__ == "__main__":
+    main()
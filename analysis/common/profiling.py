@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Opt-in cProfile and tracemalloc profiling of the analysis scripts.
+
+Scripts add the profiling options to their parser and start profiling right after parsing:
+
+    from profiling import add_profile_arguments, configure_profiling
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_profiling('extract_hyras_data', args, args.output_dir)
+
+With --profile the rest of the run is profiled with cProfile, and tracemalloc traces the
+allocations. When the process exits, three files are written to --profile-dir (default: the
+output directory of the script), named <script>_<timestamp>:
+
+    .prof          cProfile statistics, e.g. for `python -m pstats` or snakeviz
+    .memory.txt    top allocation sites at exit and their growth since the start of the run
+    .profile.txt   short summary: top functions by cumulative and by own time, peak traced memory
+
+The header and the cumulative table of the summary are also printed. Only the main process is
+profiled, work done in worker processes (e.g. the Pool of the fast animation mode) shows up as
+time spent waiting for the workers. tracemalloc slows allocation-heavy code down noticeably, so
+timings of a run with --profile-memory-frames 0 (cProfile only) are closer to those of an
+unprofiled run. The profiler modules are only imported with --profile, so the option costs
+nothing at startup otherwise.
+
+Commands:
+    python profiling.py show --prof-file ./data/extract_hyras_data_20250618T101500.prof --top 30
+"""
+
+import io
+import sys
+import atexit
+import argparse
+import datetime
+from pathlib import Path
+
+DEFAULT_TOP = 20
+# Allocations of the profilers themselves are left out of the memory report
+PROFILER_MODULES = ('cProfile.py', 'pstats.py', 'tracemalloc.py')
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Summarize cProfile files of the analysis scripts.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    show = subparsers.add_parser('show', help='Print the top functions of a .prof file')
+    show.add_argument('--prof-file', type=str, required=True, help='cProfile statistics written with --profile')
+    show.add_argument('--top', type=int, default=DEFAULT_TOP, help='Number of functions to print')
+    show.add_argument('--sort', type=str, default='cumulative', choices=['cumulative', 'tottime', 'ncalls'],
+                      help='Sort order of the functions')
+    return parser.parse_args()
+
+
+def add_profile_arguments(parser):
+    """Add --profile and its options to an argument parser."""
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the run with cProfile and tracemalloc and write the results next to the output')
+    parser.add_argument('--profile-dir', type=str,
+                        help='Directory for the profile files (default: the output directory)')
+    parser.add_argument('--profile-top', type=int, default=DEFAULT_TOP,
+                        help='Number of hotspots listed in the profile summary')
+    parser.add_argument('--profile-memory-frames', type=int, default=1,
+                        help='Stack frames stored per allocation by tracemalloc, 0 disables memory profiling')
+
+
+def format_stats(stats, sort, top):
+    """Return the top rows of pstats statistics as text."""
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats(sort).print_stats(top)
+    return stream.getvalue()
+
+
+class Profiler:
+    """cProfile and tracemalloc for the remainder of a run."""
+
+    def __init__(self, name, output_dir, top=DEFAULT_TOP, memory_frames=1):
+        import cProfile
+
+        self.name = name
+        self.output_dir = Path(output_dir)
+        self.top = top
+        self.memory_frames = memory_frames
+        self.profile = cProfile.Profile()
+        self.start_snapshot = None
+        self.stopped = False
+        # Header and cumulative table of the summary, printed when the run ends
+        self.headline = ''
+
+    def start(self):
+        if self.memory_frames > 0:
+            import tracemalloc
+
+            tracemalloc.start(self.memory_frames)
+            self.start_snapshot = tracemalloc.take_snapshot()
+        self.profile.enable()
+
+    def stop(self):
+        """Stop profiling and write the profile files, returns their common path without suffix."""
+        if self.stopped:
+            return None
+        self.profile.disable()
+        self.stopped = True
+
+        import pstats
+        import tracemalloc
+
+        filters = [tracemalloc.Filter(False, f"*{module}") for module in PROFILER_MODULES]
+        end_snapshot = None
+        if self.start_snapshot is not None:
+            # Before the statistics below are built, so they don't show up as allocations
+            end_snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+        base = self.output_dir / f"{self.name}_{stamp}"
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.profile.dump_stats(f"{base}.prof")
+
+        stats = pstats.Stats(self.profile)
+        stats.strip_dirs()
+        summary = [
+            f"Profile of {self.name}, {stats.total_calls} calls in {stats.total_tt:.3f}s",
+            f"Top {self.top} functions by cumulative time:",
+            format_stats(stats, 'cumulative', self.top),
+        ]
+        self.headline = '\n'.join(summary)
+        summary += [
+            f"Top {self.top} functions by own time:",
+            format_stats(stats, 'tottime', self.top),
+        ]
+
+        if end_snapshot is not None:
+            summary.append(f"Traced memory: {current / 1e6:.1f} MB at exit, {peak / 1e6:.1f} MB peak")
+
+            with open(f"{base}.memory.txt", 'w', encoding='utf-8') as f:
+                f.write(f"Top {self.top} allocation sites at exit:\n")
+                for stat in end_snapshot.statistics('lineno')[:self.top]:
+                    f.write(f"{stat}\n")
+                f.write(f"\nTop {self.top} allocation sites by growth since the start:\n")
+                start_snapshot = self.start_snapshot.filter_traces(filters)
+                for stat in end_snapshot.compare_to(start_snapshot, 'lineno')[:self.top]:
+                    f.write(f"{stat}\n")
+
+        Path(f"{base}.profile.txt").write_text('\n'.join(summary) + '\n', encoding='utf-8')
+        return base
+
+
+def configure_profiling(name, args, output_dir='.'):
+    """Start profiling the run if --profile was given. Returns the Profiler or None.
+
+    The profile is written when the process exits, including exits through sys.exit().
+    """
+    if not getattr(args, 'profile', False):
+        return None
+    profiler = Profiler(name, args.profile_dir or output_dir or '.', args.profile_top, args.profile_memory_frames)
+
+    def finish():
+        base = profiler.stop()
+        if base is not None:
+            print(profiler.headline, file=sys.stderr)
+            print(f"Profile written to {base}.prof, {base}.profile.txt", file=sys.stderr)
+
+    atexit.register(finish)
+    profiler.start()
+    return profiler
+
+
+def main():
+    import pstats
+
+    args = parse_arguments()
+    stats = pstats.Stats(args.prof_file)
+    stats.strip_dirs()
+    print(format_stats(stats, args.sort, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Aggregate HYRAS grids to regions (e.g. Bundesländer or Kreise) from a GeoJSON file.
+
+The region polygons are rasterized onto the HYRAS grid once: every cell is supersampled with
+N x N points and a cell's weight for a region is the fraction of its points inside the region's
+polygon. The result is a sparse cell -> region weight matrix in COO form, cached as a .npz file
+keyed by the GeoJSON, the grid and the supersampling factor.
+
+The entries are sorted by region, so reducing a chunk of days to per-region weighted means, mins
+and maxes is a gather followed by `np.add.reduceat` / `np.fmin.reduceat` over contiguous runs,
+i.e. a sparse matrix product without a per-cell polygon test.
+
+Output: <output-dir>/<var>_regions.csv with one row per date and region.
+"""
+
+import csv
+import json
+import hashlib
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from hyras_grid import select_variable
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of the cached weight files changes
+WEIGHTS_VERSION = 1
+# Number of polygon edges tested against a block of points at once
+EDGE_BLOCK_SIZE = 64
+# Points tested at once, bounds the (edges, points) temporaries to EDGE_BLOCK_SIZE * POINT_BLOCK_SIZE
+POINT_BLOCK_SIZE = 16384
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Aggregate HYRAS NetCDF grids to GeoJSON regions')
+    parser.add_argument('--file', action='append', required=True,
+                        help='NetCDF file(s) to aggregate, in date order. Can be specified multiple times.')
+    parser.add_argument('--var', type=str, required=True, help='Variable to aggregate (e.g., tasmax)')
+    parser.add_argument('--regions', type=str, required=True,
+                        help='GeoJSON FeatureCollection with (Multi)Polygon regions, see SOURCES.md')
+    parser.add_argument('--id-property', type=str, default='id',
+                        help='Feature property holding the region id (falls back to the feature id)')
+    parser.add_argument('--name-property', type=str, default='name',
+                        help='Feature property holding the region name')
+    parser.add_argument('--supersample', type=int, default=3,
+                        help='Points per cell along each axis used to rasterize the polygons')
+    parser.add_argument('--cache-dir', type=str, default='./data/cache',
+                        help='Directory of the cached region weight matrices')
+    parser.add_argument('--output-dir', type=str, default='./data/regions', help='Output directory')
+    parser.add_argument('--chunk-days', type=int, default=31,
+                        help='Number of days read from the NetCDF file at once')
+    return parser.parse_args()
+
+
+def load_regions(regions_file, id_property='id', name_property='name'):
+    """Read a GeoJSON FeatureCollection into a list of (region_id, name, polygons).
+
+    Each polygon is a list of rings given as (N, 2) arrays of (lon, lat).
+    """
+    with open(regions_file, 'r', encoding='utf-8') as f:
+        collection = json.load(f)
+
+    regions = []
+    for index, feature in enumerate(collection.get('features', [])):
+        geometry = feature.get('geometry') or {}
+        properties = feature.get('properties') or {}
+        if geometry.get('type') == 'Polygon':
+            polygons = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiPolygon':
+            polygons = geometry['coordinates']
+        else:
+            logger.warning(f"Skipping feature {index}: unsupported geometry {geometry.get('type')}")
+            continue
+
+        region_id = properties.get(id_property, feature.get('id', index))
+        name = properties.get(name_property, str(region_id))
+        rings = [[np.asarray(ring, dtype=np.float64)[:, :2] for ring in polygon] for polygon in polygons]
+        regions.append((str(region_id), str(name), rings))
+    return regions
+
+
+def points_in_polygon(lon, lat, rings):
+    """Even-odd point-in-polygon test of many points against a polygon with holes.
+
+    Edges and points are processed in blocks, so the temporaries have at most
+    EDGE_BLOCK_SIZE x POINT_BLOCK_SIZE entries however large the polygon and the grid are.
+    """
+    inside = np.zeros(lon.shape, dtype=bool)
+    for ring in rings:
+        start = ring
+        end = np.roll(ring, -1, axis=0)
+        for point_block in range(0, len(lon), POINT_BLOCK_SIZE):
+            points = slice(point_block, point_block + POINT_BLOCK_SIZE)
+            block_lon, block_lat = lon[points], lat[points]
+            for block in range(0, len(ring), EDGE_BLOCK_SIZE):
+                x0, y0 = start[block:block + EDGE_BLOCK_SIZE].T[:, :, None]
+                x1, y1 = end[block:block + EDGE_BLOCK_SIZE].T[:, :, None]
+                # Count the edges crossing the horizontal ray from each point towards +lon
+                crosses = (y0 > block_lat) != (y1 > block_lat)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    x_cross = x0 + (block_lat - y0) * (x1 - x0) / (y1 - y0)
+                inside[points] ^= np.logical_xor.reduce(crosses & (block_lon < x_cross), axis=0)
+    return inside
+
+
+def supersample_points(lat, lon, supersample):
+    """Return (lat, lon) arrays of shape (cells, supersample**2) spread evenly over every cell.
+
+    Uses the local derivatives of the cell center coordinates, so it works on projected grids.
+    """
+    offsets = (np.arange(supersample) + 0.5) / supersample - 0.5
+    dy, dx = [o.ravel() for o in np.meshgrid(offsets, offsets, indexing='ij')]
+    dlat_dy, dlat_dx = np.gradient(lat)
+    dlon_dy, dlon_dx = np.gradient(lon)
+    point_lat = lat.ravel()[:, None] + dlat_dy.ravel()[:, None] * dy + dlat_dx.ravel()[:, None] * dx
+    point_lon = lon.ravel()[:, None] + dlon_dy.ravel()[:, None] * dy + dlon_dx.ravel()[:, None] * dx
+    return point_lat, point_lon
+
+
+class RegionWeights:
+    """Sparse cell -> region weights, sorted by region."""
+
+    def __init__(self, cells, regions, weights, region_ids, region_names, grid_shape):
+        order = np.lexsort((cells, regions))
+        self.cells = np.asarray(cells, dtype=np.int64)[order]
+        self.regions = np.asarray(regions, dtype=np.int32)[order]
+        self.weights = np.asarray(weights, dtype=np.float32)[order]
+        self.region_ids = list(region_ids)
+        self.region_names = list(region_names)
+        self.grid_shape = tuple(grid_shape)
+
+        # Regions that cover at least one cell and where their run of entries starts
+        self.covered, self.starts = np.unique(self.regions, return_index=True)
+
+    @classmethod
+    def rasterize(cls, regions, lat, lon, supersample=3):
+        """Rasterize (region_id, name, polygons) onto a grid given by its cell center coordinates."""
+        point_lat, point_lon = supersample_points(np.asarray(lat, dtype=np.float64),
+                                                  np.asarray(lon, dtype=np.float64), supersample)
+        samples = point_lat.shape[1]
+        flat_lat, flat_lon = point_lat.ravel(), point_lon.ravel()
+
+        cells, region_indices, weights = [], [], []
+        for region_index, (region_id, name, polygons) in enumerate(regions):
+            inside = np.zeros(flat_lat.shape, dtype=bool)
+            for rings in polygons:
+                outer = rings[0]
+                # Only test the points inside the bounding box of the polygon
+                candidates = np.flatnonzero((flat_lon >= outer[:, 0].min()) & (flat_lon <= outer[:, 0].max())
+                                            & (flat_lat >= outer[:, 1].min()) & (flat_lat <= outer[:, 1].max()))
+                if len(candidates):
+                    inside[candidates] |= points_in_polygon(flat_lon[candidates], flat_lat[candidates], rings)
+
+            counts = inside.reshape(-1, samples).sum(axis=1)
+            region_cells = np.flatnonzero(counts)
+            cells.append(region_cells)
+            region_indices.append(np.full(len(region_cells), region_index, dtype=np.int32))
+            weights.append(counts[region_cells] / samples)
+            logger.info(f"Region {region_id} ({name}): {len(region_cells)} cells")
+
+        if not regions:
+            return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32),
+                       [], [], np.shape(lat))
+        return cls(np.concatenate(cells), np.concatenate(region_indices), np.concatenate(weights),
+                   [region[0] for region in regions], [region[1] for region in regions], np.shape(lat))
+
+    def save(self, path):
+        tmp_path = Path(path).with_suffix('.tmp.npz')
+        np.savez_compressed(tmp_path, version=WEIGHTS_VERSION, cells=self.cells, regions=self.regions,
+                            weights=self.weights, region_ids=np.array(self.region_ids),
+                            region_names=np.array(self.region_names), grid_shape=np.array(self.grid_shape))
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data['version']) != WEIGHTS_VERSION:
+                raise ValueError(f"Unsupported region weights version in {path}")
+            return cls(data['cells'], data['regions'], data['weights'], data['region_ids'].tolist(),
+                       data['region_names'].tolist(), data['grid_shape'].tolist())
+
+    def reduce(self, slab):
+        """Reduce a (days, y, x) slab to per-region (mean, min, max) arrays of shape (days, regions).
+
+        Means are weighted by the cell coverage and skip NaN cells; min and max consider every cell
+        touching the region. Regions without valid cells get NaN.
+        """
+        days = slab.shape[0]
+        values = slab.reshape(days, -1)[:, self.cells].astype(np.float64)
+        valid = np.isfinite(values)
+        weighted = np.where(valid, values, 0.0) * self.weights
+        valid_weights = valid * self.weights
+
+        mean = np.full((days, len(self.region_ids)), np.nan)
+        minimum = np.full_like(mean, np.nan)
+        maximum = np.full_like(mean, np.nan)
+        if not len(self.starts):
+            return mean, minimum, maximum
+
+        sums = np.add.reduceat(weighted, self.starts, axis=1)
+        weight_sums = np.add.reduceat(valid_weights, self.starts, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean[:, self.covered] = np.where(weight_sums > 0, sums / weight_sums, np.nan)
+        with np.errstate(invalid='ignore'):
+            minimum[:, self.covered] = np.fmin.reduceat(values, self.starts, axis=1)
+            maximum[:, self.covered] = np.fmax.reduceat(values, self.starts, axis=1)
+        return mean, minimum, maximum
+
+
+def load_region_weights(ds, regions_file, args):
+    """Return the region weights of the dataset's grid, rasterizing and caching them if needed."""
+    lat = ds['lat'].values
+    lon = ds['lon'].values
+    digest = hashlib.sha256()
+    digest.update(Path(regions_file).read_bytes())
+    digest.update(lat.astype(np.float64).tobytes() + lon.astype(np.float64).tobytes())
+    digest.update(f"{args.id_property}|{args.name_property}|{args.supersample}|{WEIGHTS_VERSION}".encode('utf-8'))
+
+    cache_dir = Path(args.cache_dir)
+    cache_file = cache_dir / f"region_weights_{digest.hexdigest()[:16]}.npz"
+    if cache_file.exists():
+        logger.info(f"Using cached region weights {cache_file}")
+        return RegionWeights.load(cache_file)
+
+    logger.info(f"Rasterizing regions from {regions_file} with {args.supersample}x{args.supersample} supersampling")
+    regions = load_regions(regions_file, args.id_property, args.name_property)
+    weights = RegionWeights.rasterize(regions, lat, lon, args.supersample)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    weights.save(cache_file)
+    logger.info(f"Saved region weights to {cache_file}")
+    return weights
+
+
+def aggregate_file(file_path, args, writer, weights_cache):
+    """Aggregate all days of one NetCDF file and write the rows. Returns the number of days."""
+    with xr.open_dataset(file_path) as ds:
+        if args.var not in ds:
+            logger.warning(f"Variable {args.var} not found in {file_path}. Skipping this file.")
+            return 0
+
+        var = select_variable(ds, args.var)
+        grid_key = hashlib.sha256(ds['lat'].values.tobytes() + ds['lon'].values.tobytes()).hexdigest()
+        if grid_key not in weights_cache:
+            weights_cache[grid_key] = load_region_weights(ds, args.regions, args)
+        weights = weights_cache[grid_key]
+
+        dates = pd.to_datetime(ds.time.values)
+        for start in range(0, len(dates), args.chunk_days):
+            # One read for the whole chunk of days
+            slab = var.isel(time=slice(start, start + args.chunk_days)).values
+            mean, minimum, maximum = weights.reduce(slab)
+            for day, date in enumerate(dates[start:start + args.chunk_days]):
+                date_str = date.strftime('%Y-%m-%d')
+                for region, (region_id, name) in enumerate(zip(weights.region_ids, weights.region_names)):
+                    writer.writerow([date_str, region_id, name] +
+                                    [f"{value[day, region]:.2f}" if np.isfinite(value[day, region]) else ''
+                                     for value in (mean, minimum, maximum)])
+        return len(dates)
+
+
+def main():
+    args = parse_arguments()
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / f"{args.var}_regions.csv"
+
+    weights_cache = {}
+    total_days = 0
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['date', 'region_id', 'region_name', f"mean_{args.var}", f"min_{args.var}", f"max_{args.var}"])
+        for file_path in args.file:
+            logger.info(f"Aggregating {file_path}")
+            total_days += aggregate_file(file_path, args, writer, weights_cache)
+
+    logger.info(f"Aggregation complete! Wrote {total_days} days to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
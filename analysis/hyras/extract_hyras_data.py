@@ -5,11 +5,27 @@ import numpy as np
 import json
 from pathlib import Path
 import re
+import sys
 import glob
 import time
 import logging
+import hashlib
 from datetime import datetime, timedelta
 
+from hyras_grid import GridLocator, select_variable
+from interpolation import InterpolationWeights, bilinear_weights
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'common'))
+from city_cube import CityCube
+from instrumentation import add_report_arguments, configure_report, count, stage
+from profiling import add_profile_arguments, configure_profiling
+from artifact_cache import add_cache_arguments, code_version, open_cache
+
+# Source files whose changes invalidate cached city series
+CODE_VERSION_FILES = [__file__, Path(__file__).with_name('hyras_grid.py'), Path(__file__).with_name('interpolation.py')]
+# Columns of the cities metadata that are stored with a cached city series
+GRID_COLUMNS = ['grid_y', 'grid_x', 'grid_lat1', 'grid_lon1', 'grid_lat2', 'grid_lon2']
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -118,14 +134,45 @@ def get_grid_cell_bounds(lat_arr, lon_arr, grid_y, grid_x):
     
     return grid_lat1, grid_lon1, grid_lat2, grid_lon2
 
-def extract_city_timeseries(ds, city, params, centers_lat, centers_lon):
+# Grid locators by hash of the grid coordinates, shared by all cities and files on the same grid
+_grid_locators = {}
+
+
+def get_grid_locator(ds):
+    """Return the GridLocator of the dataset's grid, building it once per grid."""
+    grid_key = hashlib.sha256(ds['lat'].values.tobytes() + ds['lon'].values.tobytes()).hexdigest()
+    if grid_key not in _grid_locators:
+        _grid_locators[grid_key] = GridLocator.from_dataset(ds)
+    return _grid_locators[grid_key]
+
+
+def extract_city_timeseries(ds, city, params, centers_lat, centers_lon, interpolation='nearest'):
     # Use the pre-calculated centers instead of recalculating them
     grid_y, grid_x = find_nearest_grid_point(centers_lat, centers_lon, city['lat'], city['lon'])
     result = {'city': city['name']}
+
+    if interpolation == 'bilinear':
+        # Bilinear weights of the 2x2 cells around the city, relative to the block of cells read below
+        weights = bilinear_weights(get_grid_locator(ds), [city['lat']], [city['lon']])
+        max_x = ds['lat'].shape[1]
+        cell_y, cell_x = np.divmod(weights.indices[0], max_x)
+        y0, x0 = int(cell_y.min()), int(cell_x.min())
+        block_width = int(cell_x.max()) - x0 + 1
+        local_weights = InterpolationWeights(((cell_y - y0) * block_width + (cell_x - x0))[np.newaxis],
+                                             weights.weights, (int(cell_y.max()) - y0 + 1) * block_width)
     
     # Handle multiple parameters
     for param in params:
         if param in ds:
+            if interpolation == 'bilinear':
+                # One read of the 2x2 block for the whole time series
+                param_data = select_variable(ds, param).isel(y=slice(y0, int(cell_y.max()) + 1),
+                                                             x=slice(x0, x0 + block_width))
+                values = param_data.values.reshape(param_data.sizes['time'], -1)
+                result[param] = local_weights.apply(values)[:, 0].astype(np.float32)
+                result['time'] = param_data.time.values
+                continue
+
             # Extract the parameter values at the specified grid point
             param_data = ds[param].isel(y=grid_y, x=grid_x)
             
@@ -166,14 +213,39 @@ def parse_file_patterns(file_patterns):
     
     return expanded_files
 
-def process_city(city, input_files, params, output_dir, cities_df):
-    """Process a single city, extracting data from all input files and saving to CSV"""
+def restore_city(cache, key, city_id, output_dir, cities_df):
+    """Restore a cached city CSV and its grid cell into cities_df. Returns False on a cache miss."""
+    meta = cache.lookup(key)
+    if meta is None:
+        return False
+    city_file_path = output_dir / f"{meta['grid_y']}_{meta['grid_x']}_{city_id}.csv"
+    if not cache.copy_out(key, 'city.csv', city_file_path):
+        return False
+    for column in GRID_COLUMNS:
+        cities_df.loc[cities_df['city_id'] == city_id, column] = meta[column]
+    logger.info(f"Restored {city_file_path} from the cache")
+    return True
+
+def process_city(city, input_files, params, output_dir, cities_df, interpolation='nearest', cube=None, cache=None):
+    """Process a single city, extracting data from all input files and saving to CSV
+
+    With a cache (CSV output only), the CSV of a city whose input files, coordinates, parameters
+    and extraction code are unchanged is copied from the cache instead of being extracted again.
+    """
     city_id = city['id']
     city_data_dict = {}
     grid_bounds = {}
     
     logger.info(f"Processing city: {city['name']} ({city_id})")
     
+    key = None
+    if cache is not None and cube is None:
+        key = cache.key(inputs=input_files,
+                        params={'lat': city['lat'], 'lon': city['lon'], 'params': params, 'interpolation': interpolation},
+                        code=code_version(*CODE_VERSION_FILES))
+        if restore_city(cache, key, city_id, output_dir, cities_df):
+            return cities_df
+    
     for file_path in input_files:
         try:
             ds = xr.open_dataset(file_path)
@@ -189,9 +261,13 @@ def process_city(city, input_files, params, output_dir, cities_df):
             lon_arr = ds['lon'].values
             
             # Calculate grid centers once
-            centers_lat, centers_lon = calculate_grid_centers(lat_arr, lon_arr)
+            with stage('grid_centers'):
+                centers_lat, centers_lon = calculate_grid_centers(lat_arr, lon_arr)
                 
-            city_data, grid_y, grid_x = extract_city_timeseries(ds, city, params, centers_lat, centers_lon)
+            with stage('read'):
+                city_data, grid_y, grid_x = extract_city_timeseries(ds, city, params, centers_lat, centers_lon,
+                                                                    interpolation)
+                count(rows=len(city_data.get('time', [])))
             
             # Update the grid indices in cities metadata (from first file)
             if cities_df.loc[cities_df['city_id'] == city_id, 'grid_y'].iloc[0] is None:
@@ -237,22 +313,53 @@ def process_city(city, input_files, params, output_dir, cities_df):
     city_data_list = list(city_data_dict.values())
     city_df = pd.DataFrame(city_data_list)
     
-    if not city_df.empty:  # Only create file if we have data
-        # Sort by date
-        if 'date' in city_df.columns:
-            city_df['date'] = pd.to_datetime(city_df['date'])
-            city_df = city_df.sort_values('date')
-            city_df['date'] = city_df['date'].dt.strftime('%Y-%m-%d')
-        
-        city_file_path = output_dir / f"{grid_y}_{grid_x}_{city_id}.csv"
-        city_df.to_csv(city_file_path, index=False)
+    if not city_df.empty and cube is not None:
+        # Write the series into the city's row of the cube instead of a CSV file
+        with stage('write'):
+            dates = pd.to_datetime(city_df['date']).values.astype('datetime64[D]')
+            for param in params:
+                if param in city_df.columns:
+                    cube.write(city_id, dates, param, city_df[param].to_numpy(dtype=np.float32))
+            cube.set_city(city_id, grid_y=grid_y, grid_x=grid_x)
+            count(rows=len(city_df))
+        logger.info(f"Saved {city_id} to cube {cube.path}")
+    elif not city_df.empty:  # Only create file if we have data
+        with stage('write'):
+            # Sort by date
+            if 'date' in city_df.columns:
+                city_df['date'] = pd.to_datetime(city_df['date'])
+                city_df = city_df.sort_values('date')
+                city_df['date'] = city_df['date'].dt.strftime('%Y-%m-%d')
+            
+            city_file_path = output_dir / f"{grid_y}_{grid_x}_{city_id}.csv"
+            city_df.to_csv(city_file_path, index=False)
+            count(rows=len(city_df), files=1)
         logger.info(f"Saved: {city_file_path}")
+        if key is not None:
+            row = cities_df.loc[cities_df['city_id'] == city_id].iloc[0]
+            cache.put(key, {'city.csv': city_file_path},
+                      meta={column: None if pd.isna(row[column]) else float(row[column]) for column in GRID_COLUMNS}
+                      | {'grid_y': grid_y, 'grid_x': grid_x})
     else:
         logger.warning(f"No data found for {city['name']} ({city_id})")
     
     # Return updated cities_df and indicate completion
     return cities_df
 
+def create_city_cube(cube_path, cities, params, input_files):
+    """Create a cube covering all cities and the full date range of the input files."""
+    start_date = end_date = None
+    for file_path in input_files:
+        with xr.open_dataset(file_path) as ds:
+            times = pd.to_datetime(ds.time.values)
+            start_date = times.min() if start_date is None else min(start_date, times.min())
+            end_date = times.max() if end_date is None else max(end_date, times.max())
+
+    cube = CityCube.create(cube_path, [{'id': city['id'], 'name': city['name']} for city in cities],
+                           params, start_date, end_date)
+    logger.info(f"Created cube {cube_path} with shape {cube.data.shape}")
+    return cube
+
 def main():
     parser = argparse.ArgumentParser(description="Extract daily temperatures for cities from NetCDF")
     parser.add_argument('--file', action='append', required=True, 
@@ -262,7 +369,19 @@ def main():
                         help='Variable name(s) for climate parameters (e.g., tasmax, tasmin). Can be specified multiple times.')
     parser.add_argument('--output-dir', default='.', help='Output directory for CSV files')
     parser.add_argument('--cities-metadata', default='cities_metadata.csv', help='Output file for cities metadata')
+    parser.add_argument('--output-format', choices=['csv', 'cube'], default='csv',
+                        help='Write one CSV per city, or all cities into one memory-mapped cube (see analysis/common/city_cube.py)')
+    parser.add_argument('--cube-name', default='cities',
+                        help='Name of the cube files (<name>.f32 and <name>.json) in the output directory')
+    parser.add_argument('--interpolation', choices=['nearest', 'bilinear'], default='nearest',
+                        help='Take the nearest grid cell or interpolate bilinearly between the 4 surrounding cells')
+    add_report_arguments(parser)
+    add_profile_arguments(parser)
+    add_cache_arguments(parser)
     args = parser.parse_args()
+    configure_report('extract_hyras_data', args)
+    configure_profiling('extract_hyras_data', args, args.output_dir)
+    cache = open_cache(args)
 
     # Parse and expand file patterns
     input_files = parse_file_patterns(args.file)
@@ -296,10 +415,15 @@ def main():
         'grid_lon1': None,  # Grid cell lower bound for longitude
         'grid_lat2': None,  # Grid cell upper bound for latitude
         'grid_lon2': None,  # Grid cell upper bound for longitude
+        'station_id': city.get('station_id'),  # Set when the cities come from a station CSV
     } for city in cities])
     
     # Process each input file
     params = args.param  # List of parameters to extract
+
+    cube = None
+    if args.output_format == 'cube':
+        cube = create_city_cube(output_dir / args.cube_name, cities, params, input_files)
     
     # Process one city at a time to save memory
     start_time = time.time()
@@ -313,7 +437,10 @@ def main():
         
         # Process this city
         logger.info(f"Processing city {city_idx+1}/{total_cities}: {city['name']}")
-        cities_df = process_city(city, input_files, params, output_dir, cities_df)
+        with stage('city'):
+            cities_df = process_city(city, input_files, params, output_dir, cities_df, args.interpolation, cube,
+                                     cache)
+            count(cities=1)
         
         # Calculate and log progress
         completed_cities += 1
@@ -336,10 +463,14 @@ def main():
             cities_metadata_path = output_dir / args.cities_metadata
             cities_df.to_csv(cities_metadata_path, index=False)
             logger.info(f"Saved cities metadata: {cities_metadata_path}")
+            if cube is not None:
+                cube.flush()
     
     # Final save of city metadata
     cities_metadata_path = output_dir / args.cities_metadata
     cities_df.to_csv(cities_metadata_path, index=False)
+    if cube is not None:
+        cube.flush()
     
     # Final report
     total_time = time.time() - start_time
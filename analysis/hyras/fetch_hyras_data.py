@@ -1,9 +1,16 @@
 import os
+import sys
 import requests
 import argparse
 from datetime import datetime
+from pathlib import Path
 from bs4 import BeautifulSoup
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'common'))
+from instrumentation import add_report_arguments, configure_report, count, stage
+from profiling import add_profile_arguments, configure_profiling
+from artifact_cache import add_cache_arguments, conditional_headers, http_validators, open_cache
+
 # Directory to store the NetCDF files
 OUTPUT_DIR = "./data/netcdf"
 
@@ -13,32 +20,57 @@ BASE_URL = "https://opendata.dwd.de/climate_environment/CDC/grids_germany/daily/
 # Ensure the output directory exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def download_netcdf_file(url, output_dir):
-    """Download a NetCDF file from the given URL."""
+def download_netcdf_file(url, output_dir, cache=None):
+    """Download a NetCDF file from the given URL.
+
+    Without a cache an existing file is never downloaded again. With a cache the download is
+    conditional on the ETag and Last-Modified of the previous one, so files that DWD revised
+    (e.g. the current year) are replaced and unchanged ones are skipped after a 304.
+    """
     filename = url.split("/")[-1]
     output_path = os.path.join(output_dir, filename)
+    exists = os.path.exists(output_path)
     
     # Skip if file already exists
-    if os.path.exists(output_path):
+    if exists and cache is None:
         print(f"File already exists: {output_path}")
         return
     
-    response = requests.get(url)
+    key = cache.key(params={'url': url}) if cache is not None else None
+    validators = cache.lookup(key) if cache is not None and exists else None
+    with stage('download'):
+        response = requests.get(url, headers=conditional_headers(validators), stream=True)
+        count(http_requests=1)
+        if response.status_code == 200:
+            # Stream to a temporary file, so an interrupted download never replaces a good file
+            tmp_path = f"{output_path}.tmp"
+            size = 0
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, output_path)
+            count(http_bytes=size, files=1)
+            if cache is not None:
+                cache.put(key, meta=http_validators(response))
+        response.close()
     if response.status_code == 200:
-        with open(output_path, "wb") as f:
-            f.write(response.content)
         print(f"Downloaded: {url} to {output_path}")
+    elif response.status_code == 304:
+        print(f"Unchanged since the last download: {output_path}")
     else:
         print(f"Failed to download: {url}")
 
-def fetch_netcdf_files(dataset=None, start_year=None, end_year=None, resolution=None):
+def fetch_netcdf_files(dataset=None, start_year=None, end_year=None, resolution=None, cache=None):
     """Fetch NetCDF files for the specified year range and resolution."""        
     print(f"Fetching '{dataset}' NetCDF files from year {start_year} to {end_year} with resolution '{resolution}'")
     
     base_url = f"{BASE_URL}/{dataset}/"
 
     # Fetch the directory listing
-    response = requests.get(base_url)
+    with stage('list'):
+        response = requests.get(base_url)
+        count(http_requests=1, http_bytes=len(response.content))
     if response.status_code == 200:
         soup = BeautifulSoup(response.text, "html.parser")
         
@@ -55,7 +87,7 @@ def fetch_netcdf_files(dataset=None, start_year=None, end_year=None, resolution=
                         # Check if the file is within the requested year range and matches resolution (if specified)
                         if start_year <= file_year <= end_year and (resolution is None or file_resolution == resolution):
                             file_url = f"{base_url}{href}"
-                            download_netcdf_file(file_url, OUTPUT_DIR)
+                            download_netcdf_file(file_url, OUTPUT_DIR, cache)
                 except (ValueError, IndexError) as e:
                     print(f"Error parsing filename {href}: {e}")
     else:
@@ -68,11 +100,16 @@ def main():
     parser.add_argument("--start-year", required=True, type=int, help="Start year for data download")
     parser.add_argument("--end-year", required=True, type=int, help="End year for data download")
     parser.add_argument("--resolution", required=True, type=str, help="Resolution of the data (e.g., '1' for 1km resolution)")
+    add_report_arguments(parser)
+    add_profile_arguments(parser)
+    add_cache_arguments(parser)
     
     args = parser.parse_args()
+    configure_report('fetch_hyras_data', args)
+    configure_profiling('fetch_hyras_data', args, OUTPUT_DIR)
     
     # Download files based on specified year range and resolution
-    fetch_netcdf_files(args.dataset, args.start_year, args.end_year, args.resolution)
+    fetch_netcdf_files(args.dataset, args.start_year, args.end_year, args.resolution, open_cache(args))
 
 if __name__ == "__main__":
     main()
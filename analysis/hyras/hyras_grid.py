@@ -0,0 +1,111 @@
+"""
+Helpers for working with HYRAS grids.
+
+HYRAS files carry 2D `lat`/`lon` arrays for the cell centers of a projected grid. GridLocator
+inverts that mapping: it turns arbitrary (lat, lon) points into fractional (y, x) grid indices,
+vectorized over any number of points and independent of the grid's projection.
+"""
+
+import numpy as np
+
+
+def select_variable(ds, var_name):
+    """Return a variable of the dataset, selecting the first value of a 'bnds' dimension if present."""
+    var = ds[var_name]
+    if 'bnds' in var.dims:
+        var = var.isel(bnds=0)
+    return var
+
+
+class GridLocator:
+    """Vectorized (lat, lon) -> fractional (y, x) index lookup on a curvilinear grid.
+
+    A low-order polynomial fitted to the cell center coordinates gives a first guess, which is
+    refined with Newton steps using the local Jacobian of the actual lat/lon arrays.
+    """
+
+    def __init__(self, lat, lon, degree=3, max_fit_points=200000):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.shape = self.lat.shape
+        self.degree = degree
+
+        # Normalize coordinates to keep the polynomial fit well conditioned
+        self.lat_center, self.lat_scale = self.lat.mean(), max(np.ptp(self.lat), 1e-9)
+        self.lon_center, self.lon_scale = self.lon.mean(), max(np.ptp(self.lon), 1e-9)
+
+        # Fit on a regular subsample of the cells
+        stride = max(1, int(np.sqrt(self.lat.size / max_fit_points)))
+        yy, xx = np.indices(self.shape, dtype=np.float64)
+        sample = (slice(None, None, stride), slice(None, None, stride))
+        design = self._design(self.lat[sample].ravel(), self.lon[sample].ravel())
+        self.coef_y = np.linalg.lstsq(design, yy[sample].ravel(), rcond=None)[0]
+        self.coef_x = np.linalg.lstsq(design, xx[sample].ravel(), rcond=None)[0]
+
+        # Finite differences of the coordinates along y and x for the Newton refinement
+        self.dlat_dy = np.gradient(self.lat, axis=0)
+        self.dlat_dx = np.gradient(self.lat, axis=1)
+        self.dlon_dy = np.gradient(self.lon, axis=0)
+        self.dlon_dx = np.gradient(self.lon, axis=1)
+
+    @classmethod
+    def from_dataset(cls, ds, **kwargs):
+        return cls(ds['lat'].values, ds['lon'].values, **kwargs)
+
+    def _design(self, lat, lon):
+        u = (lat - self.lat_center) / self.lat_scale
+        v = (lon - self.lon_center) / self.lon_scale
+        terms = [u ** i * v ** j for i in range(self.degree + 1) for j in range(self.degree + 1 - i)]
+        return np.stack(terms, axis=-1)
+
+    def _interpolate(self, grid, fy, fx):
+        """Bilinear interpolation of a 2D array at fractional indices (clamped to the grid)."""
+        max_y, max_x = self.shape
+        fy = np.clip(fy, 0, max_y - 1)
+        fx = np.clip(fx, 0, max_x - 1)
+        y0 = np.minimum(np.floor(fy).astype(np.int64), max_y - 2) if max_y > 1 else np.zeros_like(fy, dtype=np.int64)
+        x0 = np.minimum(np.floor(fx).astype(np.int64), max_x - 2) if max_x > 1 else np.zeros_like(fx, dtype=np.int64)
+        wy = fy - y0
+        wx = fx - x0
+        y1 = np.minimum(y0 + 1, max_y - 1)
+        x1 = np.minimum(x0 + 1, max_x - 1)
+        return ((1 - wy) * (1 - wx) * grid[y0, x0] + (1 - wy) * wx * grid[y0, x1]
+                + wy * (1 - wx) * grid[y1, x0] + wy * wx * grid[y1, x1])
+
+    def locate(self, lat, lon, iterations=2):
+        """Return fractional (y, x) indices of the given points. Points outside the grid get
+        indices outside [0, size - 1]."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        design = self._design(lat.ravel(), lon.ravel())
+        fy = design @ self.coef_y
+        fx = design @ self.coef_x
+
+        max_y, max_x = self.shape
+        for _ in range(iterations):
+            # Linearize around the nearest point on the grid, so points outside keep their offset
+            fy = np.clip(fy, 0, max_y - 1)
+            fx = np.clip(fx, 0, max_x - 1)
+            err_lat = lat.ravel() - self._interpolate(self.lat, fy, fx)
+            err_lon = lon.ravel() - self._interpolate(self.lon, fy, fx)
+            a = self._interpolate(self.dlat_dy, fy, fx)
+            b = self._interpolate(self.dlat_dx, fy, fx)
+            c = self._interpolate(self.dlon_dy, fy, fx)
+            d = self._interpolate(self.dlon_dx, fy, fx)
+            det = a * d - b * c
+            det = np.where(np.abs(det) < 1e-12, np.nan, det)
+            step_y = (d * err_lat - b * err_lon) / det
+            step_x = (a * err_lon - c * err_lat) / det
+            fy = fy + np.nan_to_num(step_y)
+            fx = fx + np.nan_to_num(step_x)
+
+        return fy.reshape(lat.shape), fx.reshape(lat.shape)
+
+    def nearest_flat_index(self, lat, lon):
+        """Return the flat index of the nearest cell of each point, -1 for points outside the grid."""
+        fy, fx = self.locate(lat, lon)
+        y = np.rint(fy).astype(np.int64)
+        x = np.rint(fx).astype(np.int64)
+        max_y, max_x = self.shape
+        inside = (y >= 0) & (y < max_y) & (x >= 0) & (x < max_x)
+        return np.where(inside, y * max_x + x, -1)
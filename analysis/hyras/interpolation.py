@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Vectorized interpolation between HYRAS grids, points and station networks.
+
+Interpolation is split into two steps: the weights of a target set (points or grid cells) with
+respect to a source set are computed once, and then applied to any number of time steps at once.
+Weights are stored in a fixed-width sparse layout (every target has the same number of source
+indices and weights), so applying them to a (time, sources) array is a single gather followed
+by a weighted sum, i.e. one sparse matrix product.
+
+- Bilinear: grid -> points (e.g. cities), using GridLocator for the fractional cell indices.
+- Inverse distance weighting: stations -> grid (e.g. a live temperature field from the
+  10-minute station feed), using the k nearest stations of every cell.
+
+Commands:
+    python interpolation.py grid-to-points --file tasmax_hyras_5_2020_v5-0_de.nc --var tasmax --points cities.csv
+    python interpolation.py stations-to-grid --stations station_10min_data.csv --grid tasmax_hyras_5_2020_v5-0_de.nc
+"""
+
+import hashlib
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from hyras_grid import GridLocator, select_variable
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+# Number of targets whose distances to all sources are computed at once
+DISTANCE_BLOCK_SIZE = 4096
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Interpolate between HYRAS grids, points and stations')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    points = subparsers.add_parser('grid-to-points', help='Bilinearly interpolate a grid variable to points')
+    points.add_argument('--file', action='append', required=True,
+                        help='NetCDF file(s) to sample, in date order. Can be specified multiple times.')
+    points.add_argument('--var', type=str, required=True, help='Variable to interpolate (e.g., tasmax)')
+    points.add_argument('--points', type=str, required=True, help='CSV file with columns: name, lat, lon')
+    points.add_argument('--output-file', type=str, default='points_interpolated.csv', help='Output CSV file')
+
+    stations = subparsers.add_parser('stations-to-grid',
+                                     help='Interpolate station values to a HYRAS grid with inverse distance weighting')
+    stations.add_argument('--stations', type=str, required=True,
+                          help='Station CSV with lat, lon and value columns (e.g., station_10min_data.csv)')
+    stations.add_argument('--column', type=str, default='temperature', help='Station column to interpolate')
+    stations.add_argument('--grid', type=str, required=True, help='NetCDF file providing the target grid (lat/lon)')
+    stations.add_argument('--k', type=int, default=8, help='Number of nearest stations per grid cell')
+    stations.add_argument('--power', type=float, default=2.0, help='Power of the inverse distance weights')
+    stations.add_argument('--max-distance', type=float, default=150.0,
+                          help='Ignore stations further away than this many kilometers')
+    stations.add_argument('--cache-dir', type=str, default='./data/cache',
+                          help='Directory of the cached interpolation weights')
+    stations.add_argument('--output-file', type=str, default='station_field.nc', help='Output NetCDF file')
+    return parser.parse_args()
+
+
+class InterpolationWeights:
+    """Fixed-width sparse weights: target i is sum_j weights[i, j] * source[indices[i, j]].
+
+    Entries with weight 0 are padding. Targets without any source have all weights 0 and
+    interpolate to NaN.
+    """
+
+    def __init__(self, indices, weights, source_count):
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.source_count = int(source_count)
+
+    @property
+    def target_count(self):
+        return self.indices.shape[0]
+
+    def apply(self, values):
+        """Interpolate a (sources,) or (time, sources) array to (targets,) or (time, targets).
+
+        NaN sources are skipped and the weights of the remaining sources renormalized.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        gathered = values[..., self.indices]
+        valid = np.isfinite(gathered) & (self.weights > 0)
+        weights = np.where(valid, self.weights, 0.0)
+        totals = weights.sum(axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = (np.where(valid, gathered, 0.0) * weights).sum(axis=-1) / totals
+        return np.where(totals > 0, result, np.nan)
+
+    def save(self, path):
+        tmp_path = Path(path).with_suffix('.tmp.npz')
+        np.savez_compressed(tmp_path, indices=self.indices, weights=self.weights, source_count=self.source_count)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['indices'], data['weights'], int(data['source_count']))
+
+
+def bilinear_weights(locator, lat, lon):
+    """Bilinear weights of points with respect to the flattened cells of a grid.
+
+    Points outside the grid get no weights. Near the edge, the 2x2 stencil is shifted inwards.
+    """
+    fy, fx = locator.locate(np.ravel(lat), np.ravel(lon))
+    max_y, max_x = locator.shape
+    inside = (fy >= -0.5) & (fy <= max_y - 0.5) & (fx >= -0.5) & (fx <= max_x - 0.5)
+
+    fy = np.clip(fy, 0, max_y - 1)
+    fx = np.clip(fx, 0, max_x - 1)
+    y0 = np.clip(np.floor(fy).astype(np.int64), 0, max(max_y - 2, 0))
+    x0 = np.clip(np.floor(fx).astype(np.int64), 0, max(max_x - 2, 0))
+    y1 = np.minimum(y0 + 1, max_y - 1)
+    x1 = np.minimum(x0 + 1, max_x - 1)
+    wy = fy - y0
+    wx = fx - x0
+
+    indices = np.stack([y0 * max_x + x0, y0 * max_x + x1, y1 * max_x + x0, y1 * max_x + x1], axis=-1)
+    weights = np.stack([(1 - wy) * (1 - wx), (1 - wy) * wx, wy * (1 - wx), wy * wx], axis=-1)
+    weights[~inside] = 0.0
+    return InterpolationWeights(indices, weights, max_y * max_x)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Vectorized great-circle distance in kilometers (broadcasting over the inputs)."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def idw_weights(source_lat, source_lon, target_lat, target_lon, k=8, power=2.0, max_distance_km=None):
+    """Inverse distance weights of targets with respect to their k nearest sources.
+
+    Distances are floored at 10 m, so a target on top of a source is dominated by that source.
+    """
+    source_lat = np.asarray(source_lat, dtype=np.float64)
+    source_lon = np.asarray(source_lon, dtype=np.float64)
+    target_lat = np.ravel(target_lat).astype(np.float64)
+    target_lon = np.ravel(target_lon).astype(np.float64)
+    k = min(k, len(source_lat))
+
+    indices = np.zeros((len(target_lat), k), dtype=np.int64)
+    weights = np.zeros((len(target_lat), k), dtype=np.float64)
+    if not k:
+        return InterpolationWeights(indices, weights, 0)
+
+    for start in range(0, len(target_lat), DISTANCE_BLOCK_SIZE):
+        block = slice(start, start + DISTANCE_BLOCK_SIZE)
+        distances = haversine_km(target_lat[block, None], target_lon[block, None], source_lat, source_lon)
+        if k < len(source_lat):
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            nearest = np.tile(np.arange(k), (len(distances), 1))
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+
+        block_weights = 1.0 / np.maximum(nearest_distances, 0.01) ** power
+        if max_distance_km is not None:
+            block_weights[nearest_distances > max_distance_km] = 0.0
+
+        indices[block] = nearest
+        weights[block] = block_weights
+
+    return InterpolationWeights(indices, weights, len(source_lat))
+
+
+def grid_to_points(args):
+    """Bilinearly interpolate a variable of one or more files to a list of points."""
+    points = pd.read_csv(args.points)
+    frames = []
+    weights = None
+    for file_path in args.file:
+        with xr.open_dataset(file_path) as ds:
+            if weights is None:
+                weights = bilinear_weights(GridLocator.from_dataset(ds), points['lat'].values, points['lon'].values)
+            var = select_variable(ds, args.var)
+            values = var.values.reshape(var.sizes['time'], -1)
+            frame = pd.DataFrame(weights.apply(values), columns=points['name'].values)
+            frame.insert(0, 'date', pd.to_datetime(ds.time.values).strftime('%Y-%m-%d'))
+            frames.append(frame)
+            logger.info(f"Interpolated {len(frame)} days of {file_path}")
+
+    result = pd.concat(frames).melt(id_vars='date', var_name='name', value_name=args.var)
+    result.to_csv(args.output_file, index=False, float_format='%.2f')
+    logger.info(f"Saved {len(result)} rows to {args.output_file}")
+
+
+def load_idw_weights(stations, ds, args):
+    """Return the IDW weights of the stations for the grid, computing and caching them if needed."""
+    lat = ds['lat'].values
+    lon = ds['lon'].values
+    digest = hashlib.sha256()
+    digest.update(stations[['lat', 'lon']].to_numpy(dtype=np.float64).tobytes())
+    digest.update(lat.astype(np.float64).tobytes() + lon.astype(np.float64).tobytes())
+    digest.update(f"{args.k}|{args.power}|{args.max_distance}".encode('utf-8'))
+
+    cache_dir = Path(args.cache_dir)
+    cache_file = cache_dir / f"idw_weights_{digest.hexdigest()[:16]}.npz"
+    if cache_file.exists():
+        logger.info(f"Using cached interpolation weights {cache_file}")
+        return InterpolationWeights.load(cache_file)
+
+    weights = idw_weights(stations['lat'].values, stations['lon'].values, lat, lon,
+                          args.k, args.power, args.max_distance)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    weights.save(cache_file)
+    logger.info(f"Saved interpolation weights to {cache_file}")
+    return weights
+
+
+def stations_to_grid(args):
+    """Interpolate a column of a station CSV onto a HYRAS grid and write it as NetCDF."""
+    stations = pd.read_csv(args.stations, dtype={'station_id': str})
+    if args.column not in stations.columns:
+        logger.error(f"Column {args.column} not found in {args.stations}")
+        return
+    stations = stations.dropna(subset=['lat', 'lon']).reset_index(drop=True)
+
+    with xr.open_dataset(args.grid) as ds:
+        weights = load_idw_weights(stations, ds, args)
+        values = pd.to_numeric(stations[args.column], errors='coerce').to_numpy(dtype=np.float64)
+        field = weights.apply(values).reshape(ds['lat'].shape).astype(np.float32)
+
+        dims = ds['lat'].dims
+        result = xr.Dataset({args.column: (dims, field)},
+                            coords={'lat': (dims, ds['lat'].values), 'lon': (dims, ds['lon'].values)})
+        for dim in dims:
+            if dim in ds.coords:
+                result = result.assign_coords({dim: ds[dim].values})
+
+    result[args.column].attrs['interpolation'] = f"idw k={args.k} power={args.power} max_distance_km={args.max_distance}"
+    result.to_netcdf(args.output_file)
+    logger.info(f"Interpolated {len(stations)} stations to a {field.shape} grid: {args.output_file}")
+
+
+def main():
+    args = parse_arguments()
+    if args.command == 'grid-to-points':
+        grid_to_points(args)
+    else:
+        stations_to_grid(args)
+
+
+if __name__ == "__main__":
+    main()
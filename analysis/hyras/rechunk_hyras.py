@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Re-chunk yearly HYRAS NetCDF files into a single time-series-optimized NetCDF store.
+
+The yearly files from fetch_hyras_data.py are chunked by day, so reading the full series of one
+cell touches one chunk per day in every yearly file. This tool concatenates the yearly files of a
+variable into one file chunked as (all days, 32, 32) with zlib compression, so the complete
+series of a cell is a single chunk read.
+
+The conversion runs out of core: the grid is processed in bands of rows whose full time series
+fits into --max-memory-mb, each band is read from every yearly file and written as complete
+output chunks. Values are copied raw (without masking and scaling), so packed variables keep
+their encoding.
+
+Commands:
+    python rechunk_hyras.py rechunk --input-dir ./data/netcdf --var tasmax --output-dir ./data/timeseries
+    python rechunk_hyras.py point --store ./data/timeseries/tasmax_hyras_5_1951-2020_timeseries.nc --var tasmax --lat 52.52 --lon 13.40
+"""
+
+import re
+import time
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import netCDF4
+
+from hyras_grid import GridLocator
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+# Spatial size of the output chunks
+SPATIAL_CHUNK = 32
+# Year in HYRAS file names, e.g. tasmax_hyras_5_2019_v5-0_de.nc
+YEAR_PATTERN = re.compile(r'_(\d{4})_')
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Re-chunk yearly HYRAS NetCDF files for time series access')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rechunk = subparsers.add_parser('rechunk', help='Concatenate yearly files into one time-chunked store')
+    rechunk.add_argument('--input-dir', type=str, default='./data/netcdf', help='Directory of the yearly files')
+    rechunk.add_argument('--var', action='append', required=True,
+                         help='Variable(s) to re-chunk, one output file per variable')
+    rechunk.add_argument('--start-year', type=int, help='First year to include')
+    rechunk.add_argument('--end-year', type=int, help='Last year to include')
+    rechunk.add_argument('--output-dir', type=str, default='./data/timeseries', help='Output directory')
+    rechunk.add_argument('--max-memory-mb', type=int, default=1024,
+                         help='Upper bound for the band of data held in memory')
+    rechunk.add_argument('--complevel', type=int, default=4, help='zlib compression level')
+
+    point = subparsers.add_parser('point', help='Read the series of the cell nearest to a point')
+    point.add_argument('--store', type=str, required=True, help='Re-chunked NetCDF file')
+    point.add_argument('--var', type=str, required=True, help='Variable to read')
+    point.add_argument('--lat', type=float, required=True, help='Latitude of the point')
+    point.add_argument('--lon', type=float, required=True, help='Longitude of the point')
+    point.add_argument('--output-file', type=str, help='Optional CSV file for the series')
+    return parser.parse_args()
+
+
+def find_yearly_files(input_dir, var_name, start_year=None, end_year=None):
+    """Return the yearly files of a variable sorted by year."""
+    files = []
+    for file_path in Path(input_dir).glob(f"{var_name}_*.nc"):
+        match = YEAR_PATTERN.search(file_path.name)
+        if not match:
+            continue
+        year = int(match.group(1))
+        if (start_year is None or year >= start_year) and (end_year is None or year <= end_year):
+            files.append((year, file_path))
+    return sorted(files)
+
+
+def copy_attributes(source, target):
+    target.setncatts({name: source.getncattr(name) for name in source.ncattrs() if name != '_FillValue'})
+
+
+def band_shape(days, ny, nx, itemsize, max_memory_mb):
+    """Rows and columns per band, multiples of the chunk size, so that a band fits into the budget."""
+    budget = max_memory_mb * 1024 * 1024
+    column_bytes = days * SPATIAL_CHUNK * itemsize
+    columns = max(SPATIAL_CHUNK, min(nx, budget // column_bytes) // SPATIAL_CHUNK * SPATIAL_CHUNK)
+    rows = max(SPATIAL_CHUNK, budget // (days * columns * itemsize) // SPATIAL_CHUNK * SPATIAL_CHUNK)
+    return min(rows, max(ny, SPATIAL_CHUNK)), min(columns, max(nx, SPATIAL_CHUNK))
+
+
+def rechunk_variable(files, var_name, output_file, max_memory_mb, complevel):
+    """Write the yearly files of one variable into a single time-chunked file."""
+    sources = [netCDF4.Dataset(file_path) for _, file_path in files]
+    try:
+        for source in sources:
+            source.set_auto_maskandscale(False)
+
+        first = sources[0]
+        source_var = first.variables[var_name]
+        time_var = first.variables['time']
+        y_dim, x_dim = source_var.dimensions[-2:]
+        ny, nx = len(first.dimensions[y_dim]), len(first.dimensions[x_dim])
+
+        # Convert the time axes of all files to the units of the first file
+        time_values, offsets = [], [0]
+        for source in sources:
+            source_time = source.variables['time']
+            dates = netCDF4.num2date(source_time[:], source_time.units, getattr(source_time, 'calendar', 'standard'))
+            time_values.append(netCDF4.date2num(dates, time_var.units, getattr(time_var, 'calendar', 'standard')))
+            offsets.append(offsets[-1] + len(dates))
+        days = offsets[-1]
+
+        rows, columns = band_shape(days, ny, nx, source_var.dtype.itemsize, max_memory_mb)
+        logger.info(f"Re-chunking {len(sources)} files of {var_name} ({days} days, {ny}x{nx} cells) "
+                    f"in bands of {rows}x{columns} cells")
+
+        with netCDF4.Dataset(output_file, 'w', format='NETCDF4') as target:
+            target.set_auto_maskandscale(False)
+            copy_attributes(first, target)
+            target.createDimension('time', days)
+            target.createDimension(y_dim, ny)
+            target.createDimension(x_dim, nx)
+
+            out_time = target.createVariable('time', time_var.dtype, ('time',))
+            copy_attributes(time_var, out_time)
+            out_time[:] = np.concatenate(time_values)
+
+            # Coordinates of the grid
+            for name in (y_dim, x_dim, 'lat', 'lon'):
+                if name in first.variables:
+                    coordinate = first.variables[name]
+                    out_coordinate = target.createVariable(name, coordinate.dtype, coordinate.dimensions,
+                                                           zlib=True, complevel=complevel)
+                    copy_attributes(coordinate, out_coordinate)
+                    out_coordinate[:] = coordinate[:]
+
+            fill_value = source_var.getncattr('_FillValue') if '_FillValue' in source_var.ncattrs() else None
+            out_var = target.createVariable(
+                var_name, source_var.dtype, ('time', y_dim, x_dim), zlib=True, complevel=complevel, shuffle=True,
+                chunksizes=(days, min(SPATIAL_CHUNK, ny), min(SPATIAL_CHUNK, nx)), fill_value=fill_value)
+            copy_attributes(source_var, out_var)
+
+            band = np.empty((days, rows, columns), dtype=source_var.dtype)
+            for y0 in range(0, ny, rows):
+                y1 = min(y0 + rows, ny)
+                for x0 in range(0, nx, columns):
+                    x1 = min(x0 + columns, nx)
+                    start = time.time()
+                    for source, t0, t1 in zip(sources, offsets[:-1], offsets[1:]):
+                        band[t0:t1, :y1 - y0, :x1 - x0] = source.variables[var_name][:, y0:y1, x0:x1]
+                    # Complete output chunks, so no chunk is compressed twice
+                    out_var[:, y0:y1, x0:x1] = band[:, :y1 - y0, :x1 - x0]
+                    logger.info(f"Wrote rows {y0}-{y1 - 1}, columns {x0}-{x1 - 1} in {time.time() - start:.1f}s")
+    finally:
+        for source in sources:
+            source.close()
+
+
+def read_point_series(store, var_name, lat, lon):
+    """Read the series of the cell nearest to a point from a re-chunked store.
+
+    Returns (dates, values, (y, x)), or None if the point is outside the grid.
+    """
+    with netCDF4.Dataset(store) as ds:
+        locator = GridLocator(ds.variables['lat'][:], ds.variables['lon'][:])
+        flat_index = int(locator.nearest_flat_index(np.array([lat]), np.array([lon]))[0])
+        if flat_index < 0:
+            return None
+        y, x = divmod(flat_index, locator.shape[1])
+
+        # A single chunk holds the full series of the cell
+        values = np.ma.filled(ds.variables[var_name][:, y, x].astype(np.float64), np.nan)
+        time_var = ds.variables['time']
+        dates = netCDF4.num2date(time_var[:], time_var.units, getattr(time_var, 'calendar', 'standard'))
+        return dates, values, (y, x)
+
+
+def main():
+    args = parse_arguments()
+
+    if args.command == 'point':
+        start = time.time()
+        result = read_point_series(args.store, args.var, args.lat, args.lon)
+        if result is None:
+            logger.error(f"Point {args.lat}, {args.lon} is outside the grid of {args.store}")
+            return
+        dates, values, (y, x) = result
+        logger.info(f"Read {len(values)} days of cell y={y}, x={x} in {(time.time() - start) * 1000:.1f} ms")
+        if args.output_file:
+            with open(args.output_file, 'w', encoding='utf-8') as f:
+                f.write(f"date,{args.var}\n")
+                for date, value in zip(dates, values):
+                    f.write(f"{date.strftime('%Y-%m-%d')},{'' if np.isnan(value) else f'{value:.2f}'}\n")
+            logger.info(f"Saved series to {args.output_file}")
+        return
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for var_name in args.var:
+        files = find_yearly_files(args.input_dir, var_name, args.start_year, args.end_year)
+        if not files:
+            logger.warning(f"No files found for {var_name} in {args.input_dir}")
+            continue
+
+        first_year, last_year = files[0][0], files[-1][0]
+        resolution = files[0][1].name.split('_')[2]
+        output_file = output_dir / f"{var_name}_hyras_{resolution}_{first_year}-{last_year}_timeseries.nc"
+        tmp_file = output_file.with_suffix('.tmp')
+        rechunk_variable(files, var_name, tmp_file, args.max_memory_mb, args.complevel)
+        tmp_file.replace(output_file)
+        logger.info(f"Saved {output_file}")
+
+
+if __name__ == "__main__":
+    main()
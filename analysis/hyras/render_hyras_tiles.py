@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Render HYRAS grids (or anomaly grids on the same grid) into an XYZ tile pyramid.
+
+For every zoom level the tiles covering the grid and, for every tile pixel, the nearest grid cell
+are computed once. Rendering a day is then a single fancy-indexing lookup per tile followed by a
+vectorized colormap lookup table, so the cost per tile does not depend on the grid resolution.
+
+A manifest in the output directory stores a hash of every rendered day's data and rendering
+parameters, so re-running the pipeline only re-renders days whose input changed.
+
+Output layout: <output-dir>/<var>/<YYYY-MM-DD>/<z>/<x>/<y>.<png|webp>
+"""
+
+import os
+import json
+import math
+import hashlib
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+import matplotlib
+from PIL import Image
+
+from hyras_grid import GridLocator, select_variable
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+MANIFEST_NAME = 'manifest.json'
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Render HYRAS NetCDF grids into an XYZ tile pyramid')
+    parser.add_argument('--file', action='append', required=True,
+                        help='NetCDF file(s) to render. Can be specified multiple times.')
+    parser.add_argument('--var', type=str, required=True,
+                        help='Variable to render (e.g., tasmax or an anomaly variable)')
+    parser.add_argument('--output-dir', type=str, default='./data/tiles',
+                        help='Output directory of the tile pyramid')
+    parser.add_argument('--min-zoom', type=int, default=5, help='Lowest zoom level to render')
+    parser.add_argument('--max-zoom', type=int, default=8, help='Highest zoom level to render')
+    parser.add_argument('--vmin', type=float, required=True, help='Value mapped to the lowest color')
+    parser.add_argument('--vmax', type=float, required=True, help='Value mapped to the highest color')
+    parser.add_argument('--cmap', type=str, default='viridis', help='Matplotlib colormap name')
+    parser.add_argument('--format', type=str, choices=['png', 'webp'], default='png', help='Tile image format')
+    parser.add_argument('--start-date', type=str, help='First date to render (YYYY-MM-DD)')
+    parser.add_argument('--end-date', type=str, help='Last date to render (YYYY-MM-DD)')
+    parser.add_argument('--chunk-days', type=int, default=31,
+                        help='Number of days read from the NetCDF file at once')
+    parser.add_argument('--force', action='store_true', help='Re-render all days, ignoring the manifest')
+    return parser.parse_args()
+
+
+def tile_bounds_for_extent(lat_min, lat_max, lon_min, lon_max, zoom):
+    """Return the range of XYZ tile indices (x0, x1, y0, y1) covering a lat/lon extent."""
+    def tile_xy(lat, lon):
+        n = 2 ** zoom
+        x = int((lon + 180.0) / 360.0 * n)
+        lat_rad = math.radians(lat)
+        y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+        return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+    x0, y0 = tile_xy(lat_max, lon_min)
+    x1, y1 = tile_xy(lat_min, lon_max)
+    return x0, x1, y0, y1
+
+
+def tile_pixel_coordinates(zoom, tile_x, tile_y):
+    """Return 2D arrays with the lat/lon of every pixel center of a Web Mercator tile."""
+    n = 2 ** zoom
+    offsets = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    lon = (tile_x + offsets) / n * 360.0 - 180.0
+    merc_y = np.pi * (1 - 2 * (tile_y + offsets) / n)
+    lat = np.degrees(np.arctan(np.sinh(merc_y)))
+    lon_grid, lat_grid = np.meshgrid(lon, lat)
+    return lat_grid, lon_grid
+
+
+def build_tile_index(locator, zoom):
+    """Map the pixels of every tile at a zoom level to flat grid indices (-1 outside the grid).
+
+    Tiles that do not touch the grid are left out.
+    """
+    x0, x1, y0, y1 = tile_bounds_for_extent(locator.lat.min(), locator.lat.max(),
+                                            locator.lon.min(), locator.lon.max(), zoom)
+    tiles = {}
+    for tile_x in range(x0, x1 + 1):
+        for tile_y in range(y0, y1 + 1):
+            lat, lon = tile_pixel_coordinates(zoom, tile_x, tile_y)
+            flat_index = locator.nearest_flat_index(lat, lon).astype(np.int32)
+            if (flat_index >= 0).any():
+                tiles[(tile_x, tile_y)] = flat_index
+    return tiles
+
+
+def build_color_lut(cmap_name):
+    """Return a 256x4 uint8 RGBA lookup table for a matplotlib colormap."""
+    cmap = matplotlib.colormaps[cmap_name]
+    return (cmap(np.linspace(0.0, 1.0, 256)) * 255).round().astype(np.uint8)
+
+
+def colorize(values, lut, vmin, vmax):
+    """Map values to RGBA with the lookup table, NaN becomes fully transparent."""
+    valid = np.isfinite(values)
+    scaled = (np.nan_to_num(values, nan=vmin) - vmin) / (vmax - vmin)
+    indices = np.clip((scaled * 255).round(), 0, 255).astype(np.uint8)
+    rgba = lut[indices]
+    rgba[~valid, 3] = 0
+    return rgba
+
+
+def render_day(day_values, tile_indices, lut, vmin, vmax, day_dir, image_format):
+    """Render all tiles of one day. Returns the number of tiles written."""
+    # Append a NaN so that index -1 (outside the grid) becomes transparent
+    flat_values = np.append(day_values.ravel().astype(np.float32), np.float32(np.nan))
+
+    written = 0
+    for zoom, tiles in tile_indices.items():
+        for (tile_x, tile_y), flat_index in tiles.items():
+            values = flat_values[flat_index]
+            if not np.isfinite(values).any():
+                continue
+            tile_dir = day_dir / str(zoom) / str(tile_x)
+            tile_dir.mkdir(parents=True, exist_ok=True)
+            image = Image.fromarray(colorize(values, lut, vmin, vmax), mode='RGBA')
+            if image_format == 'webp':
+                image.save(tile_dir / f"{tile_y}.webp", format='WEBP', lossless=True)
+            else:
+                image.save(tile_dir / f"{tile_y}.png", format='PNG', compress_level=6)
+            written += 1
+    return written
+
+
+def day_hash(day_values, render_params):
+    """Hash of a day's data together with the rendering parameters."""
+    digest = hashlib.sha256(np.ascontiguousarray(day_values, dtype=np.float32).tobytes())
+    digest.update(json.dumps(render_params, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir):
+    manifest_path = output_dir / MANIFEST_NAME
+    if manifest_path.exists():
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(output_dir, manifest):
+    manifest_path = output_dir / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def render_file(file_path, args, output_dir, manifest, tile_indices_cache, lut):
+    """Render all selected days of one NetCDF file. Returns (rendered days, skipped days)."""
+    ds = xr.open_dataset(file_path)
+    try:
+        if args.var not in ds:
+            logger.warning(f"Variable {args.var} not found in {file_path}. Skipping this file.")
+            return 0, 0
+
+        var = select_variable(ds, args.var)
+
+        # The tile index only depends on the grid, so it is shared by files on the same grid
+        grid_key = hashlib.sha256(ds['lat'].values.tobytes() + ds['lon'].values.tobytes()).hexdigest()
+        if grid_key not in tile_indices_cache:
+            locator = GridLocator.from_dataset(ds)
+            tile_indices_cache[grid_key] = {
+                zoom: build_tile_index(locator, zoom) for zoom in range(args.min_zoom, args.max_zoom + 1)
+            }
+            tile_count = sum(len(tiles) for tiles in tile_indices_cache[grid_key].values())
+            logger.info(f"Built tile index with {tile_count} tiles for zoom {args.min_zoom}-{args.max_zoom}")
+        tile_indices = tile_indices_cache[grid_key]
+
+        dates = pd.to_datetime(ds.time.values)
+        selected = np.ones(len(dates), dtype=bool)
+        if args.start_date:
+            selected &= dates >= pd.Timestamp(args.start_date)
+        if args.end_date:
+            selected &= dates <= pd.Timestamp(args.end_date)
+        time_indices = np.flatnonzero(selected)
+
+        render_params = {'vmin': args.vmin, 'vmax': args.vmax, 'cmap': args.cmap, 'format': args.format,
+                         'min_zoom': args.min_zoom, 'max_zoom': args.max_zoom}
+        rendered = skipped = 0
+
+        for chunk_start in range(0, len(time_indices), args.chunk_days):
+            chunk = time_indices[chunk_start:chunk_start + args.chunk_days]
+            # One read for the whole chunk of days
+            slab = var.isel(time=slice(int(chunk[0]), int(chunk[-1]) + 1)).values
+            for time_index in chunk:
+                date_str = dates[time_index].strftime('%Y-%m-%d')
+                day_values = slab[time_index - chunk[0]]
+                digest = day_hash(day_values, render_params)
+                if not args.force and manifest.get(date_str) == digest:
+                    skipped += 1
+                    continue
+
+                tiles = render_day(day_values, tile_indices, lut, args.vmin, args.vmax,
+                                   output_dir / date_str, args.format)
+                manifest[date_str] = digest
+                rendered += 1
+                logger.info(f"Rendered {tiles} tiles for {date_str}")
+
+            # Persist progress so an interrupted run does not re-render finished days
+            save_manifest(output_dir, manifest)
+
+        return rendered, skipped
+    finally:
+        ds.close()
+
+
+def main():
+    args = parse_arguments()
+
+    output_dir = Path(args.output_dir) / args.var
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest = load_manifest(output_dir)
+    lut = build_color_lut(args.cmap)
+    tile_indices_cache = {}
+
+    total_rendered = total_skipped = 0
+    for file_path in args.file:
+        logger.info(f"Rendering {file_path}")
+        rendered, skipped = render_file(file_path, args, output_dir, manifest, tile_indices_cache, lut)
+        total_rendered += rendered
+        total_skipped += skipped
+
+    logger.info(f"Rendering complete! Rendered {total_rendered} days, {total_skipped} days unchanged")
+
+
+if __name__ == "__main__":
+    main()
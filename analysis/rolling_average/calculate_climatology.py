@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Build a day-of-year climatology from the city/station CSV files of extract_hyras_data.py.
+
+For every grid cell, metric and calendar day the values of a base period are pooled over a
+window of +/- `window` days around the day and reduced to their mean and a fixed set of
+quantiles. The result is written as a single .npz file that the live anomaly stage
+(analysis/stations/compute_live_anomalies.py) loads in milliseconds:
+
+    grid_y, grid_x, city_ids   (cells,)
+    metrics                    (metrics,)
+    levels                     (levels,)   quantile levels in percent
+    mean                       (cells, metrics, 366)
+    quantiles                  (cells, metrics, 366, levels)
+
+Calendar days are indexed 0..365 on a leap-year calendar, so Feb 29 has its own index and
+every other date maps to the same index in every year.
+
+With --cache-dir the statistics of every city file are cached, so adding cities or files to the
+data directory only computes the statistics of the new ones.
+"""
+
+import re
+import sys
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'common'))
+from artifact_cache import add_cache_arguments, code_version, open_cache
+from calendar_days import CALENDAR_DAYS, calendar_day_indices
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Calculate a day-of-year climatology for climate data.')
+    parser.add_argument('--data-dir', type=str, default='data',
+                        help='Directory containing the CSV files of extract_hyras_data.py')
+    parser.add_argument('--from-year', type=int, default=1991,
+                        help='First year of the base period')
+    parser.add_argument('--to-year', type=int, default=2020,
+                        help='Last year of the base period')
+    parser.add_argument('--window', type=int, default=7,
+                        help='Days before and after each calendar day pooled into its distribution')
+    parser.add_argument('--metric', type=str, action='append',
+                        help='Metric column(s) to include (default: tas, tasmax and tasmin)')
+    parser.add_argument('--quantile-step', type=float, default=5.0,
+                        help='Step between the stored quantile levels in percent')
+    parser.add_argument('--output-file', type=str, default='climatology.npz',
+                        help='Output .npz file')
+    add_cache_arguments(parser)
+    return parser.parse_args()
+
+
+def day_of_year_matrix(dates, values, from_year, to_year):
+    """Arrange a daily series into a (years, 366) matrix, NaN for missing days."""
+    years = pd.DatetimeIndex(dates).year.to_numpy()
+    selected = (years >= from_year) & (years <= to_year)
+    matrix = np.full((to_year - from_year + 1, CALENDAR_DAYS), np.nan)
+    matrix[years[selected] - from_year, calendar_day_indices(dates[selected])] = values[selected]
+    return matrix
+
+
+def pooled_statistics(matrix, window, levels):
+    """Mean and quantiles per calendar day of a (years, 366) matrix, pooled over +/- window days.
+
+    The calendar wraps around, so the window of Jan 1 includes the end of December.
+    """
+    offsets = np.arange(-window, window + 1)
+    pool_index = (np.arange(CALENDAR_DAYS)[:, None] + offsets[None, :]) % CALENDAR_DAYS
+    # (366, years * (2 * window + 1)) samples per calendar day
+    pooled = matrix[:, pool_index].transpose(1, 0, 2).reshape(CALENDAR_DAYS, -1)
+
+    valid = np.isfinite(pooled).any(axis=1)
+    mean = np.full(CALENDAR_DAYS, np.nan)
+    quantiles = np.full((CALENDAR_DAYS, len(levels)), np.nan)
+    if valid.any():
+        mean[valid] = np.nanmean(pooled[valid], axis=1)
+        quantiles[valid] = np.nanpercentile(pooled[valid], levels, axis=1).T
+    return mean, quantiles
+
+
+def process_file(file_path, metrics, from_year, to_year, window, levels):
+    """Return (grid_y, grid_x, city_id, mean, quantiles) of one city file, or None if it is skipped."""
+    match = re.match(r'([0-9]+)_([0-9]+)_(.+)\.csv$', file_path.name)
+    if not match:
+        print(f"Skipping {file_path.name}: doesn't match expected naming pattern")
+        return None
+
+    df = pd.read_csv(file_path)
+    if 'date' not in df.columns:
+        print(f"Skipping {file_path.name}: no date column found")
+        return None
+
+    dates = pd.to_datetime(df['date'])
+    mean = np.full((len(metrics), CALENDAR_DAYS), np.nan)
+    quantiles = np.full((len(metrics), CALENDAR_DAYS, len(levels)), np.nan)
+    for index, metric in enumerate(metrics):
+        if metric not in df.columns:
+            continue
+        matrix = day_of_year_matrix(dates, df[metric].to_numpy(dtype=np.float64), from_year, to_year)
+        mean[index], quantiles[index] = pooled_statistics(matrix, window, levels)
+
+    return int(match.group(1)), int(match.group(2)), match.group(3), mean, quantiles
+
+
+def cached_process_file(cache, file_path, metrics, from_year, to_year, window, levels):
+    """process_file() with the statistics of the file stored in the cache."""
+    key = cache.key(inputs=[file_path],
+                    params={'metrics': metrics, 'from_year': from_year, 'to_year': to_year, 'window': window,
+                            'levels': levels.tolist()},
+                    code=code_version(__file__))
+    meta = cache.lookup(key)
+    if meta is not None:
+        if meta.get('skipped'):
+            return None
+        with np.load(cache.path(key, 'statistics.npz')) as statistics:
+            return meta['grid_y'], meta['grid_x'], meta['city_id'], statistics['mean'], statistics['quantiles']
+
+    result = process_file(file_path, metrics, from_year, to_year, window, levels)
+    if result is None:
+        cache.put(key, meta={'skipped': True})
+        return None
+    grid_y, grid_x, city_id, mean, quantiles = result
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        statistics_path = Path(tmp_dir) / 'statistics.npz'
+        np.savez(statistics_path, mean=mean, quantiles=quantiles)
+        cache.put(key, {'statistics.npz': statistics_path}, meta={'grid_y': grid_y, 'grid_x': grid_x, 'city_id': city_id})
+    return result
+
+
+def main():
+    """Main function to build the climatology of all CSV files."""
+    args = parse_arguments()
+    cache = open_cache(args)
+
+    metrics = args.metric or ['tas', 'tasmax', 'tasmin']
+    levels = np.arange(0.0, 100.0 + args.quantile_step / 2, args.quantile_step)
+
+    file_pattern = re.compile(r'.+_.+_.+\.csv$')
+    csv_files = sorted(f for f in Path(args.data_dir).glob('*.csv') if file_pattern.match(f.name))
+    if not csv_files:
+        print(f"No CSV files matching the pattern found in {args.data_dir}")
+        return
+
+    print(f"Found {len(csv_files)} files to process")
+
+    cells = []
+    for file_path in csv_files:
+        if cache is not None:
+            result = cached_process_file(cache, file_path, metrics, args.from_year, args.to_year, args.window, levels)
+        else:
+            result = process_file(file_path, metrics, args.from_year, args.to_year, args.window, levels)
+        if result is not None:
+            cells.append(result)
+            print(f"Processed {file_path.name}")
+
+    if not cells:
+        print("No climatology computed")
+        return
+
+    grid_y, grid_x, city_ids, means, quantiles = zip(*cells)
+    output_file = Path(args.output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        output_file,
+        grid_y=np.array(grid_y, dtype=np.int32),
+        grid_x=np.array(grid_x, dtype=np.int32),
+        city_ids=np.array(city_ids),
+        metrics=np.array(metrics),
+        levels=levels.astype(np.float32),
+        mean=np.stack(means).astype(np.float32),
+        quantiles=np.stack(quantiles).astype(np.float32),
+        base_period=np.array([args.from_year, args.to_year], dtype=np.int32),
+        window=np.int32(args.window),
+    )
+    print(f"Saved climatology of {len(cells)} cells and {len(metrics)} metrics to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,18 @@
 
 import os
 import re
+import sys
 import argparse
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'common'))
+from city_cube import CityCube
+from instrumentation import add_report_arguments, configure_report, count, stage
+from profiling import add_profile_arguments, configure_profiling
+from artifact_cache import add_cache_arguments, code_version, open_cache
+
 
 def parse_arguments():
     """Parse command line arguments."""
@@ -21,11 +29,20 @@ def parse_arguments():
                         help='Rolling window size in days (before and after)')
     parser.add_argument('--output-dir', type=str, default='output',
                         help='Directory for the output files')
+    parser.add_argument('--cube', type=str,
+                        help='Read all cities from a city cube (path without extension) instead of the CSV files')
+    add_report_arguments(parser)
+    add_profile_arguments(parser)
+    add_cache_arguments(parser)
     return parser.parse_args()
 
 
-def process_file(file_path, from_year, to_year, rolling_window, output_dir):
-    """Process a single CSV file and create rolling averages."""
+def process_file(file_path, from_year, to_year, rolling_window, output_dir, cache=None):
+    """Process a single CSV file and create rolling averages.
+
+    With a cache, the output of an unchanged input file with the same parameters is copied from
+    the cache instead of being computed again.
+    """
     print(f"Processing {file_path.name}...")
     
     # Extract city-id from filename
@@ -38,15 +55,30 @@ def process_file(file_path, from_year, to_year, rolling_window, output_dir):
     grid_y = match.group(2)
     city_id = match.group(3)
     
-    # Read the CSV file
-    df = pd.read_csv(file_path)
+    # Name the output file with the same pattern but indicating rolling average
+    output_filename = f"avg_{rolling_window}d_{grid_x}_{grid_y}_{city_id}_{from_year}-{to_year}.csv"
+    output_path = os.path.join(output_dir, output_filename)
+
+    key = None
+    if cache is not None:
+        key = cache.key(inputs=[file_path],
+                        params={'from_year': from_year, 'to_year': to_year, 'rolling_window': rolling_window},
+                        code=code_version(__file__))
+        if cache.restore(key, {'result.csv': output_path}) is not None:
+            print(f"Restored {output_path} from the cache")
+            return
     
-    # Ensure the date column is in datetime format
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'])
-    else:
-        print(f"Skipping {file_path.name}: no date column found")
-        return
+    # Read the CSV file
+    with stage('read'):
+        df = pd.read_csv(file_path)
+        count(rows=len(df))
+        
+        # Ensure the date column is in datetime format
+        if 'date' in df.columns:
+            df['date'] = pd.to_datetime(df['date'])
+        else:
+            print(f"Skipping {file_path.name}: no date column found")
+            return
     
     # Sort by date to ensure proper sequence for rolling calculations
     df = df.sort_values('date')
@@ -58,10 +90,11 @@ def process_file(file_path, from_year, to_year, rolling_window, output_dir):
     result_df = df.copy()
     window_size = 2 * rolling_window + 1  # window includes current day plus days before and after
     
-    for metric in metrics:
-        result_df[metric] = df[metric].rolling(window=window_size, center=True, min_periods=1).mean()
-        # Round to 2 decimal places
-        result_df[metric] = result_df[metric].round(2)
+    with stage('rolling'):
+        for metric in metrics:
+            result_df[metric] = df[metric].rolling(window=window_size, center=True, min_periods=1).mean()
+            # Round to 2 decimal places
+            result_df[metric] = result_df[metric].round(2)
     
     # Step 2: Now filter to only include the specified year range in the output
     result_df = result_df[(result_df['date'].dt.year >= from_year) & 
@@ -70,24 +103,66 @@ def process_file(file_path, from_year, to_year, rolling_window, output_dir):
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Name the output file with the same pattern but indicating rolling average
-    output_filename = f"avg_{rolling_window}d_{grid_x}_{grid_y}_{city_id}_{from_year}-{to_year}.csv"
-    output_path = os.path.join(output_dir, output_filename)
-    
     # Save the result
-    result_df.to_csv(output_path, index=False)
+    with stage('write'):
+        result_df.to_csv(output_path, index=False)
+        count(rows=len(result_df), files=1)
     print(f"Created {output_path}")
+    if key is not None:
+        cache.put(key, {'result.csv': output_path})
+
+
+def process_cube(cube_path, from_year, to_year, rolling_window, output_dir):
+    """Create rolling averages for all cities of a city cube at once.
+
+    The rolling mean of every parameter is computed over a (days, cities) frame in one call,
+    instead of reading and rolling one CSV file per city.
+    """
+    cube = CityCube.open(cube_path)
+    dates = pd.DatetimeIndex(cube.dates())
+    in_range = (dates.year >= from_year) & (dates.year <= to_year)
+    window_size = 2 * rolling_window + 1  # window includes current day plus days before and after
+
+    print(f"Processing {len(cube.cities)} cities from {cube_path}...")
+    rolled = np.empty((len(cube.params), int(in_range.sum()), len(cube.cities)))
+    with stage('rolling'):
+        for index, param in enumerate(cube.params):
+            # (days, cities) frame of one parameter, a strided view into the memory-mapped cube
+            frame = pd.DataFrame(cube.data[:, :, index].T)
+            rolled[index] = frame.rolling(window=window_size, center=True, min_periods=1).mean().round(2)[in_range]
+        count(rows=cube.days * len(cube.cities))
+
+    os.makedirs(output_dir, exist_ok=True)
+    out_dates = dates[in_range].strftime('%Y-%m-%d')
+    for row, city in enumerate(cube.cities):
+        result_df = pd.DataFrame(rolled[:, :, row].T, columns=cube.params)
+        result_df.insert(0, 'date', out_dates)
+
+        output_filename = f"avg_{rolling_window}d_{city['grid_y']}_{city['grid_x']}_{city['id']}_{from_year}-{to_year}.csv"
+        output_path = os.path.join(output_dir, output_filename)
+        with stage('write'):
+            result_df.to_csv(output_path, index=False)
+            count(rows=len(result_df), files=1)
+        print(f"Created {output_path}")
 
 
 def main():
     """Main function to process all CSV files."""
     args = parse_arguments()
+    configure_report('calculate_rolling_average', args)
+    configure_profiling('calculate_rolling_average', args, args.output_dir)
+    cache = open_cache(args)
     
     data_dir = Path(args.data_dir)
     output_dir = Path(args.output_dir)
     
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
+
+    if args.cube:
+        process_cube(args.cube, args.from_year, args.to_year, args.rolling_window, output_dir)
+        print("Processing complete!")
+        return
     
     # Find all CSV files matching the pattern
     file_pattern = re.compile(r'.+_.+_.+\.csv$')
@@ -106,7 +181,8 @@ def main():
             args.from_year, 
             args.to_year, 
             args.rolling_window, 
-            output_dir
+            output_dir,
+            cache
         )
     
     print("Processing complete!")
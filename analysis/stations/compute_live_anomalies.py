@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Compare the latest 10-minute station readings with the day-of-year climatology.
+
+Runs after extract_10min_station_data.py. Every station is matched to its HYRAS cell through
+cities_metadata.csv (by station_id if the metadata has one, otherwise by its coordinates) and
+its current, min and max temperature are compared with the climatology of that cell written by
+analysis/rolling_average/calculate_climatology.py. The lookups and percentile ranks are computed
+for all stations at once with numpy.
+"""
+
+import argparse
+import csv
+import datetime
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'common'))
+from calendar_days import calendar_day_index
+
+# Station CSV column -> climatology metric it is compared with
+READING_METRICS = {
+    'temperature': 'tas',
+    'min_temperature': 'tasmin',
+    'max_temperature': 'tasmax',
+}
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Compute temperature anomalies of the latest station readings.')
+    parser.add_argument('--stations-file', type=str, required=True,
+                        help='CSV file written by extract_10min_station_data.py')
+    parser.add_argument('--climatology', type=str, required=True,
+                        help='Climatology .npz file written by calculate_climatology.py')
+    parser.add_argument('--cities-metadata', type=str, required=True,
+                        help='cities_metadata.csv written by extract_hyras_data.py for the stations')
+    parser.add_argument('--output-file', type=str, default='station_anomalies.csv',
+                        help='Path for the output CSV file')
+    return parser.parse_args()
+
+
+def coordinate_key(lat, lon):
+    """Key used to match stations and cities by their coordinates."""
+    return f"{float(lat):.4f},{float(lon):.4f}"
+
+
+def load_cell_lookup(cities_metadata):
+    """Map station ids and coordinate keys to (grid_y, grid_x) from cities_metadata.csv."""
+    by_station, by_coordinates = {}, {}
+    with open(cities_metadata, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if not row.get('grid_y') or not row.get('grid_x'):
+                continue
+            cell = (int(float(row['grid_y'])), int(float(row['grid_x'])))
+            if row.get('station_id'):
+                by_station[int(float(row['station_id']))] = cell
+            by_coordinates[coordinate_key(row['city_lat'], row['city_lon'])] = cell
+    return by_station, by_coordinates
+
+
+def percentile_rank(values, quantiles, levels):
+    """Vectorized percentile rank of values within per-row quantile tables.
+
+    values: (n,), quantiles: (n, levels) ascending, levels: (levels,) in percent. Values are
+    interpolated linearly between the quantiles and clamped to [0, 100].
+    """
+    above = (quantiles <= values[:, None]).sum(axis=1)
+    upper = np.clip(above, 1, len(levels) - 1)
+    rows = np.arange(len(values))
+    low_q, high_q = quantiles[rows, upper - 1], quantiles[rows, upper]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.clip((values - low_q) / (high_q - low_q), 0.0, 1.0)
+    fraction = np.where(high_q > low_q, fraction, 0.5)
+    rank = levels[upper - 1] + fraction * (levels[upper] - levels[upper - 1])
+    rank = np.where(above == 0, levels[0], np.where(above == len(levels), levels[-1], rank))
+    return np.where(np.isfinite(values) & np.isfinite(quantiles).all(axis=1), rank, np.nan)
+
+
+def compute_anomalies(stations, climatology, by_station, by_coordinates):
+    """Return one output row per station with anomaly and percentile rank of every reading."""
+    # Several cities may share a cell, the first row of a cell is used
+    cells = {}
+    for row, (y, x) in enumerate(zip(climatology['grid_y'], climatology['grid_x'])):
+        cells.setdefault((int(y), int(x)), row)
+    metrics = [str(metric) for metric in climatology['metrics']]
+    levels = climatology['levels'].astype(np.float64)
+
+    # Climatology row and calendar day of every station, -1 if the station has no matching cell
+    rows = np.full(len(stations), -1, dtype=np.int64)
+    days = np.zeros(len(stations), dtype=np.int64)
+    for index, station in enumerate(stations):
+        cell = by_station.get(int(station['station_id'])) or by_coordinates.get(
+            coordinate_key(station['lat'], station['lon']))
+        if cell is not None and cell in cells and station.get('data_date'):
+            rows[index] = cells[cell]
+            days[index] = calendar_day_index(datetime.datetime.strptime(station['data_date'], '%d.%m.%Y %H:%M'))
+
+    matched = rows >= 0
+    results = [{'station_id': station['station_id'], 'station_name': station['station_name'],
+                'data_date': station.get('data_date', ''), 'lat': station['lat'], 'lon': station['lon']}
+               for station in stations]
+
+    for column, metric in READING_METRICS.items():
+        if metric not in metrics:
+            continue
+        metric_index = metrics.index(metric)
+        values = np.array([float(station.get(column) or 'nan') for station in stations])
+
+        mean = np.full(len(stations), np.nan)
+        quantiles = np.full((len(stations), len(levels)), np.nan)
+        mean[matched] = climatology['mean'][rows[matched], metric_index, days[matched]]
+        quantiles[matched] = climatology['quantiles'][rows[matched], metric_index, days[matched]]
+
+        anomaly = values - mean
+        rank = percentile_rank(values, quantiles, levels)
+        for result, value, clim, diff, pct in zip(results, values, mean, anomaly, rank):
+            result[column] = f"{value:.1f}" if np.isfinite(value) else ''
+            result[f"{column}_climatology"] = f"{clim:.1f}" if np.isfinite(clim) else ''
+            result[f"{column}_anomaly"] = f"{diff:.1f}" if np.isfinite(diff) else ''
+            result[f"{column}_percentile"] = f"{pct:.0f}" if np.isfinite(pct) else ''
+
+    return results, int(matched.sum())
+
+
+def main():
+    """Main function to compute the anomalies of the latest station readings."""
+    args = parse_arguments()
+
+    with open(args.stations_file, newline='', encoding='utf-8') as f:
+        stations = list(csv.DictReader(f))
+    if not stations:
+        print(f"No stations found in {args.stations_file}")
+        return
+
+    with np.load(args.climatology) as data:
+        climatology = {key: data[key] for key in ('grid_y', 'grid_x', 'metrics', 'levels', 'mean', 'quantiles')}
+    by_station, by_coordinates = load_cell_lookup(args.cities_metadata)
+
+    results, matched = compute_anomalies(stations, climatology, by_station, by_coordinates)
+
+    with open(args.output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+    print(f"Wrote anomalies of {len(results)} stations ({matched} matched to the climatology) to {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
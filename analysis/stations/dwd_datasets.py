@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Declarations of the DWD station datasets the extractors can read.
+
+Every dataset is declared once with the names of its station description files, the pattern of
+its product files, the resolution of its MESS_DATUM timestamps, its missing value marker and the
+output names of its measurement columns. read_product_file() parses a product file of any of them
+into arrays and summarize_day() computes the statistics of a day from them; both station extractors
+and the checks of analysis/common/data_quality.py build on them.
+
+    python dwd_datasets.py                  # list the datasets
+"""
+
+import re
+import argparse
+from typing import NamedTuple
+
+# Columns that carry metadata rather than measurements
+METADATA_COLUMNS = {'STATIONS_ID', 'MESS_DATUM', 'eor'}
+QUALITY_COLUMN = re.compile(r'^QN(_\d+)?$')
+
+
+class DatasetSpec(NamedTuple):
+    name: str
+    # Station description files, the first one that exists in the data directory is used
+    description_files: tuple
+    # Product files inside the extracted zip directories, group 1 is the station id
+    file_pattern: re.Pattern
+    # Digits of MESS_DATUM: 12 (YYYYMMDDHHMM), 10 (YYYYMMDDHH) or 8 (YYYYMMDD)
+    timestamp_digits: int
+    missing_value: float
+    # DWD column -> output name, other measurement columns keep their lowercased DWD name
+    columns: dict
+    # Whether a day has several readings that are aggregated to mean/min/max, or a single value
+    intraday: bool
+    description: str
+
+    def column_name(self, column):
+        return self.columns.get(column, column.lower())
+
+    def is_measurement(self, column):
+        return bool(column) and column not in METADATA_COLUMNS and not QUALITY_COLUMN.match(column)
+
+    def to_minutes(self, timestamps):
+        """Scale MESS_DATUM values to YYYYMMDDHHMM."""
+        return timestamps * 10 ** (12 - self.timestamp_digits)
+
+
+class ProductFile(NamedTuple):
+    """Arrays of a parsed product file, one row per reading and one column per measurement column."""
+    columns: list
+    # MESS_DATUM scaled to YYYYMMDDHHMM
+    timestamps: object
+    # Readings, missing and malformed values are NaN
+    values: object
+    # True where the file holds the missing value marker
+    markers: object
+    # QN_* quality level of every reading, NaN for columns without a quality column
+    flags: object
+
+
+TEN_MINUTES = DatasetSpec(
+    name='10min',
+    description_files=('zehn_now_tu_Beschreibung_Stationen.txt', 'zehn_min_tu_Beschreibung_Stationen.txt'),
+    file_pattern=re.compile(r'^produkt_zehn_(?:now|akt|min)_tu_\d+_\d+_(\d+)\.txt$'),
+    timestamp_digits=12,
+    missing_value=-999.0,
+    columns={
+        'TT_10': 'temperature',          # Air temperature 2m (°C)
+        'RF_10': 'humidity',             # Relative humidity 2m (%)
+        'PP_10': 'pressure',             # Air pressure at station height (hPa)
+        'TM5_10': 'ground_temperature',  # Air temperature 5cm (°C)
+        'TD_10': 'dew_point',            # Dew point temperature 2m (°C)
+    },
+    intraday=True,
+    description='10-minute air temperature (10_minutes/air_temperature)',
+)
+
+HOURLY_TU = DatasetSpec(
+    name='hourly',
+    description_files=('TU_Stundenwerte_Beschreibung_Stationen.txt',),
+    file_pattern=re.compile(r'^produkt_tu_stunde_\d+_\d+_(\d+)\.txt$'),
+    timestamp_digits=10,
+    missing_value=-999.0,
+    columns={
+        'TT_TU': 'temperature',  # Air temperature 2m (°C)
+        'RF_TU': 'humidity',     # Relative humidity 2m (%)
+    },
+    intraday=True,
+    description='Hourly air temperature (hourly/air_temperature)',
+)
+
+DAILY_KL = DatasetSpec(
+    name='daily',
+    description_files=('KL_Tageswerte_Beschreibung_Stationen.txt',),
+    file_pattern=re.compile(r'^produkt_klima_tag_\d+_\d+_(\d+)\.txt$'),
+    timestamp_digits=8,
+    missing_value=-999.0,
+    columns={
+        'TMK': 'temperature',             # Daily mean air temperature 2m (°C)
+        'TXK': 'max_temperature',         # Daily maximum air temperature 2m (°C)
+        'TNK': 'min_temperature',         # Daily minimum air temperature 2m (°C)
+        'TGK': 'min_ground_temperature',  # Daily minimum air temperature 5cm (°C)
+        'UPM': 'humidity',                # Daily mean relative humidity (%)
+        'PM': 'pressure',                 # Daily mean air pressure at station height (hPa)
+        'VPM': 'vapour_pressure',         # Daily mean vapour pressure (hPa)
+        'NM': 'cloud_cover',              # Daily mean cloud cover (1/8)
+        'FX': 'max_wind_gust',            # Daily maximum wind gust (m/s)
+        'FM': 'wind_speed',               # Daily mean wind speed (m/s)
+        'RSK': 'precipitation',           # Daily precipitation height (mm)
+        'RSKF': 'precipitation_form',     # Daily precipitation form (code)
+        'SDK': 'sunshine_duration',       # Daily sunshine duration (h)
+        'SHK_TAG': 'snow_depth',          # Daily snow depth (cm)
+    },
+    intraday=False,
+    description='Daily climate observations (daily/kl)',
+)
+
+DATASETS = {spec.name: spec for spec in (TEN_MINUTES, HOURLY_TU, DAILY_KL)}
+
+
+def parse_rows(lines, column_indices):
+    """Row-by-row fallback of read_product_file() for files with empty or malformed fields."""
+    import numpy as np
+    data = np.full((len(lines), len(column_indices)), np.nan)
+    for row, line in enumerate(lines):
+        parts = line.split(';')
+        for position, index in enumerate(column_indices):
+            try:
+                data[row, position] = float(parts[index])
+            except (IndexError, ValueError):
+                pass
+    return data
+
+
+def read_product_file(file_path, spec):
+    """Parse a product file into a ProductFile, raises ValueError for a file without a header.
+
+    A QN_* column holds the quality level of the measurement columns that follow it, up to the
+    next QN_* column (QN for all columns of the 10-minute files, QN_3 for the wind and QN_4 for
+    the other columns of the daily files).
+    """
+    # numpy is imported on use, so the scripts importing the declarations start fast
+    import numpy as np
+
+    with open(file_path, 'r', encoding='latin1') as f:  # Using latin1 for DWD files
+        header = [column.strip() for column in f.readline().split(';')]
+        lines = [line for line in f if line.strip() and not line.startswith('eor')]
+
+    if 'MESS_DATUM' not in header:
+        raise ValueError(f"No MESS_DATUM column in the header of {file_path}, the file is empty or truncated")
+    timestamp_index = header.index('MESS_DATUM')
+    measurement_indices = [index for index, column in enumerate(header) if spec.is_measurement(column)]
+    quality_indices = [index for index, column in enumerate(header) if QUALITY_COLUMN.match(column)]
+    # Position of the quality column of every measurement column in quality_indices, -1 for none
+    flag_positions = np.array([max((position for position, quality_index in enumerate(quality_indices)
+                                    if quality_index < index), default=-1) for index in measurement_indices],
+                              dtype=np.int64)
+    columns = [header[index] for index in measurement_indices]
+    column_indices = [timestamp_index] + measurement_indices + quality_indices
+    if not lines:
+        empty = np.empty((0, len(measurement_indices)))
+        return ProductFile(columns, np.empty(0, dtype=np.int64), empty, empty.astype(bool), empty)
+
+    try:
+        data = np.loadtxt(lines, delimiter=';', usecols=column_indices, dtype=np.float64, ndmin=2)
+    except ValueError:
+        data = parse_rows(lines, column_indices)
+
+    data = data[np.isfinite(data[:, 0])]
+    timestamps = spec.to_minutes(data[:, 0].astype(np.int64))
+    values = data[:, 1:1 + len(measurement_indices)]
+    markers = values == spec.missing_value
+    values[markers] = np.nan
+    # A trailing NaN column is the flag of measurement columns without a quality column
+    quality = np.column_stack([data[:, 1 + len(measurement_indices):], np.full(len(data), np.nan)])
+    return ProductFile(columns, timestamps, values, markers, quality[:, flag_positions])
+
+
+def format_time(date_str):
+    """Format a YYYYMMDDHHMM timestamp as HH:MM."""
+    return f"{date_str[8:10]}:{date_str[10:12]}"
+
+
+def summarize_day(columns, timestamps, values, spec, reference_date=None):
+    """Statistics of the readings of one day of a product file as {metric: {'date', 'value'}}.
+
+    For intraday datasets every column `<name>` yields the latest reading as `<name>`, the daily
+    mean, minimum and maximum as `mean_<name>`, `min_<name>` and `max_<name>`, the times of the
+    extremes as `min_<name>_time` and `max_<name>_time` and the number of valid readings as
+    `<name>_count`; for daily datasets the value of the day. Without reference_date the latest
+    day with a reading is used.
+    """
+    import numpy as np
+
+    days = timestamps // 10000
+    if reference_date is None:
+        has_reading = np.isfinite(values).any(axis=1)
+        if not has_reading.any():
+            return {}
+        day = days[has_reading].max()
+    else:
+        day = int(reference_date)
+    selected = days == day
+    timestamps, values = timestamps[selected], values[selected]
+    day_str = str(day)
+
+    latest_data = {}
+    for position, column in enumerate(columns):
+        column_values = values[:, position]
+        valid = np.isfinite(column_values)
+        readings = int(valid.sum())
+        if not readings:
+            continue
+
+        name = spec.column_name(column)
+        valid_rows = np.flatnonzero(valid)
+        # Last of the readings with the latest timestamp, files are sorted by time but don't rely on it
+        latest_rows = valid_rows[timestamps[valid_rows] == timestamps[valid_rows].max()]
+        latest = latest_rows[-1]
+        latest_data[name] = {'date': str(timestamps[latest]), 'value': str(float(column_values[latest]))}
+        if not spec.intraday:
+            continue
+
+        # First occurrence of the extremes, like a scan in file order
+        min_row = int(np.argmin(np.where(valid, column_values, np.inf)))
+        max_row = int(np.argmax(np.where(valid, column_values, -np.inf)))
+        min_date, max_date = str(timestamps[min_row]), str(timestamps[max_row])
+        latest_data[f"mean_{name}"] = {'date': day_str, 'value': str(round(float(column_values[valid].mean()), 2))}
+        latest_data[f"min_{name}"] = {'date': min_date, 'value': str(float(column_values[min_row]))}
+        latest_data[f"max_{name}"] = {'date': max_date, 'value': str(float(column_values[max_row]))}
+        latest_data[f"min_{name}_time"] = {'date': min_date, 'value': format_time(min_date)}
+        latest_data[f"max_{name}_time"] = {'date': max_date, 'value': format_time(max_date)}
+        latest_data[f"{name}_count"] = {'date': day_str, 'value': str(readings)}
+    return latest_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List the DWD station datasets the extractors can read.')
+    parser.parse_args()
+    for spec in DATASETS.values():
+        print(f"{spec.name:<8} {spec.description}")
+        print(f"         description: {', '.join(spec.description_files)}")
+        print(f"         columns: {', '.join(f'{column} -> {name}' for column, name in spec.columns.items())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,28 @@
 
 import argparse
 import csv
-import re
+import json
+import sys
 import datetime
 from pathlib import Path
 
+from dwd_datasets import TEN_MINUTES, read_product_file, summarize_day
+from station_history import HistoryStore
+from station_registry import StationRegistry
+from station_tiles import write_station_tiles
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'common'))
+from instrumentation import add_report_arguments, configure_report, count, stage
+from profiling import add_profile_arguments, configure_profiling
+
+# Version of the client payload layout, bump on any incompatible change
+PAYLOAD_SCHEMA_VERSION = 1
+# Coordinates are sent as integers in units of 1e-4 degrees (~11 m), values in units of 0.1
+PAYLOAD_COORDINATE_SCALE = 10000
+PAYLOAD_VALUE_SCALE = 10
+# Metrics included in the client payload
+PAYLOAD_METRICS = ['temperature', 'mean_temperature', 'min_temperature', 'max_temperature', 'humidity']
+
 
 def parse_arguments():
     """Parse command line arguments."""
@@ -22,46 +40,36 @@ def parse_arguments():
     parser.add_argument('--invalid-value', type=str,
                         default='-999',
                         help='Value indicating invalid data')
+    parser.add_argument('--hourly-output-file', type=str,
+                        help='Optional path for a CSV file with hourly means of all measurement columns')
+    parser.add_argument('--payload-file', type=str,
+                        help='Optional path for a compact columnar JSON payload for the frontend')
+    parser.add_argument('--tiles-dir', type=str,
+                        help='Optional directory for the payload split into zoom-thinned quadkey tiles (see station_tiles.py)')
+    parser.add_argument('--history-dir', type=str,
+                        help='Optional directory of the local history store to append the readings to')
+    parser.add_argument('--quality-file', type=str,
+                        help='Optional path for the data quality summary of every station and column (see data_quality.py)')
+    add_report_arguments(parser)
+    add_profile_arguments(parser)
     return parser.parse_args()
 
 
 def read_station_descriptions(data_dir):
-    """Read and parse station descriptions from the input file within data directory."""
-    input_file = Path(data_dir) / 'zehn_now_tu_Beschreibung_Stationen.txt'
+    """Read station descriptions from the input file within data directory into a station registry."""
+    # The 'now' description, or the one of the 'recent' and 'historical' directories
+    input_file = next((Path(data_dir) / name for name in TEN_MINUTES.description_files
+                       if (Path(data_dir) / name).exists()), Path(data_dir) / TEN_MINUTES.description_files[0])
     print(f"Reading station descriptions from {input_file}")
     
     try:
-        with open(input_file, encoding='latin1') as f:
-            lines = f.readlines()
-        
-        # Skip header lines (first 2)
-        data_lines = lines[2:]
-        
-        stations = []
-        for line in data_lines:
-            # Use regex to split by whitespace, but keep station names with spaces together
-            parts = re.split(r'\s+', line.strip(), maxsplit=7)
-            if len(parts) < 7:
-                continue
-            
-            station_id = parts[0]
-            geoBreite = parts[4]
-            geoLaenge = parts[5]
-            station_name = parts[6]
-            
-            stations.append({
-                'station_id': station_id,
-                'station_name': station_name,
-                'geoBreite': geoBreite,
-                'geoLaenge': geoLaenge
-            })
-        
-        print(f"Found {len(stations)} stations in description file")
-        return stations
+        registry = StationRegistry.load(input_file)
+        print(f"Found {len(registry)} stations in description file")
+        return registry
     
-    except Exception as e:
+    except (OSError, ValueError) as e:
         print(f"Error reading station descriptions: {e}")
-        return []
+        return StationRegistry.empty()
 
 
 def find_recent_data_files(data_dir):
@@ -73,9 +81,8 @@ def find_recent_data_files(data_dir):
         print(f"Data directory {data_dir} does not exist")
         return {}
     
-    # Pattern for 10-minute data: produkt_zehn_now_tu_YYYYMMDD_YYYYMMDD_XXXXX.txt or
-    # produkt_zehn_akt_tu_YYYYMMDD_YYYYMMDD_XXXXX.txt
-    file_pattern = re.compile(r'produkt_zehn_(?:now|akt)_tu_\d+_\d+_(\d+)\.txt')
+    # Pattern for 10-minute data, e.g. produkt_zehn_now_tu_YYYYMMDD_YYYYMMDD_XXXXX.txt
+    file_pattern = TEN_MINUTES.file_pattern
     
     station_files = {}
     
@@ -84,174 +91,254 @@ def find_recent_data_files(data_dir):
             for file_path in subdir.glob('*.txt'):
                 match = file_pattern.match(file_path.name)
                 if match:
-                    station_id = match.group(1)
-                    # Store with leading zeros stripped to match station IDs in description
-                    station_id_clean = station_id.lstrip('0')
-                    station_files[station_id_clean] = file_path
+                    station_files[int(match.group(1))] = file_path
     
     print(f"Found recent data files for {len(station_files)} stations")
     return station_files
 
 
-def process_station_data(file_path, reference_date, invalid_value):
-    """Process 10-minute station data to extract statistics."""
+def summarize_product(product, reference_date, invalid_value, observations=None):
+    """Statistics, hourly means and readings of the reference date of a parsed 10-minute data file.
+
+    Returns (latest_data, hourly_means): the output metrics of dwd_datasets.summarize_day() and
+    {column: {hour: (mean, count)}} for all hours with at least one valid reading. Readings equal
+    to invalid_value count as missing. If an `observations` list is given, the valid readings of
+    every row of the reference date are appended to it as (YYYYMMDDHHMM, {column: value}) pairs.
+    """
+    # numpy is imported on use like in dwd_datasets.py, --help and the argument checks stay fast
+    import numpy as np
+
+    values = np.where(product.values == float(invalid_value), np.nan, product.values)
+    latest_data = summarize_day(product.columns, product.timestamps, values, TEN_MINUTES, reference_date)
+
+    on_day = product.timestamps // 10000 == int(reference_date)
+    timestamps, values = product.timestamps[on_day], values[on_day]
+    valid = np.isfinite(values)
+    hours = timestamps // 100 % 100
+
+    hourly_means = {}
+    for position, column in enumerate(product.columns):
+        column_valid = valid[:, position]
+        counts = np.bincount(hours[column_valid], minlength=24)
+        totals = np.bincount(hours[column_valid], weights=values[column_valid, position], minlength=24)
+        hourly_means[column] = {int(hour): (float(totals[hour] / counts[hour]), int(counts[hour]))
+                                for hour in np.flatnonzero(counts)}
+
+    if observations is not None:
+        for row in np.flatnonzero(valid.any(axis=1)):
+            observations.append((str(timestamps[row]), {column: float(values[row, position])
+                                                        for position, column in enumerate(product.columns)
+                                                        if valid[row, position]}))
+    return latest_data, hourly_means
+
+
+def process_station_data(file_path, reference_date, invalid_value, observations=None):
+    """Process 10-minute station data to extract daily statistics.
+
+    Returns a tuple (has_valid_data, latest_data, hourly_means, product), see summarize_product().
+    product is the parsed file for the quality check, None if the file could not be read. Raw
+    readings are collected into `observations` if given.
+    """
     try:
-        ref_date = datetime.datetime.strptime(reference_date, '%Y%m%d').date()
-        ref_date_str = reference_date
-        
-        # Fixed column names for 10-minute data
-        check_columns = ['TT_10', 'RF_10']  # Temperature and humidity
-        output_columns = ['mean_temperature', 'humidity']
-        column_mapping = dict(zip(check_columns, output_columns))
-        
-        # Dictionary to store latest valid data and statistics
-        latest_data = {}
-        temperature_values = []
-        
-        with open(file_path, 'r', encoding='latin1') as f:  # Using latin1 for DWD files
-            # Read header to get column positions
-            header_line = f.readline().strip()
-            columns = [col.strip() for col in header_line.split(';')]
-            
-            # Find positions of columns to check
-            check_indices = {}
-            for col in check_columns:
-                if col in columns:
-                    check_indices[col] = columns.index(col)
-                else:
-                    print(f"Warning: Column {col} not found in data file {file_path.name}")
-            
-            if not check_indices:
-                print(f"No valid columns to check in {file_path.name}")
-                return False, {}
-            
-            # Read data from the file
-            for line in f:
-                if line.startswith('eor') or not line.strip():
-                    continue
-                
-                parts = line.strip().split(';')
-                if len(parts) < 2:
-                    continue
-                
-                date_str = parts[1].strip()
-                
-                # Handle 10min data format (YYYYMMDDHHMM)
-                # Extract just the date part for comparison
-                if len(date_str) >= 8:
-                    date_str_for_comparison = date_str[:8]
-                    
-                    # Check if this date matches our reference date
-                    if date_str_for_comparison == ref_date_str:
-                        # Process temperature values for min/max calculation
-                        if 'TT_10' in check_indices:
-                            temp_idx = check_indices['TT_10']
-                            if temp_idx < len(parts) and parts[temp_idx].strip() != invalid_value:
-                                try:
-                                    temp_value = float(parts[temp_idx].strip())
-                                    temperature_values.append(temp_value)
-                                except ValueError:
-                                    pass
-                        
-                        # Process latest data for each column
-                        for col, idx in check_indices.items():
-                            if idx < len(parts) and parts[idx].strip() != invalid_value:
-                                output_col = column_mapping[col]
-                                latest_data[output_col] = {
-                                    'date': date_str,
-                                    'value': parts[idx].strip()
-                                }
-        
-        # Calculate min and max temperature if we have values
-        if temperature_values:
-            latest_data['min_temperature'] = {
-                'date': ref_date_str,
-                'value': str(min(temperature_values))
-            }
-            latest_data['max_temperature'] = {
-                'date': ref_date_str,
-                'value': str(max(temperature_values))
-            }
-        
+        # Validate the reference date format
+        datetime.datetime.strptime(reference_date, '%Y%m%d')
+
+        product = read_product_file(file_path, TEN_MINUTES)
+        count(rows=len(product.timestamps))
+        if not product.columns:
+            print(f"No measurement columns found in {file_path.name}")
+            return False, {}, {}, product
+
+        latest_data, hourly_means = summarize_product(product, reference_date, invalid_value, observations)
         has_valid_data = bool(latest_data)
-        return has_valid_data, latest_data
-    
-    except Exception as e:
+        return has_valid_data, latest_data, hourly_means, product
+
+    except (OSError, ValueError) as e:
         print(f"Error processing station data in {file_path}: {e}")
-        return False, {}
+        count(failed_files=1)
+        return False, {}, {}, None
 
 
-def write_results_to_csv(stations, output_file):
-    """Write processed stations to CSV file including data points."""
+def check_station_quality(product, file_path, station_id):
+    """Quality summary rows of every measurement column of a parsed 10-minute data file, see data_quality.py."""
+    # data_quality imports numpy at module level, keep it out of the startup of the script
+    from data_quality import check_product, quality_counters
+
+    try:
+        rows, _ = check_product(product, TEN_MINUTES, file_path.name, f"{station_id:05d}")
+    except (OSError, ValueError) as e:
+        print(f"Error checking station data in {file_path}: {e}")
+        count(failed_files=1)
+        return []
+    count(**quality_counters(rows))
+    return rows
+
+
+def write_hourly_means_to_csv(stations, output_file):
+    """Write hourly means of all measurement columns in long format."""
     with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['station_id', 'hour', 'metric', 'mean', 'count'])
+
+        rows = 0
+        for record in stations:
+            station_id = f"{record['station'].station_id:05d}"
+            for col, means in record.get('hourly_means', {}).items():
+                name = TEN_MINUTES.column_name(col)
+                for hour, (mean, readings) in means.items():
+                    writer.writerow([station_id, hour, name, round(mean, 2), readings])
+                    rows += 1
+
+    print(f"Wrote {rows} hourly means to {output_file}")
+
+
+def write_results_to_csv(stations, output_file):
+    """Write processed stations to CSV file including data points.
+
+    The file is written next to the output file and renamed, so readers such as the API service
+    (backend/station_snapshot.py) never see a partially written file.
+    """
+    tmp_file = f"{output_file}.tmp"
+    with open(tmp_file, 'w', newline='', encoding='utf-8') as csvfile:
         fieldnames = ['station_id', 'station_name', 'data_date', 'lat', 'lon']
         
         # Add data point fields for any metrics that might be present
         metric_fields = set()
-        for station in stations:
-            if 'latest_data' in station:
-                for metric in station['latest_data'].keys():
+        for record in stations:
+            if 'latest_data' in record:
+                for metric in record['latest_data'].keys():
                     metric_fields.add(f"{metric}")
         
         all_fields = fieldnames + sorted(list(metric_fields))
         writer = csv.DictWriter(csvfile, fieldnames=all_fields)
         writer.writeheader()
         
-        for station in stations:
+        for record in stations:
+            station = record['station']
             row_data = {
-                'station_id': station['station_id'],
-                'station_name': station['station_name'],
-                'lat': station['geoBreite'],
-                'lon': station['geoLaenge']
+                'station_id': f"{station.station_id:05d}",
+                'station_name': station.name,
+                'lat': f"{station.lat:.4f}",
+                'lon': f"{station.lon:.4f}"
             }
             
             # Add data points if available
-            if 'latest_data' in station:
-                for metric, data in station['latest_data'].items():
+            if 'latest_data' in record:
+                for metric, data in record['latest_data'].items():
                     row_data[f"{metric}"] = data['value']
                 
                 # Add data_date to row_data in DD.MM.YYYY HH:MM format
-                # Take it from TT_10 value
-                if 'mean_temperature' in station['latest_data']:
-                    data_date = station['latest_data']['mean_temperature']['date']
+                # Take it from the latest TT_10 value
+                if 'temperature' in record['latest_data']:
+                    data_date = record['latest_data']['temperature']['date']
                     row_data['data_date'] = datetime.datetime.strptime(data_date, '%Y%m%d%H%M').strftime('%d.%m.%Y %H:%M')
 
             
             writer.writerow(row_data)
+    Path(tmp_file).replace(output_file)
     
     print(f"Wrote {len(stations)} stations to {output_file}")
 
 
+def build_payload(stations, reference_date):
+    """Build the compact, schema-versioned columnar JSON payload of the processed stations for the frontend.
+
+    Every column is an array with one entry per station, so the client can read metrics by name
+    instead of by position. Coordinates and values are quantized to integers, missing values are null.
+    """
+    columns = {
+        'station_id': [],
+        'station_name': [],
+        'data_date': [],
+        'lat': [],
+        'lon': [],
+        **{metric: [] for metric in PAYLOAD_METRICS}
+    }
+
+    for record in stations:
+        station = record['station']
+        latest_data = record.get('latest_data', {})
+
+        columns['station_id'].append(station.station_id)
+        columns['station_name'].append(station.name)
+        columns['lat'].append(round(station.lat * PAYLOAD_COORDINATE_SCALE))
+        columns['lon'].append(round(station.lon * PAYLOAD_COORDINATE_SCALE))
+
+        data_date = None
+        if 'temperature' in latest_data:
+            data_date = datetime.datetime.strptime(
+                latest_data['temperature']['date'], '%Y%m%d%H%M').strftime('%d.%m.%Y %H:%M')
+        columns['data_date'].append(data_date)
+
+        for metric in PAYLOAD_METRICS:
+            value = latest_data.get(metric, {}).get('value')
+            columns[metric].append(round(float(value) * PAYLOAD_VALUE_SCALE) if value is not None else None)
+
+    return {
+        'schema_version': PAYLOAD_SCHEMA_VERSION,
+        'reference_date': reference_date,
+        'generated_at': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'count': len(stations),
+        'coordinate_scale': PAYLOAD_COORDINATE_SCALE,
+        'value_scale': PAYLOAD_VALUE_SCALE,
+        'columns': columns
+    }
+
+
+def write_results_to_payload(payload, output_file):
+    """Write the payload of build_payload() to a JSON file."""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+
+    print(f"Wrote payload for {payload['count']} stations to {output_file}")
+
+
 def main():
     """Main function to extract and process 10-minute station data."""
     args = parse_arguments()
+    configure_report('extract_10min_station_data', args)
+    configure_profiling('extract_10min_station_data', args, Path(args.output_file).parent)
     
-    # Read station descriptions from the data directory
-    stations = read_station_descriptions(args.data_dir)
-    
-    # Get recent data files and latest pull date
-    station_files = find_recent_data_files(args.data_dir)
+    with stage('discover'):
+        # Read station descriptions from the data directory
+        stations = read_station_descriptions(args.data_dir)
+        
+        # Get recent data files and latest pull date
+        station_files = find_recent_data_files(args.data_dir)
     
     # Process stations based on data availability
     processed_stations = []
+    observations_by_station = {}
+    quality_rows = []
     print(f"Processing stations with data on reference date: {args.reference_date}")
-    print(f"Checking for valid data in columns: TT_10 (temperature), RF_10 (humidity)")
+    print(f"Aggregating all measurement columns, e.g. TT_10 (temperature), RF_10 (humidity)")
     
     for station in stations:
-        station_id = station['station_id']
-        station_id = station_id.lstrip('0')  # Ensure leading zeros are stripped for matching
+        station_id = station.station_id
         
         if station_id in station_files:
-            has_valid_data, latest_data = process_station_data(
-                station_files[station_id], 
-                args.reference_date,
-                args.invalid_value
-            )
+            observations = [] if args.history_dir else None
+            with stage('parse'):
+                has_valid_data, latest_data, hourly_means, product = process_station_data(
+                    station_files[station_id], 
+                    args.reference_date,
+                    args.invalid_value,
+                    observations
+                )
+                count(files=1)
+            if observations:
+                observations_by_station[station_id] = observations
+            if args.quality_file and product is not None:
+                with stage('check'):
+                    quality_rows.extend(check_station_quality(product, station_files[station_id], station_id))
             
             if has_valid_data:
-                # Add the latest data to the station record
-                station['latest_data'] = latest_data
-                processed_stations.append(station)
+                # Keep the latest data together with the station
+                processed_stations.append({
+                    'station': station,
+                    'latest_data': latest_data,
+                    'hourly_means': hourly_means
+                })
                 print(f"Station {station_id} processed successfully")
             else:
                 print(f"Station {station_id} has no valid data for the reference date")
@@ -259,9 +346,36 @@ def main():
             print(f"Station {station_id} has no 10-minute data file")
     
     print(f"Processed {len(processed_stations)} stations with valid data")
+
+    if args.quality_file:
+        from data_quality import format_totals, summarize, write_quality_csv
+        for column, total in summarize(quality_rows, 'column').items():
+            print(f"Quality of {column}: {format_totals(total)}")
     
-    # Write results to CSV
-    write_results_to_csv(processed_stations, args.output_file)
+    with stage('write'):
+        # Write results to CSV
+        write_results_to_csv(processed_stations, args.output_file)
+
+        if args.payload_file or args.tiles_dir:
+            payload = build_payload(processed_stations, args.reference_date)
+        if args.payload_file:
+            write_results_to_payload(payload, args.payload_file)
+        if args.tiles_dir:
+            tile_count = write_station_tiles(payload, args.tiles_dir)
+            count(files=tile_count)
+            print(f"Wrote {tile_count} station tiles to {args.tiles_dir}")
+
+        if args.hourly_output_file:
+            write_hourly_means_to_csv(processed_stations, args.hourly_output_file)
+
+        if args.quality_file:
+            write_quality_csv(quality_rows, args.quality_file)
+
+    if args.history_dir:
+        with stage('history'):
+            written = HistoryStore(args.history_dir).append_many(observations_by_station)
+            count(rows=written)
+        print(f"Appended {written} new readings to history store {args.history_dir}")
     
     print("Processing complete!")
 
@@ -3,9 +3,16 @@
 import argparse
 import csv
 import re
+import sys
 import datetime
 from pathlib import Path
 
+from station_registry import StationRegistry
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'common'))
+from instrumentation import add_report_arguments, configure_report, count, stage
+from profiling import add_profile_arguments, configure_profiling
+
 
 def parse_arguments():
     """Parse command line arguments."""
@@ -31,48 +38,22 @@ def parse_arguments():
     parser.add_argument('--check-columns', type=str,
                         default='TMK,TXK,TNK,UPM',
                         help='Comma-separated list of columns to check for valid data')
+    add_report_arguments(parser)
+    add_profile_arguments(parser)
     return parser.parse_args()
 
 
 def read_station_descriptions(input_file, encoding='latin1'):
-    """Read and parse station descriptions from the input file."""
+    """Read station descriptions from the input file into a station registry."""
     print(f"Reading station descriptions from {input_file}")
     try:
-        with open(input_file, encoding=encoding) as f:
-            lines = f.readlines()
-        
-        # Skip header lines (first 2)
-        data_lines = lines[2:]
-        
-        stations = []
-        for line in data_lines:
-            # Use regex to split by whitespace, but keep station names with spaces together
-            parts = re.split(r'\s+', line.strip(), maxsplit=7)
-            if len(parts) < 7:
-                continue
-            
-            station_id = parts[0]
-            von_datum = parts[1]
-            bis_datum = parts[2]
-            geoBreite = parts[4]
-            geoLaenge = parts[5]
-            station_name = parts[6]
-            
-            stations.append({
-                'station_id': station_id,
-                'station_name': station_name,
-                'von_datum': von_datum,
-                'bis_datum': bis_datum,
-                'geoBreite': geoBreite,
-                'geoLaenge': geoLaenge
-            })
-        
-        print(f"Found {len(stations)} stations in description file")
-        return stations
+        registry = StationRegistry.load(input_file, encoding=encoding)
+        print(f"Found {len(registry)} stations in description file")
+        return registry
     
-    except Exception as e:
+    except (OSError, ValueError) as e:
         print(f"Error reading station descriptions: {e}")
-        return []
+        return StationRegistry.empty()
 
 
 def find_recent_data_files(data_dir):
@@ -93,10 +74,7 @@ def find_recent_data_files(data_dir):
             for file_path in subdir.glob('*.txt'):
                 match = file_pattern.match(file_path.name)
                 if match:
-                    station_id = match.group(1)
-                    # Store with leading zeros stripped to match station IDs in description
-                    station_id_clean = station_id.lstrip('0')
-                    station_files[station_id_clean] = file_path
+                    station_files[int(match.group(1))] = file_path
     
     print(f"Found recent data files for {len(station_files)} stations")
     return station_files
@@ -157,8 +135,9 @@ def check_station_data(file_path, reference_date, max_days_offset, invalid_value
                             has_valid_recent_data = True
             
         return has_valid_recent_data, latest_valid_data
-    except Exception as e:
+    except (OSError, ValueError) as e:
         print(f"Error checking station data in {file_path}: {e}")
+        count(failed_files=1)
         return False, {}
 
 
@@ -169,9 +148,9 @@ def write_results_to_csv(stations, output_file):
         
         # Add data point fields for any metrics that might be present
         metric_fields = set()
-        for station in stations:
-            if 'latest_data' in station:
-                for metric in station['latest_data'].keys():
+        for record in stations:
+            if 'latest_data' in record:
+                for metric in record['latest_data'].keys():
                     metric_fields.add(f"{metric}_latest_date")
                     metric_fields.add(f"{metric}_latest_value")
         
@@ -179,19 +158,20 @@ def write_results_to_csv(stations, output_file):
         writer = csv.DictWriter(csvfile, fieldnames=all_fields)
         writer.writeheader()
         
-        for station in stations:
+        for record in stations:
+            station = record['station']
             row_data = {
-                'station_id': station['station_id'],
-                'station_name': station['station_name'],
-                'from_date': station['von_datum'],
-                'to_date': station['bis_datum'],
-                'lat': station['geoBreite'],
-                'lon': station['geoLaenge']
+                'station_id': f"{station.station_id:05d}",
+                'station_name': station.name,
+                'from_date': station.from_date.strftime('%Y%m%d'),
+                'to_date': station.to_date.strftime('%Y%m%d'),
+                'lat': f"{station.lat:.4f}",
+                'lon': f"{station.lon:.4f}"
             }
             
             # Add latest data points if available
-            if 'latest_data' in station:
-                for metric, data in station['latest_data'].items():
+            if 'latest_data' in record:
+                for metric, data in record['latest_data'].items():
                     if data['date'] is not None:
                         row_data[f"{metric}_latest_date"] = data['date']
                         row_data[f"{metric}_latest_value"] = data['value']
@@ -204,12 +184,15 @@ def write_results_to_csv(stations, output_file):
 def main():
     """Main function to extract and filter station data."""
     args = parse_arguments()
+    configure_report('extract_active_stations', args)
+    configure_profiling('extract_active_stations', args, Path(args.output_file).parent)
     
-    # Read station descriptions
-    stations = read_station_descriptions(args.input_file)
-    
-    # Get recent data files
-    station_files = find_recent_data_files(args.data_dir)
+    with stage('discover'):
+        # Read station descriptions
+        stations = read_station_descriptions(args.input_file)
+        
+        # Get recent data files
+        station_files = find_recent_data_files(args.data_dir)
     
     # Check which columns to validate
     check_columns = args.check_columns.split(',')
@@ -220,22 +203,22 @@ def main():
     print(f"Checking for valid data in columns: {', '.join(check_columns)}")
     
     for station in stations:
-        station_id = station['station_id']
-        station_id = station_id.lstrip('0')  # Ensure leading zeros are stripped for matching
+        station_id = station.station_id
         
         if station_id in station_files:
-            has_valid_data, latest_data = check_station_data(
-                station_files[station_id], 
-                args.reference_date,
-                args.max_days_offset,
-                args.invalid_value,
-                check_columns
-            )
+            with stage('check'):
+                has_valid_data, latest_data = check_station_data(
+                    station_files[station_id], 
+                    args.reference_date,
+                    args.max_days_offset,
+                    args.invalid_value,
+                    check_columns
+                )
+                count(files=1)
             
             if has_valid_data:
-                # Add the latest data to the station record
-                station['latest_data'] = latest_data
-                filtered_stations.append(station)
+                # Keep the latest data together with the station
+                filtered_stations.append({'station': station, 'latest_data': latest_data})
                 print(f"Station {station_id} passed data validation")
             else:
                 print(f"Station {station_id} failed data validation - no recent valid data")
@@ -245,7 +228,9 @@ def main():
     print(f"Filtered down to {len(filtered_stations)} active stations")
     
     # Write results to CSV
-    write_results_to_csv(filtered_stations, args.output_file)
+    with stage('write'):
+        write_results_to_csv(filtered_stations, args.output_file)
+        count(rows=len(filtered_stations))
     
     print("Processing complete!")
 
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Extract the readings of a day from any DWD station dataset declared in dwd_datasets.py.
+
+    python extract_station_data.py --dataset hourly --data-dir ./data/recent --output-file hourly.csv
+    python extract_station_data.py --dataset daily --data-dir ./data/recent --reference-date 20250617
+
+Every product file is parsed with numpy in one call into a timestamp vector and a (rows, columns)
+value matrix, missing values become NaN, and the statistics of the reference day are computed
+column-wise on the matrix. The files are processed by a pool of --workers processes. The output
+CSV and the optional --payload-file have the layout of extract_10min_station_data.py: for
+datasets with several readings per day (10min, hourly) every measurement `<name>` yields the
+latest reading, mean_/min_/max_<name>, the times of the extremes and <name>_count; for daily
+datasets the value of the day. Without --reference-date the latest day of every station is used,
+which suits the daily 'recent' files that end a day or more before today.
+
+With --quality-file every file is checked inline by analysis/common/data_quality.py (missing
+markers, QN flags, ranges, spikes, steps, stuck sensors) and a summary row per station and column
+is written; with --drop-invalid out-of-range readings and spikes are left out of the statistics.
+"""
+
+import os
+import re
+import sys
+import argparse
+import concurrent.futures
+from pathlib import Path
+
+import numpy as np
+
+from dwd_datasets import DATASETS, read_product_file, summarize_day
+from extract_10min_station_data import build_payload, write_results_to_csv, write_results_to_payload
+from station_registry import StationRegistry
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'common'))
+from data_quality import check_product, format_totals, quality_counters, summarize, write_quality_csv
+from instrumentation import add_report_arguments, configure_report, count, stage
+from profiling import add_profile_arguments, configure_profiling
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Extract the readings of a day from a DWD station dataset into a csv file.')
+    parser.add_argument('--dataset', type=str, choices=sorted(DATASETS), required=True,
+                        help='Dataset of the files in the data directory, see dwd_datasets.py')
+    parser.add_argument('--data-dir', type=str, required=True,
+                        help='Directory with the station description and the extracted zip directories')
+    parser.add_argument('--output-file', type=str, default='station_data.csv',
+                        help='Path for the output CSV file')
+    parser.add_argument('--reference-date', type=str,
+                        help='Day to extract (YYYYMMDD), default: the latest day of every station')
+    parser.add_argument('--payload-file', type=str,
+                        help='Optional path for a compact columnar JSON payload for the frontend')
+    parser.add_argument('--quality-file', type=str,
+                        help='Optional path for the data quality summary of every station and column')
+    parser.add_argument('--drop-invalid', action='store_true',
+                        help='Leave readings that fail the range or spike check out of the statistics')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Number of processes parsing the files')
+    add_report_arguments(parser)
+    add_profile_arguments(parser)
+    return parser.parse_args()
+
+
+def read_station_descriptions(data_dir, spec):
+    """Read the first existing description file of the dataset into a station registry."""
+    for name in spec.description_files:
+        input_file = Path(data_dir) / name
+        if input_file.exists():
+            print(f"Reading station descriptions from {input_file}")
+            try:
+                registry = StationRegistry.load(input_file)
+                print(f"Found {len(registry)} stations in description file")
+                return registry
+            except (OSError, ValueError) as e:
+                print(f"Error reading station descriptions: {e}")
+                return StationRegistry.empty()
+    print(f"No station description file ({', '.join(spec.description_files)}) in {data_dir}")
+    return StationRegistry.empty()
+
+
+def find_data_files(data_dir, spec):
+    """Find the product file of every station in the extracted zip directories."""
+    data_dir_path = Path(data_dir)
+    if not data_dir_path.exists():
+        print(f"Data directory {data_dir} does not exist")
+        return {}
+
+    station_files = {}
+    for file_path in data_dir_path.glob('*/*.txt'):
+        match = spec.file_pattern.match(file_path.name)
+        if match:
+            station_files[int(match.group(1))] = file_path
+    print(f"Found {spec.name} data files for {len(station_files)} stations")
+    return station_files
+
+
+def process_file(task):
+    """Parse, check and summarize one product file.
+
+    Returns (station_id, latest_data or an error message, rows, quality summary rows).
+    """
+    station_id, file_path, dataset, reference_date, check_quality, drop_invalid = task
+    spec = DATASETS[dataset]
+    try:
+        product = read_product_file(file_path, spec)
+        values, quality_rows = product.values, []
+        if check_quality or drop_invalid:
+            quality_rows, invalid = check_product(product, spec, Path(file_path).name, f"{station_id:05d}")
+            if drop_invalid:
+                values = np.where(invalid, np.nan, values)
+        latest_data = summarize_day(product.columns, product.timestamps, values, spec, reference_date)
+        return station_id, latest_data, len(product.timestamps), quality_rows
+    except (OSError, ValueError) as e:
+        return station_id, f"Error processing station data in {file_path}: {e}", 0, []
+
+
+def process_files(tasks, workers):
+    """Run process_file() over all tasks, in worker processes if more than one worker is requested."""
+    if workers is None or workers <= 1 or len(tasks) <= 1:
+        return list(map(process_file, tasks))
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(process_file, tasks, chunksize=chunksize))
+
+
+def main():
+    """Main function to extract the readings of a station dataset."""
+    args = parse_arguments()
+    configure_report('extract_station_data', args)
+    configure_profiling('extract_station_data', args, Path(args.output_file).parent)
+    spec = DATASETS[args.dataset]
+    if args.reference_date and not re.fullmatch(r'\d{8}', args.reference_date):
+        print(f"Invalid reference date {args.reference_date}, expected YYYYMMDD")
+        sys.exit(1)
+
+    with stage('discover'):
+        stations = read_station_descriptions(args.data_dir, spec)
+        station_files = find_data_files(args.data_dir, spec)
+
+    check_quality = bool(args.quality_file)
+    tasks = [(station.station_id, station_files[station.station_id], spec.name, args.reference_date,
+              check_quality, args.drop_invalid)
+             for station in stations if station.station_id in station_files]
+    day = args.reference_date or 'the latest day of every station'
+    print(f"Processing {len(tasks)} {spec.name} files for {day} with {args.workers} worker(s)")
+
+    with stage('parse'):
+        results = process_files(tasks, args.workers)
+        count(files=len(tasks), rows=sum(rows for _, _, rows, _ in results))
+        if check_quality:
+            count(**quality_counters([row for *_, station_quality in results for row in station_quality]))
+
+    processed_stations = []
+    quality_rows = []
+    for station_id, latest_data, _, station_quality in results:
+        quality_rows.extend(station_quality)
+        if isinstance(latest_data, str):
+            print(latest_data)
+            count(failed_files=1)
+        elif latest_data:
+            processed_stations.append({'station': stations.get(station_id), 'latest_data': latest_data})
+        else:
+            print(f"Station {station_id} has no valid data for {day}")
+    print(f"Processed {len(processed_stations)} stations with valid data")
+    if quality_rows:
+        for column, total in summarize(quality_rows, 'column').items():
+            print(f"Quality of {spec.name} {column}: {format_totals(total)}")
+
+    with stage('write'):
+        write_results_to_csv(processed_stations, args.output_file)
+        if args.payload_file:
+            write_results_to_payload(build_payload(processed_stations, args.reference_date), args.payload_file)
+        if args.quality_file:
+            write_quality_csv(quality_rows, args.quality_file)
+
+    print("Processing complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,126 @@
 import os
-import requests
+import sys
+import shutil
 import zipfile
 import argparse
 from io import BytesIO
-from bs4 import BeautifulSoup
+from html.parser import HTMLParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'common'))
+from instrumentation import add_report_arguments, configure_report, count, stage
+from profiling import add_profile_arguments, configure_profiling
+from artifact_cache import add_cache_arguments, conditional_headers, http_validators, open_cache
 
 # Base URL for the DWD data
 DAILY_BASE_URL = "https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/daily/kl/"
 HOURLY_BASE_URL = "https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/hourly/air_temperature/"
 TEN_MIN_BASE_URL = "https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/10_minutes/air_temperature/"
 
-def download_and_extract_zip(url, output_dir):
-    """Download and extract a zip file from the given URL."""
-    # Skip if already extracted
+# HTTP session shared by all downloads, created on first use
+_session = None
+
+def http_get(url, headers=None):
+    """GET a URL and count the request in the run report.
+
+    requests is only imported here, so runs that skip the download (and --help) start faster.
+    The session keeps the connection to the DWD server open across the many zip downloads.
+    """
+    global _session
+    if _session is None:
+        import requests
+        _session = requests.Session()
+
+    response = _session.get(url, headers=headers)
+    count(http_requests=1, http_bytes=len(response.content))
+    return response
+
+class LinkParser(HTMLParser):
+    """Collect the href of every <a> tag of a directory listing."""
+
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href)
+
+def list_links(html):
+    """Return the link targets of an HTML directory listing."""
+    parser = LinkParser()
+    parser.feed(html)
+    return parser.links
+
+def cached_get(url, cache, have_local_copy):
+    """GET a URL unless the local copy is unchanged on the server.
+
+    With a cache, the ETag and Last-Modified of the last download of the URL are sent along, and
+    None is returned if the server answers 304 Not Modified. Without a cache the request is
+    unconditional.
+    """
+    key = cache.key(params={'url': url}) if cache is not None else None
+    validators = cache.lookup(key) if cache is not None and have_local_copy else None
+    with stage('download'):
+        response = http_get(url, conditional_headers(validators))
+    if response.status_code == 304:
+        return None
+    if response.status_code == 200 and cache is not None:
+        cache.put(key, meta=http_validators(response))
+    return response
+
+def download_and_extract_zip(url, output_dir, cache=None):
+    """Download and extract a zip file from the given URL.
+
+    Without a cache an extracted zip file is never downloaded again. With a cache it is
+    downloaded and extracted again whenever it changed on the server.
+    """
     zip_name = url.split("/")[-1].replace(".zip", "")
     zip_output_dir = os.path.join(output_dir, zip_name)
-    if os.path.exists(zip_output_dir) and os.listdir(zip_output_dir):
+    extracted = os.path.exists(zip_output_dir) and bool(os.listdir(zip_output_dir))
+    # Skip if already extracted
+    if extracted and cache is None:
         print(f"Files already extracted: {zip_output_dir}")
         return
         
-    response = requests.get(url)
-    if response.status_code == 200:
+    response = cached_get(url, cache, extracted)
+    if response is None:
+        print(f"Unchanged since the last download: {zip_output_dir}")
+    elif response.status_code == 200:
+        # Drop the files of an older version, their names contain the date range
+        shutil.rmtree(zip_output_dir, ignore_errors=True)
         os.makedirs(zip_output_dir, exist_ok=True)
-        with zipfile.ZipFile(BytesIO(response.content)) as z:
+        with stage('extract'), zipfile.ZipFile(BytesIO(response.content)) as z:
             z.extractall(zip_output_dir)
+            count(files=len(z.namelist()))
             print(f"Extracted: {url} into {zip_output_dir}")
     else:
         print(f"Failed to download: {url}")
 
-def fetch_metadata(url, output_dir):
+def fetch_metadata(url, output_dir, cache=None):
     """Download the metadata file."""
     filename = url.split("/")[-1]
     metadata_path = os.path.join(output_dir, filename)
+    exists = os.path.exists(metadata_path)
     
     # Skip if file already exists
-    if os.path.exists(metadata_path):
+    if exists and cache is None:
         print(f"Metadata already exists: {metadata_path}")
         return
         
-    response = requests.get(url)
-    if response.status_code == 200:
+    response = cached_get(url, cache, exists)
+    if response is None:
+        print(f"Metadata unchanged: {metadata_path}")
+    elif response.status_code == 200:
         with open(metadata_path, "wb") as f:
             f.write(response.content)
         print(f"Metadata downloaded: {metadata_path}")
     else:
         print(f"Failed to download metadata: {url}")
 
-def fetch_climate_data(data_granularity="hourly", data_type="recent", output_dir="./data"):
+def fetch_climate_data(data_granularity="hourly", data_type="recent", output_dir="./data", cache=None):
     """Fetch climate data files of the specified type."""
     if data_granularity not in ["daily", "hourly", "10min"]:
         print(f"Invalid granularity: {data_granularity}. Must be 'daily', 'hourly', or '10min'")
@@ -74,18 +148,17 @@ def fetch_climate_data(data_granularity="hourly", data_type="recent", output_dir
     os.makedirs(data_dir, exist_ok=True)
     
     # Fetch metadata file
-    fetch_metadata(metadata_url, data_dir)
+    fetch_metadata(metadata_url, data_dir, cache)
 
     # Fetch all zip files
     print(f"Fetching {data_type} climate data from {current_base_url}")
-    response = requests.get(current_base_url)
+    with stage('list'):
+        response = http_get(current_base_url)
     if response.status_code == 200:
-        soup = BeautifulSoup(response.text, "html.parser")
-        for link in soup.find_all("a"):
-            href = link.get("href")
-            if href and href.endswith(".zip"):
+        for href in list_links(response.text):
+            if href.endswith(".zip"):
                 zip_url = f"{current_base_url}{href}"
-                download_and_extract_zip(zip_url, data_dir)
+                download_and_extract_zip(zip_url, data_dir, cache)
     else:
         print(f"Failed to fetch the list of zip files: {current_base_url}")
 
@@ -97,14 +170,19 @@ def main():
                         help="Type of data to download: 'recent', 'historical', or 'now' (10min only)")
     parser.add_argument("--output-dir", type=str, default="./data",
                         help="Directory to store downloaded data (default: ./data)")
+    add_report_arguments(parser)
+    add_profile_arguments(parser)
+    add_cache_arguments(parser)
     
     args = parser.parse_args()
+    configure_report('fetch_station_data', args)
+    configure_profiling('fetch_station_data', args, args.output_dir)
     
     # Ensure the output directory exists
     os.makedirs(args.output_dir, exist_ok=True)
     
     # Download files based on specified type
-    fetch_climate_data(args.granularity, args.type, args.output_dir)
+    fetch_climate_data(args.granularity, args.type, args.output_dir, open_cache(args))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Fill the gaps of daily station temperature series from the station's HYRAS cell.
+
+The daily series of the DWD stations (daily/kl: TMK, TXK, TNK) have gaps where a file holds the
+missing value marker or a station did not report at all. HYRAS has no gaps, and the series of
+the cell of every station comes from extract_hyras_data.py run with the stations as cities: a
+cities_metadata.csv with a station_id column and one <grid_y>_<grid_x>_<city_id>.csv per station,
+or a city cube with --cube.
+
+A station differs from the mean of its cell by its height and exposure, so the cell values are
+corrected before they fill a gap. For every station, metric and calendar month a regression
+station = intercept + slope * cell is fitted on the days where both have a value; months with
+less than --min-overlap such days use the fit over the whole overlap, and stations with less
+than --min-overlap days overall are not filled. The fits of --batch-size stations are computed
+at once from sums over float32 (days, stations, metrics) arrays of the days the cell series
+cover; the parts of a station record outside them (the daily records go back to the 18th century,
+HYRAS to 1951) are written unchanged. Readings that fail the range or spike checks of
+analysis/common/data_quality.py are dropped before the fit and filled like gaps.
+
+The output directory has the layout of the HYRAS city series, so calculate_rolling_average.py
+and calculate_climatology.py run on the filled station series unchanged:
+
+    <grid_y>_<grid_x>_<city_id>.csv    date and metrics of a station, gaps filled
+    cities_metadata.csv                metadata rows of the written stations
+    fill_summary.csv                   observed, filled and still missing days, overlap and
+                                       fit of every station and metric
+
+Commands:
+    python fill_station_gaps.py --station-data-dir ./data/daily/historical --station-data-dir ./data/daily/recent \\
+        --hyras-dir ./data/station_cells --output-dir ./data/stations_filled
+"""
+
+import csv
+import sys
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dwd_datasets import DAILY_KL, read_product_file
+from extract_station_data import find_data_files
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'common'))
+from city_cube import CityCube
+from data_quality import check_product
+from instrumentation import add_report_arguments, configure_report, count, stage
+
+# HYRAS metric -> output name of the daily/kl column it is filled from (see DAILY_KL)
+STATION_NAMES = {
+    'tas': 'temperature',          # TMK
+    'tasmax': 'max_temperature',   # TXK
+    'tasmin': 'min_temperature',   # TNK
+}
+DEFAULT_METRICS = ['tas', 'tasmax', 'tasmin']
+MONTHS = 12
+# Series are stacked in single precision, the fit sums are accumulated in double precision
+DTYPE = np.float32
+SUMMARY_FIELDS = ['city_id', 'station_id', 'metric', 'observed', 'filled', 'missing', 'overlap',
+                  'intercept', 'slope', 'rmse']
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Fill the gaps of daily station series from their HYRAS cells.')
+    parser.add_argument('--station-data-dir', type=str, action='append', required=True,
+                        help='Directory with the extracted daily/kl zip directories, may be repeated '
+                             '(e.g. historical and recent), later directories win on the same day')
+    parser.add_argument('--hyras-dir', type=str, required=True,
+                        help='Output directory of extract_hyras_data.py for the stations, with cities_metadata.csv')
+    parser.add_argument('--cube', type=str,
+                        help='Read the cell series from a city cube (path without extension) instead of the CSV files')
+    parser.add_argument('--metric', type=str, action='append', choices=sorted(STATION_NAMES),
+                        help='Metric(s) to fill (default: tas, tasmax and tasmin)')
+    parser.add_argument('--min-overlap', type=int, default=30,
+                        help='Days with station and cell values needed for a monthly or overall fit')
+    parser.add_argument('--batch-size', type=int, default=128,
+                        help='Stations fitted and filled at once, bounds the memory of the (days, stations, metrics) arrays')
+    parser.add_argument('--output-dir', type=str, required=True, help='Directory for the filled series')
+    add_report_arguments(parser)
+    return parser.parse_args()
+
+
+def load_station_cells(cities_metadata):
+    """Rows of cities_metadata.csv that belong to a station, with the station id as int."""
+    with open(cities_metadata, newline='', encoding='utf-8') as f:
+        rows = [row for row in csv.DictReader(f)
+                if row.get('station_id') and row.get('grid_y') and row.get('grid_x')]
+    for row in rows:
+        row['station_id'] = int(float(row['station_id']))
+    return rows
+
+
+def to_dates(timestamps):
+    """YYYYMMDDHHMM timestamps to datetime64[D]."""
+    days = timestamps // 10000
+    months = (days // 10000 - 1970) * 12 + days // 100 % 100 - 1
+    return months.astype('datetime64[M]').astype('datetime64[D]') + (days % 100 - 1)
+
+
+def read_station_series(station_data_dirs, station_ids, metrics):
+    """Daily series of the stations as {station_id: [(dates, values (days, metrics)) of every file]}.
+
+    Readings that fail the range or spike check are NaN.
+    """
+    series = {}
+    for data_dir in station_data_dirs:
+        for station_id, file_path in find_data_files(data_dir, DAILY_KL).items():
+            if station_id not in station_ids:
+                continue
+            try:
+                product = read_product_file(file_path, DAILY_KL)
+                _, invalid = check_product(product, DAILY_KL)
+            except (OSError, ValueError) as e:
+                print(f"Error reading station data in {file_path}: {e}")
+                count(failed_files=1)
+                continue
+            count(files=1, rows=len(product.values))
+            if not len(product.timestamps):
+                continue
+            values = np.where(invalid, np.nan, product.values)
+            names = [DAILY_KL.column_name(column) for column in product.columns]
+            columns = [values[:, names.index(STATION_NAMES[metric])] if STATION_NAMES[metric] in names
+                       else np.full(len(values), np.nan) for metric in metrics]
+            series.setdefault(station_id, []).append((to_dates(product.timestamps), np.column_stack(columns)))
+    return series
+
+
+def read_cell_series(hyras_dir, cells, metrics):
+    """Series of the HYRAS cells of the stations from the city CSV files, as a list like cells."""
+    series = []
+    for cell in cells:
+        file_path = Path(hyras_dir) / f"{cell['grid_y']}_{cell['grid_x']}_{cell['city_id']}.csv"
+        if not file_path.exists():
+            series.append([])
+            continue
+        df = pd.read_csv(file_path)
+        values = np.column_stack([df[metric].to_numpy(dtype=np.float64) if metric in df.columns
+                                  else np.full(len(df), np.nan) for metric in metrics])
+        series.append([(pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]'), values)])
+        count(files=1, rows=len(df))
+    return series
+
+
+def read_cube_series(cube_path, cells, metrics):
+    """Series of the HYRAS cells of the stations from a city cube, as a list like cells."""
+    cube = CityCube.open(cube_path)
+    dates = cube.dates()
+    params = [cube.params.index(metric) if metric in cube.params else None for metric in metrics]
+    series = []
+    for cell in cells:
+        try:
+            view = cube.data[cube.row(cell['city_id'])]
+        except KeyError:
+            series.append([])
+            continue
+        values = np.column_stack([view[:, param] if param is not None else np.full(cube.days, np.nan)
+                                  for param in params])
+        series.append([(dates, values)])
+    count(rows=cube.days * len(cells))
+    return series
+
+
+def stack_series(series, start, days, metric_count):
+    """Place per-station lists of (dates, values) into a (days, stations, metrics) array from start.
+
+    Days outside the array are left out. Later entries of a station overwrite the values of
+    earlier ones on the same day where they have one.
+    """
+    stacked = np.full((days, len(series), metric_count), np.nan, dtype=DTYPE)
+    for column, parts in enumerate(series):
+        for dates, values in parts:
+            rows = (dates - start).astype(np.int64)
+            inside = (rows >= 0) & (rows < days)
+            rows, values = rows[inside], values[inside]
+            stacked[rows, column] = np.where(np.isfinite(values), values, stacked[rows, column])
+    return stacked
+
+
+def date_range(series):
+    """(first date, number of days) covered by lists of (dates, values)."""
+    all_dates = [dates for parts in series for dates, _ in parts if len(dates)]
+    start = min(dates.min() for dates in all_dates)
+    return start, int((max(dates.max() for dates in all_dates) - start).astype(np.int64)) + 1
+
+
+def fit_bias_correction(station, cell, months, min_overlap):
+    """Regression station = intercept + slope * cell per calendar month and overall.
+
+    station and cell are (days, stations, metrics), months the 0-based calendar month of every
+    day. Returns (intercept, slope, overlap) as (13, stations, metrics) arrays, index 12 is the
+    fit over the whole overlap. Fits on less than min_overlap days are NaN.
+    """
+    overlap = np.isfinite(station) & np.isfinite(cell)
+    x = np.where(overlap, cell, 0.0)
+    y = np.where(overlap, station, 0.0)
+    # Month indicator of every day plus a column of ones for the overall fit
+    groups = np.column_stack([months[:, None] == np.arange(MONTHS), np.ones(len(months), dtype=bool)])
+    groups = groups.astype(station.dtype)
+
+    def group_sum(values):
+        return np.einsum('dg,dsm->gsm', groups, values, dtype=np.float64)
+
+    n = group_sum(overlap.astype(station.dtype))
+    sum_x, sum_y = group_sum(x), group_sum(y)
+    sum_xx, sum_xy = group_sum(x * x), group_sum(x * y)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        spread = n * sum_xx - sum_x ** 2
+        # A constant cell series (or a single day) only determines the offset
+        slope = np.where(spread > 1e-9 * np.maximum(n, 1) ** 2, (n * sum_xy - sum_x * sum_y) / spread, 1.0)
+        intercept = (sum_y - slope * sum_x) / n
+    enough = n >= max(min_overlap, 1)
+    return np.where(enough, intercept, np.nan), np.where(enough, slope, np.nan), n.astype(np.int64)
+
+
+def record_bounds(station):
+    """Day of the first and the last reading of every series along the first axis, (len, -1) without one."""
+    observed = np.isfinite(station)
+    has_reading = observed.any(axis=0)
+    first = np.where(has_reading, np.argmax(observed, axis=0), len(station))
+    last = np.where(has_reading, len(station) - 1 - np.argmax(observed[::-1], axis=0), -1)
+    return first, last
+
+
+def record_span(first, last, days):
+    """Mask of the days between the first and the last reading of every series, see record_bounds()."""
+    day = np.arange(days).reshape((-1,) + (1,) * np.ndim(first))
+    return (day >= first) & (day <= last)
+
+
+def fill_gaps(station, cell, months, intercept, slope, span):
+    """Fill the NaN of station with the corrected cell values.
+
+    Every day uses the fit of its calendar month, or the overall fit where the month has none.
+    Only gaps within the record span of a station are filled, the series is not extended beyond
+    its record. Returns (filled series, mask of the filled days, corrected cell series).
+    """
+    monthly = np.isfinite(intercept[:MONTHS])
+    day_intercept = np.where(monthly, intercept[:MONTHS], intercept[MONTHS]).astype(cell.dtype)[months]
+    day_slope = np.where(monthly, slope[:MONTHS], slope[MONTHS]).astype(cell.dtype)[months]
+    corrected = day_intercept + day_slope * cell
+    filled = ~np.isfinite(station) & span & np.isfinite(corrected)
+    return np.where(filled, corrected, station), filled, corrected
+
+
+def fill_batch(station_parts, cell_series, start, days, metric_count, min_overlap):
+    """Fit and fill a batch of stations on the days from start that the cell series cover.
+
+    Returns the whole record of every station as (first date, values), with the days in the
+    window filled, and the fit, summary counts and RMSE as (stations, metrics) arrays.
+    """
+    dates = start + np.arange(days)
+    months = dates.astype('datetime64[M]').astype(np.int64) % MONTHS
+    cell = stack_series(cell_series, start, days, metric_count)
+    station = stack_series(station_parts, start, days, metric_count)
+
+    # The record of a station may begin before or end after the window
+    records = []
+    first = np.empty((len(station_parts), metric_count), dtype=np.int64)
+    last = np.empty_like(first)
+    for column, parts in enumerate(station_parts):
+        record_start, record_days = date_range([parts])
+        record = stack_series([parts], record_start, record_days, metric_count)[:, 0]
+        offset = int((record_start - start).astype(np.int64))
+        record_first, record_last = record_bounds(record)
+        first[column], last[column] = record_first + offset, record_last + offset
+        records.append((record_start, record))
+
+    intercept, slope, overlap = fit_bias_correction(station, cell, months, min_overlap)
+    filled, filled_mask, corrected = fill_gaps(station, cell, months, intercept, slope,
+                                               record_span(first, last, days))
+    residuals = station - corrected
+    fitted = np.isfinite(residuals)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rmse = np.sqrt(np.where(fitted, residuals ** 2, 0.0).sum(axis=0, dtype=np.float64) / fitted.sum(axis=0))
+
+    observed = np.empty_like(first)
+    missing = np.empty_like(first)
+    for column, (record_start, record) in enumerate(records):
+        observed[column] = np.isfinite(record).sum(axis=0)
+        # Copy the window into the record, the days before and after it stay as they are
+        offset = int((start - record_start).astype(np.int64))
+        low, high = max(offset, 0), min(offset + days, len(record))
+        if low < high:
+            record[low:high] = filled[low - offset:high - offset, column]
+        missing[column] = (record_span(*record_bounds(record), len(record)) & ~np.isfinite(record)).sum(axis=0)
+
+    summary = {'observed': observed, 'filled': filled_mask.sum(axis=0), 'missing': missing,
+               'overlap': overlap[MONTHS], 'intercept': intercept[MONTHS], 'slope': slope[MONTHS], 'rmse': rmse}
+    return records, summary
+
+
+def write_station_file(output_dir, cell, metrics, start, values):
+    """Write the series of a station without the leading and trailing days that have no value."""
+    has_value = np.flatnonzero(np.isfinite(values).any(axis=1))
+    if not len(has_value):
+        return 0
+    rows = slice(has_value[0], has_value[-1] + 1)
+    df = pd.DataFrame(np.round(values[rows].astype(np.float64), 2), columns=metrics)
+    df.insert(0, 'date', pd.DatetimeIndex(start + np.arange(rows.start, rows.stop)).strftime('%Y-%m-%d'))
+    df.to_csv(Path(output_dir) / f"{cell['grid_y']}_{cell['grid_x']}_{cell['city_id']}.csv", index=False)
+    return len(df)
+
+
+def main():
+    """Main function to fill the station series."""
+    args = parse_arguments()
+    configure_report('fill_station_gaps', args)
+    metrics = args.metric or DEFAULT_METRICS
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with stage('read'):
+        cells = load_station_cells(Path(args.hyras_dir) / 'cities_metadata.csv')
+        station_series = read_station_series(args.station_data_dir, {cell['station_id'] for cell in cells}, metrics)
+        cells = [cell for cell in cells if cell['station_id'] in station_series]
+        if args.cube:
+            cell_series = read_cube_series(args.cube, cells, metrics)
+        else:
+            cell_series = read_cell_series(args.hyras_dir, cells, metrics)
+    print(f"Found daily station data and a HYRAS cell for {len(cells)} stations")
+    if not cells:
+        return
+
+    has_cell = [any(len(dates) for dates, _ in parts) for parts in cell_series]
+    if not any(has_cell):
+        print("No HYRAS cell series found")
+        return
+    # Fit and fill only where the cells have values, the rest of the records is passed through
+    start, days = date_range(cell_series)
+    print(f"Filling the {days} days from {start} in batches of {args.batch_size} stations")
+
+    written = []
+    summaries = []
+    with open(output_dir / 'fill_summary.csv', 'w', newline='', encoding='utf-8') as f:
+        summary_writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        summary_writer.writeheader()
+        for batch_start in range(0, len(cells), args.batch_size):
+            batch = slice(batch_start, batch_start + args.batch_size)
+            with stage('fit'):
+                records, summary = fill_batch([station_series[cell['station_id']] for cell in cells[batch]],
+                                              cell_series[batch], start, days, len(metrics), args.min_overlap)
+                count(rows=int(summary['filled'].sum()))
+            summaries.append(summary)
+
+            with stage('write'):
+                for column, (station_cell, (record_start, record)) in enumerate(zip(cells[batch], records)):
+                    if write_station_file(output_dir, station_cell, metrics, record_start, record):
+                        written.append(station_cell)
+                        count(files=1)
+                    for index, metric in enumerate(metrics):
+                        fit = (summary['intercept'][column, index], summary['slope'][column, index],
+                               summary['rmse'][column, index])
+                        summary_writer.writerow({
+                            'city_id': station_cell['city_id'], 'station_id': station_cell['station_id'],
+                            'metric': metric,
+                            **{field: int(summary[field][column, index])
+                               for field in ('observed', 'filled', 'missing', 'overlap')},
+                            **{field: '' if np.isnan(value) else round(float(value), 3)
+                               for field, value in zip(('intercept', 'slope', 'rmse'), fit)},
+                        })
+
+    with stage('write'):
+        with open(output_dir / 'cities_metadata.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(cells[0]))
+            writer.writeheader()
+            writer.writerows(written)
+
+    totals = {field: sum(int(summary[field].sum()) for summary in summaries) for field in ('filled', 'missing')}
+    unfitted = sum(int(np.isnan(summary['intercept']).sum()) for summary in summaries)
+    print(f"Filled {totals['filled']} of {totals['filled'] + totals['missing']} missing station days, "
+          f"{unfitted} of {len(cells) * len(metrics)} station metrics lack {args.min_overlap} days of overlap")
+    print(f"Wrote {len(written)} filled station series to {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
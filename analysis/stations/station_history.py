@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Append-only, day-partitioned history store for 10-minute station observations.
+
+Layout on disk:
+
+    <history-dir>/<YYYYMMDD>/seg-<n>.bin
+
+Every append writes one immutable segment into the partition of each UTC day it touches.
+A segment is columnar: a small header with the column names, a station index
+(station_id, first row, row count, latest timestamp), the timestamps as int64 epoch minutes
+and one float32 array per measurement column (NaN for missing values). Rows are sorted by
+station and time, so a range query for one station only reads the index and two contiguous
+slices per column.
+"""
+
+import argparse
+import array
+import bisect
+import calendar
+import csv
+import datetime
+import math
+import os
+import shutil
+import struct
+import sys
+import time
+from pathlib import Path
+
+MAGIC = b'ZWHS'
+FORMAT_VERSION = 1
+
+# magic, version, row count, station count, column count
+HEADER = struct.Struct('<4sHIIH')
+# station_id, first row, row count, latest timestamp (epoch minutes)
+INDEX_ENTRY = struct.Struct('<iIIq')
+
+TIMESTAMP_FORMAT = '%Y%m%d%H%M'
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Query and compact the local 10-minute station history store.')
+    parser.add_argument('command', choices=['query', 'compact'],
+                        help="'query' to export a station/time range, 'compact' to merge segments and apply retention")
+    parser.add_argument('--history-dir', type=str,
+                        default='./data/history/10min',
+                        help='Directory of the history store')
+    parser.add_argument('--station-id', type=int,
+                        help='Station to query (default: all stations)')
+    parser.add_argument('--days', type=int,
+                        default=7,
+                        help='Number of days to query, counted back from now')
+    parser.add_argument('--columns', type=str,
+                        help='Comma-separated list of columns to query (default: all)')
+    parser.add_argument('--output-file', type=str,
+                        default='station_history.csv',
+                        help='Path for the output CSV file of a query')
+    parser.add_argument('--retention-days', type=int,
+                        default=30,
+                        help='Number of days to keep when compacting')
+    return parser.parse_args()
+
+
+def to_epoch_minutes(date_str):
+    """Convert a YYYYMMDDHHMM timestamp (UTC) to minutes since the epoch."""
+    dt = datetime.datetime.strptime(date_str, TIMESTAMP_FORMAT)
+    return calendar.timegm(dt.timetuple()) // 60
+
+
+def from_epoch_minutes(minutes):
+    """Convert minutes since the epoch to a YYYYMMDDHHMM timestamp (UTC)."""
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(minutes * 60))
+
+
+def partition_name(minutes):
+    """Name of the daily partition a timestamp belongs to."""
+    return time.strftime('%Y%m%d', time.gmtime(minutes * 60))
+
+
+class Segment:
+    """Read access to a single immutable segment file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, self.row_count, station_count, column_count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{path} is not a history segment (version {FORMAT_VERSION})")
+
+            self.columns = []
+            for _ in range(column_count):
+                (length,) = struct.unpack('<B', f.read(1))
+                self.columns.append(f.read(length).decode('utf-8'))
+
+            self.index = {}
+            for _ in range(station_count):
+                station_id, start, count, max_ts = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+                self.index[station_id] = (start, count, max_ts)
+
+            self.timestamps_offset = f.tell()
+            self.values_offset = self.timestamps_offset + 8 * self.row_count
+
+    def _read_array(self, f, typecode, offset, start, count):
+        values = array.array(typecode)
+        f.seek(offset + values.itemsize * start)
+        values.frombytes(f.read(values.itemsize * count))
+        return values
+
+    def read_station(self, station_id, start_ts=None, end_ts=None, columns=None):
+        """Read the rows of one station within [start_ts, end_ts] as (timestamps, {column: values})."""
+        if station_id not in self.index:
+            return array.array('q'), {}
+
+        start, count, _ = self.index[station_id]
+        with open(self.path, 'rb') as f:
+            timestamps = self._read_array(f, 'q', self.timestamps_offset, start, count)
+
+            # Narrow the slice to the requested time range
+            lo = bisect.bisect_left(timestamps, start_ts) if start_ts is not None else 0
+            hi = bisect.bisect_right(timestamps, end_ts) if end_ts is not None else count
+            timestamps = timestamps[lo:hi]
+
+            values = {}
+            for col_idx, col in enumerate(self.columns):
+                if columns is not None and col not in columns:
+                    continue
+                offset = self.values_offset + 4 * self.row_count * col_idx
+                values[col] = self._read_array(f, 'f', offset, start + lo, hi - lo)
+
+        return timestamps, values
+
+
+def write_segment(path, rows, columns):
+    """Write rows {(station_id, timestamp): {column: value}} as a segment file."""
+    keys = sorted(rows)
+
+    index = []
+    for row, (station_id, timestamp) in enumerate(keys):
+        if index and index[-1][0] == station_id:
+            index[-1][2] += 1
+            index[-1][3] = timestamp
+        else:
+            index.append([station_id, row, 1, timestamp])
+
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(keys), len(index), len(columns)))
+        for col in columns:
+            encoded = col.encode('utf-8')
+            f.write(struct.pack('<B', len(encoded)))
+            f.write(encoded)
+        for entry in index:
+            f.write(INDEX_ENTRY.pack(*entry))
+
+        array.array('q', (timestamp for _, timestamp in keys)).tofile(f)
+        for col in columns:
+            array.array('f', (rows[key].get(col, math.nan) for key in keys)).tofile(f)
+
+    # Make the segment visible atomically
+    os.replace(tmp_path, path)
+
+
+class HistoryStore:
+    """Append-only store of 10-minute observations partitioned by UTC day."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def partitions(self):
+        """Return the names of all partitions in chronological order."""
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir() and p.name.isdigit())
+
+    def segments(self, partition):
+        """Return the segments of a partition in write order."""
+        partition_dir = self.root / partition
+        return [Segment(path) for path in sorted(partition_dir.glob('seg-*.bin'))]
+
+    def _next_segment_path(self, partition):
+        partition_dir = self.root / partition
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        existing = sorted(partition_dir.glob('seg-*.bin'))
+        next_number = int(existing[-1].stem.split('-')[1]) + 1 if existing else 0
+        return partition_dir / f"seg-{next_number:06d}.bin"
+
+    def append(self, station_id, observations):
+        """Append observations of one station, given as (YYYYMMDDHHMM, {column: value}) pairs.
+
+        Rows at or before the latest timestamp already stored for the station are skipped, so
+        re-appending a growing 'now' file only writes the new readings.
+        Returns the number of rows written.
+        """
+        return self.append_many({station_id: observations})
+
+    def append_many(self, observations_by_station):
+        """Append observations of several stations, see append(). Returns the number of rows written."""
+        by_partition = {}
+        for station_id, observations in observations_by_station.items():
+            for date_str, values in observations:
+                timestamp = to_epoch_minutes(date_str)
+                partition = partition_name(timestamp)
+                by_partition.setdefault(partition, {})[(int(station_id), timestamp)] = values
+
+        written = 0
+        for partition, rows in by_partition.items():
+            # Skip rows that are already stored, using the latest timestamp per station
+            watermarks = {}
+            for segment in self.segments(partition):
+                for station_id, (_, _, max_ts) in segment.index.items():
+                    watermarks[station_id] = max(max_ts, watermarks.get(station_id, max_ts))
+            rows = {key: values for key, values in rows.items()
+                    if key[1] > watermarks.get(key[0], -1)}
+            if not rows:
+                continue
+
+            columns = sorted({col for values in rows.values() for col in values})
+            write_segment(self._next_segment_path(partition), rows, columns)
+            written += len(rows)
+
+        return written
+
+    def query(self, station_id, start, end, columns=None):
+        """Return the observations of a station between two YYYYMMDDHHMM timestamps (inclusive).
+
+        The result is a list of (YYYYMMDDHHMM, {column: value}) sorted by time. Missing values
+        are left out; if a timestamp was written twice the later segment wins.
+        """
+        start_ts = to_epoch_minutes(start)
+        end_ts = to_epoch_minutes(end)
+        first, last = partition_name(start_ts), partition_name(end_ts)
+
+        rows = {}
+        for partition in self.partitions():
+            if partition < first or partition > last:
+                continue
+            for segment in self.segments(partition):
+                timestamps, values = segment.read_station(station_id, start_ts, end_ts, columns)
+                for i, timestamp in enumerate(timestamps):
+                    row = rows.setdefault(timestamp, {})
+                    for col, col_values in values.items():
+                        if not math.isnan(col_values[i]):
+                            row[col] = col_values[i]
+
+        return [(from_epoch_minutes(timestamp), rows[timestamp]) for timestamp in sorted(rows)]
+
+    def query_recent(self, station_id, days, columns=None, now=None):
+        """Return the observations of a station within the last `days` days."""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        start = now - datetime.timedelta(days=days)
+        return self.query(station_id, start.strftime(TIMESTAMP_FORMAT), now.strftime(TIMESTAMP_FORMAT), columns)
+
+    def station_ids(self, partitions=None):
+        """Return all station ids stored in the given partitions (default: all)."""
+        station_ids = set()
+        for partition in partitions if partitions is not None else self.partitions():
+            for segment in self.segments(partition):
+                station_ids.update(segment.index)
+        return sorted(station_ids)
+
+    def columns(self):
+        """Return all column names stored in the history."""
+        return sorted({col for partition in self.partitions()
+                       for segment in self.segments(partition) for col in segment.columns})
+
+    def compact(self, retention_days, now=None):
+        """Drop partitions older than the retention period and merge the segments of each partition.
+
+        Returns a tuple (dropped partitions, merged partitions).
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        cutoff = (now - datetime.timedelta(days=retention_days)).strftime('%Y%m%d')
+
+        dropped = merged = 0
+        for partition in self.partitions():
+            if partition < cutoff:
+                shutil.rmtree(self.root / partition)
+                dropped += 1
+                continue
+
+            segments = self.segments(partition)
+            if len(segments) < 2:
+                continue
+
+            # Later segments win on duplicate (station, timestamp) keys
+            rows = {}
+            for segment in segments:
+                for station_id in segment.index:
+                    timestamps, values = segment.read_station(station_id)
+                    for i, timestamp in enumerate(timestamps):
+                        row = rows.setdefault((station_id, timestamp), {})
+                        for col, col_values in values.items():
+                            if not math.isnan(col_values[i]):
+                                row[col] = col_values[i]
+
+            columns = sorted({col for segment in segments for col in segment.columns})
+            write_segment(self._next_segment_path(partition), rows, columns)
+            for segment in segments:
+                segment.path.unlink()
+            merged += 1
+
+        return dropped, merged
+
+
+def write_query_to_csv(store, station_ids, days, columns, output_file):
+    """Write the recent observations of the given stations to a CSV file."""
+    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+        fieldnames = ['station_id', 'date'] + (columns or store.columns())
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+
+        rows = 0
+        for station_id in station_ids:
+            for date_str, values in store.query_recent(station_id, days, columns):
+                writer.writerow({'station_id': f"{station_id:05d}", 'date': date_str,
+                                 **{col: round(value, 2) for col, value in values.items()}})
+                rows += 1
+
+    print(f"Wrote {rows} observations to {output_file}")
+
+
+def main():
+    """Main function to query or compact the history store."""
+    args = parse_arguments()
+    store = HistoryStore(args.history_dir)
+
+    if args.command == 'compact':
+        dropped, merged = store.compact(args.retention_days)
+        print(f"Dropped {dropped} partitions older than {args.retention_days} days, merged {merged} partitions")
+        return
+
+    columns = args.columns.split(',') if args.columns else None
+    station_ids = [args.station_id] if args.station_id is not None else store.station_ids()
+    if not station_ids:
+        print(f"No stations found in {args.history_dir}")
+        sys.exit(1)
+
+    write_query_to_csv(store, station_ids, args.days, columns, args.output_file)
+
+
+if __name__ == "__main__":
+    main()
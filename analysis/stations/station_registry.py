@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Shared registry of DWD station metadata.
+
+Parses a fixed-width `*_Beschreibung_Stationen.txt` file once into a compact typed table
+(int station ids, YYYYMMDD dates, float coordinates) and caches the table in a binary file
+next to the description, keyed by the SHA-256 of the description file. Provides O(1) lookups
+by station id and nearest-neighbour lookups through a coarse latitude/longitude bucket index.
+"""
+
+import argparse
+import array
+import datetime
+import hashlib
+import math
+import re
+import struct
+from pathlib import Path
+from typing import NamedTuple
+
+CACHE_MAGIC = b'ZWSR'
+CACHE_VERSION = 1
+# magic, version, station count
+CACHE_HEADER = struct.Struct('<4sHI')
+
+# Size of the buckets of the spatial index in degrees
+BUCKET_SIZE = 0.5
+
+EARTH_RADIUS_KM = 6371.0
+
+
+class Station(NamedTuple):
+    station_id: int
+    from_date: datetime.date
+    to_date: datetime.date
+    height: float
+    lat: float
+    lon: float
+    name: str
+    state: str
+
+
+def parse_date(value):
+    """Convert a YYYYMMDD integer to a date."""
+    return datetime.date(value // 10000, value // 100 % 100, value % 100)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometers."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class BucketIndex:
+    """Latitude/longitude buckets of points for nearest-neighbour and bounding-box queries by row."""
+
+    def __init__(self, lats, lons):
+        self.lats = lats
+        self.lons = lons
+        self._buckets = {}
+        for row, (lat, lon) in enumerate(zip(lats, lons)):
+            self._buckets.setdefault(self._bucket(lat, lon), []).append(row)
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _bucket(self, lat, lon):
+        return int(math.floor(lat / BUCKET_SIZE)), int(math.floor(lon / BUCKET_SIZE))
+
+    def nearest(self, lat, lon, k=1, max_distance_km=None):
+        """Return up to k (row, distance_km) pairs closest to the given point, nearest first."""
+        if not len(self):
+            return []
+
+        center_lat, center_lon = self._bucket(lat, lon)
+        # A bucket is at least this many kilometers wide, so ring r only holds points further than
+        # (r - 1) * min_bucket_km away from the point.
+        min_bucket_km = BUCKET_SIZE * 111.0 * max(math.cos(math.radians(min(abs(lat) + BUCKET_SIZE, 89.0))), 0.01)
+
+        found = []
+        radius = 0
+        while True:
+            for i in range(center_lat - radius, center_lat + radius + 1):
+                for j in range(center_lon - radius, center_lon + radius + 1):
+                    # Only visit the outer ring of buckets
+                    if max(abs(i - center_lat), abs(j - center_lon)) != radius:
+                        continue
+                    for row in self._buckets.get((i, j), ()):
+                        found.append((haversine_km(lat, lon, self.lats[row], self.lons[row]), row))
+
+            found.sort()
+            ring_distance = radius * min_bucket_km
+            if len(found) >= k and found[k - 1][0] <= ring_distance:
+                break
+            if max_distance_km is not None and ring_distance > max_distance_km:
+                break
+            if len(found) == len(self):
+                break
+            radius += 1
+
+        return [(row, distance) for distance, row in found[:k]
+                if max_distance_km is None or distance <= max_distance_km]
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Return the rows of all points inside a bounding box, in row order."""
+        low_lat, low_lon = self._bucket(min_lat, min_lon)
+        high_lat, high_lon = self._bucket(max_lat, max_lon)
+        if (high_lat - low_lat + 1) * (high_lon - low_lon + 1) > len(self._buckets):
+            # Boxes larger than the data are cheaper to answer with one pass over all points
+            candidates = range(len(self))
+        else:
+            candidates = [row for i in range(low_lat, high_lat + 1) for j in range(low_lon, high_lon + 1)
+                          for row in self._buckets.get((i, j), ())]
+        return sorted(row for row in candidates
+                      if min_lat <= self.lats[row] <= max_lat and min_lon <= self.lons[row] <= max_lon)
+
+
+# Numeric columns followed by the space-padded name, state and release columns. Names may contain
+# single spaces, the padding between the text columns is at least two spaces wide.
+LINE_PATTERN = re.compile(
+    r'^\s*(\d+)\s+(\d{8})\s+(\d{8})\s+(-?[\d.]+)\s+(-?[\d.]+)\s+(-?[\d.]+)\s+'
+    r'(.+?)(?:\s{2,}(\S+(?: \S+)*))?(?:\s{2,}\S+)?\s*$'
+)
+
+
+class StationRegistry:
+    """Typed, indexed table of station metadata."""
+
+    def __init__(self, station_ids, from_dates, to_dates, heights, lats, lons, names, states):
+        self.station_ids = station_ids
+        self.from_dates = from_dates
+        self.to_dates = to_dates
+        self.heights = heights
+        self.lats = lats
+        self.lons = lons
+        self.names = names
+        self.states = states
+
+        self._rows = {station_id: row for row, station_id in enumerate(station_ids)}
+        self.index = BucketIndex(lats, lons)
+
+    @classmethod
+    def empty(cls):
+        return cls(array.array('i'), array.array('i'), array.array('i'), array.array('f'),
+                   array.array('d'), array.array('d'), [], [])
+
+    @classmethod
+    def load(cls, input_file, encoding='latin1', use_cache=True):
+        """Load the registry for a description file, using the binary cache if it is up to date."""
+        input_file = Path(input_file)
+        content = input_file.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()[:16]
+        cache_file = input_file.with_name(f".{input_file.name}.{digest}.registry")
+
+        if use_cache and cache_file.exists():
+            try:
+                return cls.from_bytes(cache_file.read_bytes())
+            except (ValueError, struct.error, UnicodeDecodeError):
+                print(f"Ignoring invalid station registry cache {cache_file}")
+
+        registry = cls.parse(content.decode(encoding))
+
+        if use_cache:
+            # Drop caches of earlier versions of the description file
+            for stale in input_file.parent.glob(f".{input_file.name}.*.registry"):
+                stale.unlink()
+            try:
+                tmp_file = cache_file.with_suffix('.tmp')
+                tmp_file.write_bytes(registry.to_bytes())
+                tmp_file.replace(cache_file)
+            except OSError as e:
+                print(f"Could not write station registry cache {cache_file}: {e}")
+
+        return registry
+
+    @classmethod
+    def parse(cls, text):
+        """Parse the text of a station description file."""
+        lines = text.splitlines()
+        station_ids, from_dates, to_dates = array.array('i'), array.array('i'), array.array('i')
+        heights, lats, lons = array.array('f'), array.array('d'), array.array('d')
+        names, states = [], []
+
+        # Skip header lines (first 2)
+        for line in lines[2:]:
+            match = LINE_PATTERN.match(line)
+            if not match:
+                continue
+            parts = match.groups()
+
+            try:
+                row = (int(parts[0]), int(parts[1]), int(parts[2]),
+                       float(parts[3]), float(parts[4]), float(parts[5]))
+            except ValueError:
+                continue
+
+            for column, value in zip((station_ids, from_dates, to_dates, heights, lats, lons), row):
+                column.append(value)
+            names.append(parts[6])
+            states.append(parts[7] or '')
+
+        return cls(station_ids, from_dates, to_dates, heights, lats, lons, names, states)
+
+    def to_bytes(self):
+        """Serialize the registry into the binary cache format."""
+        strings = '\n'.join(self.names).encode('utf-8'), '\n'.join(self.states).encode('utf-8')
+        chunks = [CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(self))]
+        for column in (self.station_ids, self.from_dates, self.to_dates, self.heights, self.lats, self.lons):
+            chunks.append(column.tobytes())
+        for blob in strings:
+            chunks.append(struct.pack('<I', len(blob)))
+            chunks.append(blob)
+        return b''.join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Deserialize a registry from the binary cache format."""
+        magic, version, count = CACHE_HEADER.unpack_from(data)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            raise ValueError("Not a station registry cache")
+
+        offset = CACHE_HEADER.size
+        columns = []
+        for typecode in 'iiifdd':
+            column = array.array(typecode)
+            size = column.itemsize * count
+            column.frombytes(data[offset:offset + size])
+            columns.append(column)
+            offset += size
+
+        strings = []
+        for _ in range(2):
+            (length,) = struct.unpack_from('<I', data, offset)
+            offset += 4
+            blob = data[offset:offset + length].decode('utf-8')
+            strings.append(blob.split('\n') if count else [])
+            offset += length
+
+        if any(len(column) != count for column in columns + strings):
+            raise ValueError("Truncated station registry cache")
+        return cls(*columns, *strings)
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    def __iter__(self):
+        return (self.station(row) for row in range(len(self)))
+
+    def __contains__(self, station_id):
+        return int(station_id) in self._rows
+
+    def station(self, row):
+        """Return the station in the given row of the table."""
+        return Station(self.station_ids[row], parse_date(self.from_dates[row]), parse_date(self.to_dates[row]),
+                       self.heights[row], self.lats[row], self.lons[row], self.names[row], self.states[row])
+
+    def get(self, station_id, default=None):
+        """Look up a station by id (int or zero-padded string)."""
+        row = self._rows.get(int(station_id))
+        return self.station(row) if row is not None else default
+
+    def nearest(self, lat, lon, k=1, max_distance_km=None):
+        """Return up to k (station, distance_km) pairs closest to the given point, nearest first."""
+        return [(self.station(row), distance) for row, distance in self.index.nearest(lat, lon, k, max_distance_km)]
+
+    def within(self, lat, lon, radius_km):
+        """Return all (station, distance_km) pairs within a radius, nearest first."""
+        return self.nearest(lat, lon, k=len(self), max_distance_km=radius_km)
+
+
+def main():
+    """Print a summary of a station description file and optionally the stations nearest to a point."""
+    parser = argparse.ArgumentParser(description='Inspect a DWD station description file through the station registry.')
+    parser.add_argument('--input-file', type=str, required=True,
+                        help='Path to the stations description file')
+    parser.add_argument('--lat', type=float, help='Latitude of a point to find the nearest stations for')
+    parser.add_argument('--lon', type=float, help='Longitude of a point to find the nearest stations for')
+    parser.add_argument('--k', type=int, default=5, help='Number of nearest stations to print')
+    args = parser.parse_args()
+
+    registry = StationRegistry.load(args.input_file)
+    print(f"Found {len(registry)} stations in description file")
+
+    if args.lat is not None and args.lon is not None:
+        for station, distance in registry.nearest(args.lat, args.lon, k=args.k):
+            print(f"{station.station_id:05d} {station.name} ({station.state}): {distance:.1f} km")
+
+
+if __name__ == "__main__":
+    main()
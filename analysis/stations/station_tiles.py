@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Split the station payload into quadkey tiles with zoom-dependent thinning.
+
+The columnar payload of extract_10min_station_data.py (--payload-file) holds every station. For a
+map that only shows part of Germany, or all of it at a low zoom, most of it is not needed. This
+module writes the stations as Web Mercator tiles, addressed by their quadkey, for every zoom
+level from --min-zoom to --max-zoom:
+
+    index.json                 tile scheme, zoom levels and the station count of every tile
+    <zoom>/<quadkey>.json      payload of the stations in one tile, in the layout of --payload-file
+
+Below the max zoom the tiles are thinned: every tile is divided into cells of
+2**-cell_zoom_offset of its size (32 px of a 256 px tile by default), and only the most important
+station of a cell is kept, so dense regions do not get more markers than the map can show. A
+station is more important if it has a current temperature reading, then by the --importance
+column (larger first) if one is given, then by a lower station id, so the selection is stable
+between runs. The max zoom has all stations.
+
+The client computes the tiles covering its viewport at its zoom level (clamped to the zoom levels
+of the index), looks them up in index.json and fetches only those.
+
+Commands:
+    python station_tiles.py --payload-file ./data/now/10min_station_data_20250618.json --output-dir ./data/now/station_tiles
+"""
+
+import json
+import math
+import argparse
+import datetime
+from pathlib import Path
+
+TILE_SCHEMA_VERSION = 1
+DEFAULT_MIN_ZOOM = 5
+DEFAULT_MAX_ZOOM = 9
+# Cells of 2**-3 of a tile, 32 px of a 256 px tile
+DEFAULT_CELL_ZOOM_OFFSET = 3
+# Web Mercator is undefined beyond this latitude
+MAX_LATITUDE = 85.05112878
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Split a station payload into quadkey tiles for the frontend.')
+    parser.add_argument('--payload-file', type=str, required=True,
+                        help='Columnar JSON payload written by extract_10min_station_data.py --payload-file')
+    parser.add_argument('--output-dir', type=str, required=True, help='Directory for index.json and the tiles')
+    parser.add_argument('--min-zoom', type=int, default=DEFAULT_MIN_ZOOM, help='Lowest zoom level with tiles')
+    parser.add_argument('--max-zoom', type=int, default=DEFAULT_MAX_ZOOM,
+                        help='Highest zoom level with tiles, it has all stations')
+    parser.add_argument('--cell-zoom-offset', type=int, default=DEFAULT_CELL_ZOOM_OFFSET,
+                        help='Thinning cells are tiles of this many zoom levels deeper, one station per cell')
+    parser.add_argument('--importance', type=str,
+                        help='Payload column that ranks stations within a cell, larger values are kept')
+    return parser.parse_args()
+
+
+def tile_xy(lat, lon, zoom):
+    """Web Mercator tile (x, y) of a point at a zoom level."""
+    lat = min(max(lat, -MAX_LATITUDE), MAX_LATITUDE)
+    n = 1 << zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def quadkey(x, y, zoom):
+    """Quadkey of a tile, one digit per zoom level."""
+    digits = []
+    for level in range(zoom, 0, -1):
+        mask = 1 << (level - 1)
+        digits.append(str((1 if x & mask else 0) + (2 if y & mask else 0)))
+    return ''.join(digits)
+
+
+def station_rank(columns, row, importance=None):
+    """Sort key of a station within a thinning cell, smallest first."""
+    temperature = columns.get('temperature')
+    has_reading = temperature is not None and temperature[row] is not None
+    value = columns[importance][row] if importance and importance in columns else None
+    return (not has_reading, value is None, -(value or 0), int(columns['station_id'][row]))
+
+
+def select_tile_rows(payload, min_zoom=DEFAULT_MIN_ZOOM, max_zoom=DEFAULT_MAX_ZOOM,
+                     cell_zoom_offset=DEFAULT_CELL_ZOOM_OFFSET, importance=None):
+    """Return {zoom: {quadkey: [rows of the payload]}} of the thinned tiles."""
+    columns = payload['columns']
+    scale = payload['coordinate_scale']
+    # Tile coordinates at the finest zoom needed, coarser tiles and cells are shifted from them
+    detail_zoom = max_zoom + cell_zoom_offset
+    positions = [tile_xy(lat / scale, lon / scale, detail_zoom) for lat, lon in zip(columns['lat'], columns['lon'])]
+    order = sorted(range(payload['count']), key=lambda row: station_rank(columns, row, importance))
+
+    tiles = {}
+    for zoom in range(min_zoom, max_zoom + 1):
+        tile_shift = detail_zoom - zoom
+        cell_shift = max(tile_shift - cell_zoom_offset, 0)
+        taken_cells = set()
+        zoom_tiles = {}
+        for row in order:
+            x, y = positions[row]
+            if zoom < max_zoom:
+                cell = (x >> cell_shift, y >> cell_shift)
+                if cell in taken_cells:
+                    continue
+                taken_cells.add(cell)
+            key = quadkey(x >> tile_shift, y >> tile_shift, zoom)
+            zoom_tiles.setdefault(key, []).append(row)
+        tiles[zoom] = {key: sorted(rows) for key, rows in sorted(zoom_tiles.items())}
+    return tiles
+
+
+def subset_payload(payload, rows):
+    """Payload with the given rows of every column."""
+    return {**{key: value for key, value in payload.items() if key != 'columns'}, 'count': len(rows),
+            'columns': {name: [values[row] for row in rows] for name, values in payload['columns'].items()}}
+
+
+def write_json_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    tmp_path.replace(path)
+
+
+def write_station_tiles(payload, output_dir, min_zoom=DEFAULT_MIN_ZOOM, max_zoom=DEFAULT_MAX_ZOOM,
+                        cell_zoom_offset=DEFAULT_CELL_ZOOM_OFFSET, importance=None):
+    """Write the tiles and index.json of a payload, returns the number of tile files.
+
+    index.json is written last, and tiles of earlier runs that are no longer referenced are removed
+    afterwards, so a client reading the index always finds its tiles.
+    """
+    if min_zoom > max_zoom:
+        raise ValueError(f"min_zoom {min_zoom} is larger than max_zoom {max_zoom}")
+    output_dir = Path(output_dir)
+    tiles = select_tile_rows(payload, min_zoom, max_zoom, cell_zoom_offset, importance)
+
+    written = set()
+    for zoom, zoom_tiles in tiles.items():
+        for key, rows in zoom_tiles.items():
+            tile_path = output_dir / str(zoom) / f"{key}.json"
+            write_json_atomic(tile_path, {**subset_payload(payload, rows), 'zoom': zoom, 'quadkey': key})
+            written.add(tile_path)
+
+    index = {
+        'tile_schema_version': TILE_SCHEMA_VERSION,
+        'payload_schema_version': payload['schema_version'],
+        'reference_date': payload.get('reference_date'),
+        'generated_at': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'scheme': 'quadkey',
+        'min_zoom': min_zoom,
+        'max_zoom': max_zoom,
+        'count': payload['count'],
+        'tiles': {str(zoom): {key: len(rows) for key, rows in zoom_tiles.items()} for zoom, zoom_tiles in tiles.items()},
+    }
+    write_json_atomic(output_dir / 'index.json', index)
+
+    for stale in output_dir.glob('*/*.json'):
+        if stale not in written:
+            stale.unlink()
+    return len(written)
+
+
+def main():
+    args = parse_arguments()
+    with open(args.payload_file, 'r', encoding='utf-8') as f:
+        payload = json.load(f)
+
+    tile_count = write_station_tiles(payload, args.output_dir, args.min_zoom, args.max_zoom,
+                                     args.cell_zoom_offset, args.importance)
+    print(f"Wrote {tile_count} tiles of {payload['count']} stations for zoom {args.min_zoom}-{args.max_zoom} "
+          f"to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,15 +7,16 @@ import os
 import sys
 import argparse
 from pathlib import Path
-import boto3
-from botocore.exceptions import ClientError
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'common'))
+from instrumentation import add_report_arguments, configure_report, count, set_status, stage
 
 
 def parse_arguments():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Upload station data to S3 bucket')
     parser.add_argument('--file', type=str, required=True,
-                        help='Path to the CSV file to upload')
+                        help='Path to the CSV file to upload, or a directory whose files are all uploaded')
     parser.add_argument('--bucket', type=str, required=True,
                         help='S3 bucket name')
     parser.add_argument('--region', type=str, required=True,
@@ -23,16 +24,18 @@ def parse_arguments():
     parser.add_argument('--endpoint-url', type=str, required=True,
                         help='S3 endpoint URL (e.g., https://bucket.fr-par.scw.cloud')
     parser.add_argument('--object-name', type=str,
-                        help='Object name in S3 bucket (default: same as file basename)')
+                        help='Object name in S3 bucket (default: same as file basename, for a directory its name)')
     parser.add_argument('--directory', type=str,
                         help='Directory path in S3 bucket (will be prepended to object name)')
+    add_report_arguments(parser)
     return parser.parse_args()
 
 
 def upload_file(file_path, bucket, region, endpoint_url, object_name=None, directory=None):
-    """Upload a file to an S3 bucket
+    """Upload a file, or all files below a directory, to an S3 bucket
 
-    :param file_path: Path to the file to upload
+    :param file_path: Path to the file to upload. The files below a directory are uploaded with their
+        relative paths appended to the object name, e.g. station_tiles/5/12020.json
     :param bucket: Bucket name
     :param region: S3 region name
     :param endpoint_url: S3 endpoint URL
@@ -55,6 +58,10 @@ def upload_file(file_path, bucket, region, endpoint_url, object_name=None, direc
     if not os.environ.get('ACCESS_KEY') or not os.environ.get('SECRET_KEY'):
         print("Error: AWS credentials are not set. Please set ACCESS_KEY and SECRET_KEY environment variables.")
         return False
+
+    # boto3 takes several hundred milliseconds to import, only pay for it when uploading
+    import boto3
+    from botocore.exceptions import ClientError
     
     try:
         # Create S3 client with Scaleway endpoint
@@ -66,9 +73,21 @@ def upload_file(file_path, bucket, region, endpoint_url, object_name=None, direc
             aws_secret_access_key=os.environ['SECRET_KEY']
         )
         
+        if Path(file_path).is_dir():
+            uploads = [(path, f"{object_name}/{path.relative_to(file_path).as_posix()}")
+                       for path in sorted(Path(file_path).rglob('*'))
+                       if path.is_file() and not path.name.startswith('.')]
+            # index.json last, so clients never read an index that references missing files
+            uploads.sort(key=lambda upload: upload[0].name == 'index.json')
+        else:
+            uploads = [(Path(file_path), object_name)]
+
         print(f"Uploading {file_path} to {bucket}/{object_name}")
-        s3_client.upload_file(file_path, bucket, object_name, ExtraArgs={'ACL': 'public-read'})
-        print(f"Successfully uploaded {file_path} to {bucket}/{object_name}")
+        with stage('upload'):
+            for path, name in uploads:
+                s3_client.upload_file(str(path), bucket, name, ExtraArgs={'ACL': 'public-read'})
+                count(http_requests=1, http_bytes=path.stat().st_size, files=1)
+        print(f"Successfully uploaded {len(uploads)} file(s) from {file_path} to {bucket}/{object_name}")
         return True
     
     except ClientError as e:
@@ -81,11 +100,13 @@ def upload_file(file_path, bucket, region, endpoint_url, object_name=None, direc
 
 def main():
     args = parse_arguments()
+    configure_report('upload_to_s3', args)
     
     data_file = args.file
     
     if not Path(data_file).exists():
         print(f"Error: Data file {data_file} not found.")
+        set_status('failed')
         sys.exit(1)
     
     # Upload the file
@@ -93,6 +114,7 @@ def main():
                    args.object_name, args.directory):
         sys.exit(0)
     else:
+        set_status('failed')
         sys.exit(1)
 
 
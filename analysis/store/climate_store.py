@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Embedded SQLite store for station and grid time series.
+
+Ingests the outputs of extract_hyras_data.py (per-city HYRAS series), calculate_rolling_average.py
+(rolling averages) and extract_10min_station_data.py (daily station snapshots) into indexed tables,
+and answers point, range and day-of-year queries without globbing or parsing CSV files.
+
+Every table is clustered on (key, [span,] date) as a WITHOUT ROWID table, and has a secondary
+index on (key, [span,] doy), so each query is a single index range scan. doy is the day on the
+366-day leap-year calendar of the climatology (analysis/common/calendar_days.py), 1-based: Feb 29
+is 60 and Mar 1 is 61 in every year, so a day-of-year query returns the same calendar day of every
+year.
+"""
+
+import re
+import csv
+import sys
+import time
+import sqlite3
+import argparse
+import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'common'))
+from calendar_days import calendar_day_index
+
+# Output files of extract_hyras_data.py: {grid_y}_{grid_x}_{city_id}.csv
+HYRAS_FILE_PATTERN = re.compile(r'(\d+)_(\d+)_(.+)\.csv$')
+# Output files of calculate_rolling_average.py: avg_{window}d_{grid_x}_{grid_y}_{city_id}_{from}-{to}.csv
+ROLLING_FILE_PATTERN = re.compile(r'avg_(\d+)d_(\d+)_(\d+)_(.+)_(\d{4})-(\d{4})\.csv$')
+
+# Table layout of the datasets: key column and whether rows are further split by span
+DATASETS = {
+    'hyras': {'table': 'city_series', 'key': 'city_id', 'span': False},
+    'rolling': {'table': 'rolling_average', 'key': 'city_id', 'span': True},
+    'stations': {'table': 'station_daily', 'key': 'station_id', 'span': False},
+}
+
+# Columns of the input files that are not stored as values
+STATION_INFO_COLUMNS = {'station_id', 'station_name', 'data_date', 'lat', 'lon'}
+
+# PRAGMA user_version of the database layout, 1 since doy is the leap-year calendar day
+SCHEMA_VERSION = 1
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Ingest and query station and grid time series in SQLite.')
+    parser.add_argument('command', choices=['ingest', 'query'],
+                        help="'ingest' to load output files, 'query' to run a point, range or day-of-year query")
+    parser.add_argument('--database', type=str, default='./data/climate.sqlite',
+                        help='Path of the SQLite database file')
+    parser.add_argument('--hyras-dir', type=str,
+                        help='Directory with the per-city CSV files of extract_hyras_data.py')
+    parser.add_argument('--rolling-dir', type=str,
+                        help='Directory with the CSV files of calculate_rolling_average.py')
+    parser.add_argument('--station-file', type=str, action='append',
+                        help='CSV file(s) of extract_10min_station_data.py')
+    parser.add_argument('--dataset', choices=list(DATASETS), default='hyras',
+                        help='Dataset to query')
+    parser.add_argument('--key', type=str,
+                        help='City id or station id to query')
+    parser.add_argument('--span', type=int,
+                        help='Rolling window of the rolling average dataset')
+    parser.add_argument('--date', type=str, help='Date of a point query (YYYY-MM-DD)')
+    parser.add_argument('--start', type=str, help='Start date of a range query (YYYY-MM-DD)')
+    parser.add_argument('--end', type=str, help='End date of a range query (YYYY-MM-DD)')
+    parser.add_argument('--doy', type=int,
+                        help='Day of a day-of-year query on the 366-day leap-year calendar (1-366, '
+                             'Feb 29 is 60 and Mar 1 is 61 in every year)')
+    return parser.parse_args()
+
+
+def to_date_key(value):
+    """Convert a date, datetime or YYYY-MM-DD / YYYYMMDD string to the integer key YYYYMMDD."""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.year * 10000 + value.month * 100 + value.day
+    digits = str(value).replace('-', '')[:8]
+    return int(digits)
+
+
+def from_date_key(key):
+    """Convert an integer YYYYMMDD key back to YYYY-MM-DD."""
+    return f"{key // 10000:04d}-{key // 100 % 100:02d}-{key % 100:02d}"
+
+
+def day_of_year(key):
+    """Day of an integer YYYYMMDD key on the leap-year calendar, 1-366 (Mar 1 is 61 in every year)."""
+    return calendar_day_index(datetime.date(key // 10000, key // 100 % 100, key % 100)) + 1
+
+
+def parse_value(raw):
+    """Parse a CSV value into a float, empty strings and NaN become NULL."""
+    if raw is None or raw == '' or raw.lower() == 'nan':
+        return None
+    return float(raw)
+
+
+class ClimateStore:
+    """Indexed SQLite tables with point, range and day-of-year queries."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA mmap_size=268435456")
+        self.conn.execute("PRAGMA cache_size=-65536")
+        self._create_tables()
+        self._migrate()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _create_tables(self):
+        for dataset in DATASETS.values():
+            key_columns = [dataset['key']] + (['span'] if dataset['span'] else [])
+            key_definition = ', '.join(
+                f"{col} INTEGER NOT NULL" if col == 'span' else f"{col} TEXT NOT NULL" for col in key_columns)
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {dataset['table']} (
+                    {key_definition},
+                    date INTEGER NOT NULL,
+                    doy INTEGER NOT NULL,
+                    PRIMARY KEY ({', '.join(key_columns)}, date)
+                ) WITHOUT ROWID
+            """)
+            self.conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS {dataset['table']}_doy_idx
+                ON {dataset['table']} ({', '.join(key_columns)}, doy)
+            """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS cities (
+                city_id TEXT PRIMARY KEY,
+                grid_y INTEGER,
+                grid_x INTEGER
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS stations (
+                station_id TEXT PRIMARY KEY,
+                station_name TEXT,
+                lat REAL,
+                lon REAL
+            )
+        """)
+        self.conn.commit()
+
+    def _migrate(self):
+        """Bring a database written by an older version up to SCHEMA_VERSION."""
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            # doy was the ordinal day of the year, one lower from Mar 1 on in common years
+            self.conn.create_function('day_of_year', 1, day_of_year, deterministic=True)
+            for dataset in DATASETS.values():
+                self.conn.execute(f"UPDATE {dataset['table']} SET doy = day_of_year(date)")
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.commit()
+
+    def value_columns(self, table):
+        """Return the value columns of a table, i.e. all columns except keys, date and doy."""
+        columns = [row['name'] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+        return [col for col in columns if col not in ('city_id', 'station_id', 'span', 'date', 'doy')]
+
+    def _ensure_columns(self, table, columns):
+        existing = set(self.value_columns(table))
+        for col in columns:
+            if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', col):
+                raise ValueError(f"Invalid column name {col!r}")
+            if col not in existing:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} REAL")
+
+    def _upsert(self, table, key_names, columns, rows):
+        """Insert or replace rows of (key_tuple, date_key, {column: value})."""
+        self._ensure_columns(table, columns)
+        all_columns = list(key_names) + ['date', 'doy'] + columns
+        statement = (f"INSERT OR REPLACE INTO {table} ({', '.join(all_columns)}) "
+                     f"VALUES ({', '.join('?' * len(all_columns))})")
+        self.conn.executemany(statement, (
+            key_tuple + (date_key, day_of_year(date_key)) + tuple(values.get(col) for col in columns)
+            for key_tuple, date_key, values in rows
+        ))
+
+    def _ingest_daily_csv(self, table, key_values, file_path):
+        with open(file_path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            if 'date' not in (reader.fieldnames or []):
+                print(f"Skipping {file_path.name}: no date column found")
+                return 0
+            columns = [col for col in reader.fieldnames if col != 'date']
+            key_tuple = tuple(key_values.values())
+            rows = [
+                (key_tuple, to_date_key(row['date']), {col: parse_value(row[col]) for col in columns})
+                for row in reader
+            ]
+        self._upsert(table, list(key_values), columns, rows)
+        return len(rows)
+
+    def ingest_city_series(self, data_dir):
+        """Ingest the per-city HYRAS series written by extract_hyras_data.py."""
+        total = 0
+        with self.conn:
+            for file_path in sorted(Path(data_dir).glob('*.csv')):
+                match = HYRAS_FILE_PATTERN.match(file_path.name)
+                if not match or file_path.name.startswith('avg_'):
+                    continue
+                grid_y, grid_x, city_id = int(match.group(1)), int(match.group(2)), match.group(3)
+                self.conn.execute("INSERT OR REPLACE INTO cities VALUES (?, ?, ?)", (city_id, grid_y, grid_x))
+                total += self._ingest_daily_csv('city_series', {'city_id': city_id}, file_path)
+        print(f"Ingested {total} rows of city series from {data_dir}")
+        return total
+
+    def ingest_rolling_averages(self, data_dir):
+        """Ingest the rolling averages written by calculate_rolling_average.py."""
+        total = 0
+        with self.conn:
+            for file_path in sorted(Path(data_dir).glob('avg_*.csv')):
+                match = ROLLING_FILE_PATTERN.match(file_path.name)
+                if not match:
+                    continue
+                span, city_id = int(match.group(1)), match.group(4)
+                total += self._ingest_daily_csv('rolling_average', {'city_id': city_id, 'span': span}, file_path)
+        print(f"Ingested {total} rows of rolling averages from {data_dir}")
+        return total
+
+    def ingest_station_snapshot(self, file_path):
+        """Ingest a snapshot CSV of extract_10min_station_data.py as one row per station and day."""
+        file_path = Path(file_path)
+        with self.conn, open(file_path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            columns = [col for col in reader.fieldnames if col not in STATION_INFO_COLUMNS]
+            numeric_columns = []
+            rows = list(reader)
+            for col in columns:
+                try:
+                    for row in rows:
+                        parse_value(row[col])
+                    numeric_columns.append(col)
+                except ValueError:
+                    # Skip non-numeric columns such as the times of the extremes
+                    continue
+
+            station_rows = []
+            for row in rows:
+                if not row.get('data_date'):
+                    continue
+                # data_date is DD.MM.YYYY HH:MM
+                date_key = to_date_key(datetime.datetime.strptime(row['data_date'], '%d.%m.%Y %H:%M'))
+                self.conn.execute("INSERT OR REPLACE INTO stations VALUES (?, ?, ?, ?)",
+                                  (row['station_id'], row['station_name'], parse_value(row['lat']),
+                                   parse_value(row['lon'])))
+                station_rows.append(((row['station_id'],), date_key,
+                                     {col: parse_value(row[col]) for col in numeric_columns}))
+            self._upsert('station_daily', ['station_id'], numeric_columns, station_rows)
+            total = len(station_rows)
+        print(f"Ingested {total} station rows from {file_path}")
+        return total
+
+    def _where(self, dataset, key, span):
+        config = DATASETS[dataset]
+        clause, params = f"{config['key']} = ?", [str(key)]
+        if config['span']:
+            if span is None:
+                raise ValueError(f"Dataset {dataset} requires a span")
+            clause += " AND span = ?"
+            params.append(span)
+        return config['table'], clause, params
+
+    def _rows(self, cursor):
+        return [{**dict(row), 'date': from_date_key(row['date'])} for row in cursor]
+
+    def point(self, dataset, key, date, span=None):
+        """Return the values of a key on a date, or None."""
+        table, clause, params = self._where(dataset, key, span)
+        rows = self._rows(self.conn.execute(
+            f"SELECT * FROM {table} WHERE {clause} AND date = ?", params + [to_date_key(date)]))
+        return rows[0] if rows else None
+
+    def range(self, dataset, key, start, end, span=None):
+        """Return the values of a key between two dates (inclusive), ordered by date."""
+        table, clause, params = self._where(dataset, key, span)
+        return self._rows(self.conn.execute(
+            f"SELECT * FROM {table} WHERE {clause} AND date BETWEEN ? AND ? ORDER BY date",
+            params + [to_date_key(start), to_date_key(end)]))
+
+    def query_day_of_year(self, dataset, key, doy, span=None):
+        """Return the values of a key on a calendar day (1-366) across all years, ordered by date."""
+        table, clause, params = self._where(dataset, key, span)
+        return self._rows(self.conn.execute(
+            f"SELECT * FROM {table} WHERE {clause} AND doy = ? ORDER BY date", params + [doy]))
+
+
+def main():
+    """Main function to ingest output files or run a query."""
+    args = parse_arguments()
+
+    with ClimateStore(args.database) as store:
+        if args.command == 'ingest':
+            if args.hyras_dir:
+                store.ingest_city_series(args.hyras_dir)
+            if args.rolling_dir:
+                store.ingest_rolling_averages(args.rolling_dir)
+            for station_file in args.station_file or []:
+                store.ingest_station_snapshot(station_file)
+            return
+
+        if args.key is None:
+            print("Error: --key is required for queries")
+            return
+
+        start_time = time.perf_counter()
+        if args.date:
+            result = store.point(args.dataset, args.key, args.date, args.span)
+            rows = [result] if result else []
+        elif args.start and args.end:
+            rows = store.range(args.dataset, args.key, args.start, args.end, args.span)
+        elif args.doy:
+            rows = store.query_day_of_year(args.dataset, args.key, args.doy, args.span)
+        else:
+            print("Error: specify --date, --start and --end, or --doy")
+            return
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+        if rows:
+            writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"{len(rows)} rows in {elapsed_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+API service for the current station readings and their anomalies.
+
+Serves the memory-resident snapshot of backend/station_snapshot.py:
+
+    GET /health                                        snapshot source, age and station count
+    GET /stations/nearest?lat=52.52&lon=13.40&limit=3  nearest stations with their distance in km
+    GET /stations?min_lat=..&min_lon=..&max_lat=..&max_lon=..   stations inside a bounding box
+    GET /stations/{station_id}                         one station, e.g. /stations/433 or /stations/00433
+
+A background task checks the data directory every --reload-interval seconds and swaps in a new
+snapshot as soon as the station job writes a new output file, without a restart. Responses are
+joined from the pre-encoded JSON of the snapshot's records, so a request does no serialization.
+
+Run it with:
+    python backend/app.py --data-dir ./data/now --climatology ./data/climatology/climatology.npz \
+        --cities-metadata ./data/climatology/cities_metadata.csv
+"""
+
+import asyncio
+import argparse
+import contextlib
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import Response
+
+from station_snapshot import SnapshotStore
+
+DEFAULT_RELOAD_INTERVAL = 30
+MAX_LIMIT = 50
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Serve the latest station readings.')
+    parser.add_argument('--data-dir', type=str, default='./data/now',
+                        help='Directory with the 10min_station_data_<date>.csv files of the station job')
+    parser.add_argument('--climatology', type=str, help='Climatology .npz file of calculate_climatology.py')
+    parser.add_argument('--cities-metadata', type=str, help='cities_metadata.csv of the stations')
+    parser.add_argument('--reload-interval', type=float, default=DEFAULT_RELOAD_INTERVAL,
+                        help='Seconds between checks for a new output file of the station job')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    return parser.parse_args()
+
+
+def json_response(body):
+    return Response(content=body, media_type='application/json')
+
+
+def json_list(parts):
+    return b'[' + b','.join(parts) + b']'
+
+
+def create_app(store, reload_interval=DEFAULT_RELOAD_INTERVAL):
+    """Create the API for a SnapshotStore."""
+
+    async def watch():
+        while True:
+            await asyncio.sleep(reload_interval)
+            # Loading runs in a thread, requests keep being served from the current snapshot
+            await asyncio.to_thread(store.refresh)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        await asyncio.to_thread(store.refresh)
+        task = asyncio.create_task(watch())
+        yield
+        task.cancel()
+
+    app = FastAPI(title='ziemlichwarmhier stations', lifespan=lifespan)
+
+    def snapshot():
+        current = store.current
+        if current is None:
+            raise HTTPException(status_code=503, detail='No station data loaded yet')
+        return current
+
+    @app.get('/health')
+    def health():
+        current = store.current
+        return {'status': 'ok' if current is not None else 'no data', 'reloads': store.reloads,
+                'last_error': store.last_error, 'snapshot': current.info() if current is not None else None}
+
+    @app.get('/stations/nearest')
+    def nearest(lat: float = Query(ge=-90, le=90), lon: float = Query(ge=-180, le=180),
+                limit: int = Query(1, ge=1, le=MAX_LIMIT), max_distance_km: float | None = Query(None, gt=0)):
+        current = snapshot()
+        return json_response(json_list([
+            b'{"distance_km":%.2f,"station":%s}' % (distance, current.json_records[row])
+            for row, distance in current.index.nearest(lat, lon, k=limit, max_distance_km=max_distance_km)
+        ]))
+
+    @app.get('/stations')
+    def bounding_box(min_lat: float = Query(ge=-90, le=90), min_lon: float = Query(ge=-180, le=180),
+                     max_lat: float = Query(ge=-90, le=90), max_lon: float = Query(ge=-180, le=180)):
+        if min_lat > max_lat or min_lon > max_lon:
+            raise HTTPException(status_code=422, detail='min_lat/min_lon must not exceed max_lat/max_lon')
+        current = snapshot()
+        return json_response(json_list([current.json_records[row]
+                                        for row in current.index.within_bbox(min_lat, min_lon, max_lat, max_lon)]))
+
+    @app.get('/stations/{station_id}')
+    def station(station_id: str):
+        current = snapshot()
+        row = current.get(station_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail=f"Unknown station {station_id}")
+        return json_response(current.json_records[row])
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    args = parse_arguments()
+    store = SnapshotStore(args.data_dir, args.climatology, args.cities_metadata)
+    uvicorn.run(create_app(store, args.reload_interval), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
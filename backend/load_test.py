@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Load test of a local instance of the station API (backend/app.py).
+
+Worker threads send a mix of nearest-station, bounding-box and station-detail requests for random
+points in Germany over keep-alive connections for --duration seconds, then the throughput and the
+latency percentiles of every endpoint are printed:
+
+    python backend/app.py --data-dir ./data/now &
+    python backend/load_test.py --url http://127.0.0.1:8000 --concurrency 16 --duration 30
+
+Uses only the standard library, so it runs anywhere the service does.
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+# Bounding box of Germany
+MIN_LAT, MAX_LAT = 47.2, 55.1
+MIN_LON, MAX_LON = 5.8, 15.1
+
+# Endpoint -> share of the requests
+DEFAULT_MIX = {'nearest': 0.6, 'bbox': 0.2, 'station': 0.2}
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Load test the station API.')
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:8000', help='Base URL of the service')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of concurrent connections')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to send requests for')
+    parser.add_argument('--bbox-size', type=float, default=1.0, help='Edge length of the bounding boxes in degrees')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random request mix')
+    parser.add_argument('--output-file', type=str, help='Write the results to this JSON file')
+    return parser.parse_args()
+
+
+def random_path(rng, station_ids, bbox_size):
+    """Return (endpoint, path) of a random request."""
+    endpoint = rng.choices(list(DEFAULT_MIX), weights=list(DEFAULT_MIX.values()))[0]
+    lat, lon = rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LON, MAX_LON)
+    if endpoint == 'nearest':
+        return endpoint, f"/stations/nearest?lat={lat:.4f}&lon={lon:.4f}&limit=3"
+    if endpoint == 'bbox':
+        return endpoint, (f"/stations?min_lat={lat:.4f}&min_lon={lon:.4f}"
+                          f"&max_lat={lat + bbox_size:.4f}&max_lon={lon + bbox_size:.4f}")
+    return endpoint, f"/stations/{rng.choice(station_ids)}"
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))]
+
+
+def worker(url, deadline, seed, station_ids, bbox_size, results, lock):
+    """Send requests on one keep-alive connection until the deadline, collect latencies per endpoint."""
+    rng = random.Random(seed)
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    latencies, errors = {}, {}
+    while time.perf_counter() < deadline:
+        endpoint, path = random_path(rng, station_ids, bbox_size)
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+            ok = False
+        if ok:
+            latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+        else:
+            errors[endpoint] = errors.get(endpoint, 0) + 1
+    connection.close()
+    with lock:
+        for endpoint, values in latencies.items():
+            results['latencies'].setdefault(endpoint, []).extend(values)
+        for endpoint, value in errors.items():
+            results['errors'][endpoint] = results['errors'].get(endpoint, 0) + value
+
+
+def fetch_station_ids(url):
+    """Ids of all stations of the running instance, used for the station-detail requests."""
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    connection.request('GET', '/stations?min_lat=-90&min_lon=-180&max_lat=90&max_lon=180')
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    if response.status != 200:
+        raise RuntimeError(f"Listing the stations failed with status {response.status}: {body[:200]!r}")
+    return [station['station_id'] for station in json.loads(body)]
+
+
+def main():
+    args = parse_arguments()
+    try:
+        station_ids = fetch_station_ids(args.url)
+    except (OSError, RuntimeError) as e:
+        print(f"Service at {args.url} is not ready: {e}")
+        sys.exit(1)
+    if not station_ids:
+        print(f"Service at {args.url} has no stations loaded")
+        sys.exit(1)
+    print(f"Testing {args.url} with {len(station_ids)} stations, {args.concurrency} connections for {args.duration:.0f}s")
+
+    results = {'latencies': {}, 'errors': {}}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=worker, args=(args.url, deadline, args.seed + index, station_ids,
+                                                     args.bbox_size, results, lock))
+               for index in range(args.concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    summary = {'url': args.url, 'concurrency': args.concurrency, 'duration_seconds': round(elapsed, 3),
+               'stations': len(station_ids), 'endpoints': {}}
+    total = 0
+    print(f"{'endpoint':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint in DEFAULT_MIX:
+        values = sorted(results['latencies'].get(endpoint, []))
+        errors = results['errors'].get(endpoint, 0)
+        total += len(values)
+        entry = {'requests': len(values), 'errors': errors, 'requests_per_second': round(len(values) / elapsed, 1),
+                 **{f"p{q}_ms": round(percentile(values, q) * 1000, 3) for q in (50, 95, 99)}}
+        summary['endpoints'][endpoint] = entry
+        print(f"{endpoint:<10} {entry['requests']:>9} {errors:>7} {entry['requests_per_second']:>9.1f} "
+              f"{entry['p50_ms']:>8.2f} {entry['p95_ms']:>8.2f} {entry['p99_ms']:>8.2f}")
+    summary['requests_per_second'] = round(total / elapsed, 1)
+    print(f"Total: {total} requests, {summary['requests_per_second']:.1f} req/s")
+
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=1)
+        print(f"Saved results to {args.output_file}")
+    if sum(results['errors'].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
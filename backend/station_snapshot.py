@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Memory-resident snapshot of the latest station readings for the API service.
+
+A snapshot is built from the newest `10min_station_data_<date>.csv` of extract_10min_station_data.py
+in the data directory and, if configured, the climatology and cities_metadata.csv of the live
+anomaly stage (analysis/stations/compute_live_anomalies.py). Everything a request needs is
+computed once when the snapshot is loaded:
+
+    records        typed station rows including the anomalies against the climatology
+    json_records   the JSON encoding of every record, so responses are joined bytes
+    index          latitude/longitude bucket index of the station registry for nearest-station
+                   and bounding-box queries
+
+Snapshots are never modified after loading. SnapshotStore.refresh() builds a new snapshot when one
+of the input files changed and replaces the reference to the current one in a single assignment,
+so a request that took the current snapshot keeps a consistent view while the next one is loaded.
+
+Commands:
+    python backend/station_snapshot.py --data-dir ./data/now --lat 52.52 --lon 13.40
+"""
+
+import re
+import sys
+import csv
+import json
+import math
+import time
+import argparse
+import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'analysis' / 'stations'))
+from compute_live_anomalies import compute_anomalies, load_cell_lookup
+from station_registry import BucketIndex
+
+STATIONS_FILE_PATTERN = re.compile(r'^10min_station_data_(\d{8})\.csv$')
+# Columns that stay strings in the records, all other columns are parsed as numbers
+TEXT_COLUMNS = {'station_id', 'station_name', 'data_date'}
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Load a station snapshot and query it like the API does.')
+    parser.add_argument('--data-dir', type=str, required=True,
+                        help='Directory with the 10min_station_data_<date>.csv files of the station job')
+    parser.add_argument('--climatology', type=str, help='Climatology .npz file of calculate_climatology.py')
+    parser.add_argument('--cities-metadata', type=str, help='cities_metadata.csv of the stations')
+    parser.add_argument('--lat', type=float, help='Latitude of a point to find the nearest stations for')
+    parser.add_argument('--lon', type=float, help='Longitude of a point to find the nearest stations for')
+    parser.add_argument('--limit', type=int, default=3, help='Number of nearest stations to print')
+    return parser.parse_args()
+
+
+def find_latest_stations_file(data_dir):
+    """Return the newest 10min_station_data_<date>.csv in a directory, or None."""
+    candidates = [path for path in Path(data_dir).glob('10min_station_data_*.csv')
+                  if STATIONS_FILE_PATTERN.match(path.name)]
+    return max(candidates, key=lambda path: path.name) if candidates else None
+
+
+def file_signature(path):
+    """(path, size, mtime) of a file, or None if it does not exist. Changes when the file is replaced."""
+    if path is None:
+        return None
+    try:
+        stat = Path(path).stat()
+    except OSError:
+        return None
+    return str(path), stat.st_size, stat.st_mtime_ns
+
+
+def parse_value(column, value):
+    if column in TEXT_COLUMNS:
+        return value
+    if value in ('', None):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return number if math.isfinite(number) else None
+
+
+class StationSnapshot:
+    """Station records of one output file of the station job, indexed for the API."""
+
+    def __init__(self, records, source, signature):
+        self.records = records
+        self.source = source
+        self.signature = signature
+        self.loaded_at = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.json_records = [json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                             for record in records]
+        self.rows = {int(record['station_id']): row for row, record in enumerate(records)}
+        self.index = BucketIndex([float(record['lat']) for record in records],
+                                 [float(record['lon']) for record in records])
+        dates = [record['data_date'] for record in records if record.get('data_date')]
+        self.data_date = max(dates, key=lambda date: datetime.datetime.strptime(date, '%d.%m.%Y %H:%M')) if dates else None
+
+    @classmethod
+    def load(cls, stations_file, climatology_file=None, cities_metadata=None, signature=None):
+        """Read a station CSV and add the anomalies if a climatology and the cities metadata are given.
+
+        signature is the file_signature() of the inputs taken before they are read. A file that is
+        replaced while it is read then no longer matches it, so the next refresh loads it again.
+        """
+        if signature is None:
+            signature = (file_signature(stations_file), file_signature(climatology_file), file_signature(cities_metadata))
+        with open(stations_file, newline='', encoding='utf-8') as f:
+            stations = list(csv.DictReader(f))
+        stations = [station for station in stations if station.get('lat') and station.get('lon')]
+
+        rows = stations
+        if stations and climatology_file and cities_metadata:
+            with np.load(climatology_file) as data:
+                climatology = {key: data[key] for key in ('grid_y', 'grid_x', 'metrics', 'levels', 'mean', 'quantiles')}
+            by_station, by_coordinates = load_cell_lookup(cities_metadata)
+            anomalies, _ = compute_anomalies(stations, climatology, by_station, by_coordinates)
+            rows = [{**station, **anomaly} for station, anomaly in zip(stations, anomalies)]
+
+        records = [{column: parse_value(column, value) for column, value in row.items()} for row in rows]
+        return cls(records, str(stations_file), signature)
+
+    def __len__(self):
+        return len(self.records)
+
+    def info(self):
+        return {'source': Path(self.source).name, 'loaded_at': self.loaded_at, 'data_date': self.data_date,
+                'stations': len(self)}
+
+    def get(self, station_id):
+        """Row of a station by id (int or zero-padded string), or None."""
+        try:
+            return self.rows.get(int(station_id))
+        except ValueError:
+            return None
+
+
+class SnapshotStore:
+    """Holds the current snapshot and replaces it when the job publishes a new output file."""
+
+    def __init__(self, data_dir, climatology_file=None, cities_metadata=None):
+        self.data_dir = Path(data_dir)
+        self.climatology_file = climatology_file
+        self.cities_metadata = cities_metadata
+        self.current = None
+        self.reloads = 0
+        self.last_error = None
+
+    def signature(self):
+        """Signature of the inputs a snapshot would be built from now."""
+        return (file_signature(find_latest_stations_file(self.data_dir)),
+                file_signature(self.climatology_file), file_signature(self.cities_metadata))
+
+    def refresh(self):
+        """Load a new snapshot if the inputs changed. Returns True if the current snapshot was replaced.
+
+        A file that fails to load (e.g. while it is still being written) leaves the current
+        snapshot in place, the next refresh tries again.
+        """
+        signature = self.signature()
+        if signature[0] is None or (self.current is not None and self.current.signature == signature):
+            return False
+        try:
+            snapshot = StationSnapshot.load(signature[0][0], self.climatology_file, self.cities_metadata,
+                                            signature)
+        except (OSError, ValueError, KeyError) as e:
+            self.last_error = f"{signature[0][0]}: {e}"
+            print(f"Keeping the current snapshot, could not load {self.last_error}")
+            return False
+        # Requests hold a reference to the snapshot they started with, swapping the reference is atomic
+        self.current = snapshot
+        self.reloads += 1
+        self.last_error = None
+        print(f"Loaded {len(snapshot)} stations from {snapshot.source}")
+        return True
+
+
+def main():
+    args = parse_arguments()
+    store = SnapshotStore(args.data_dir, args.climatology, args.cities_metadata)
+    start = time.perf_counter()
+    if not store.refresh():
+        print(f"No station data found in {args.data_dir}")
+        return
+    snapshot = store.current
+    print(f"Snapshot of {len(snapshot)} stations ({snapshot.data_date}) loaded in {time.perf_counter() - start:.3f}s")
+
+    if args.lat is not None and args.lon is not None:
+        for row, distance in snapshot.index.nearest(args.lat, args.lon, k=args.limit):
+            record = snapshot.records[row]
+            print(f"{record['station_id']} {record['station_name']}: {distance:.1f} km, "
+                  f"{record.get('temperature')} °C")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic DWD and HYRAS inputs for the benchmarks, fully offline.
+
+Layout of the fixtures directory:
+
+    hyras/5km/{tasmax,tas}_hyras_5_<year>_v6-0_de.nc   HYRAS-shaped grids (time, y, x) with 2D lat/lon
+    hyras/1km/{tasmax,tas}_hyras_1_<year>_v6-0_de.nc
+    cities.csv                                          name, lat, lon of cities inside the grid
+    city_series/<grid_y>_<grid_x>_<city_id>.csv         daily series as written by extract_hyras_data.py
+    now/zehn_now_tu_Beschreibung_Stationen.txt          10-minute station descriptions
+    now/10minutenwerte_TU_<id>_now/produkt_zehn_now_tu_<from>_<to>_<id>.txt
+    daily/KL_Tageswerte_Beschreibung_Stationen.txt      daily station descriptions
+    daily/tageswerte_KL_<id>_akt/produkt_klima_tag_<from>_<to>_<id>.txt
+    manifest.json                                       sizes and reference dates of the fixtures
+
+The station files contain -999 gaps and `eor` terminators like the DWD originals.
+"""
+
+import json
+import argparse
+import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# Grid shapes (y, x) of the HYRAS-DE domain at 5 km and 1 km
+GRID_SHAPES = {5: (220, 180), 1: (1100, 900)}
+# Cell size of the grids in meters
+GRID_RESOLUTIONS = {5: 5000.0, 1: 1000.0}
+
+STATES = ['Bayern', 'Baden-Württemberg', 'Niedersachsen', 'Hessen', 'Sachsen', 'Brandenburg']
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Generate synthetic DWD/HYRAS fixtures for the benchmarks')
+    parser.add_argument('--output-dir', type=str, default=str(Path(__file__).resolve().parent / 'fixtures'),
+                        help='Directory for the fixtures')
+    parser.add_argument('--year', type=int, default=2020, help='Year of the HYRAS grids')
+    parser.add_argument('--days-5km', type=int, default=366, help='Days in the 5 km grids')
+    parser.add_argument('--days-1km', type=int, default=31, help='Days in the 1 km grids')
+    parser.add_argument('--cities', type=int, default=50, help='Number of cities')
+    parser.add_argument('--city-years', type=int, default=30, help='Years of the daily city series')
+    parser.add_argument('--stations', type=int, default=500, help='Number of stations')
+    parser.add_argument('--days-10min', type=int, default=2, help='Days in the 10-minute station files')
+    parser.add_argument('--days-daily', type=int, default=550, help='Days in the daily station files')
+    parser.add_argument('--gap-fraction', type=float, default=0.02, help='Fraction of -999 values')
+    parser.add_argument('--reference-date', type=str, default='20250618',
+                        help='Last day of the station files (YYYYMMDD)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    return parser.parse_args()
+
+
+def grid_coordinates(ny, nx, resolution):
+    """2D lat/lon of a slightly curved grid covering Germany, similar to the HYRAS projection."""
+    y = np.arange(ny) * resolution
+    x = np.arange(nx) * resolution
+    xx, yy = np.meshgrid(x, y)
+    lat = 47.2 + yy / 111000.0 + 2e-11 * (xx - xx.mean()) ** 2
+    lon = 5.8 + xx / (111000.0 * np.cos(np.radians(lat)))
+    return y, x, lat, lon
+
+
+def write_grids(output_dir, resolution, year, days, rng):
+    """Write tasmax and tas grids of one resolution. Returns the written files."""
+    ny, nx = GRID_SHAPES[resolution]
+    y, x, lat, lon = grid_coordinates(ny, nx, GRID_RESOLUTIONS[resolution])
+    time = pd.date_range(f"{year}-01-01", periods=days, freq='D')
+    seasonal = 10 + 10 * np.sin(2 * np.pi * (np.arange(days) - 100) / 365.25)
+
+    grid_dir = output_dir / 'hyras' / f"{resolution}km"
+    grid_dir.mkdir(parents=True, exist_ok=True)
+    files = []
+    for var, offset in (('tasmax', 5.0), ('tas', 0.0)):
+        data = np.empty((days, ny, nx), dtype=np.float32)
+        for day in range(days):
+            data[day] = seasonal[day] + offset - (lat - 50) + rng.standard_normal((ny, nx), dtype=np.float32)
+        # Cells outside Germany are missing in HYRAS
+        data[:, :ny // 10, :nx // 10] = np.nan
+
+        ds = xr.Dataset({var: (('time', 'y', 'x'), data, {'units': 'degC'})},
+                        coords={'time': time, 'y': y, 'x': x, 'lat': (('y', 'x'), lat), 'lon': (('y', 'x'), lon)})
+        file_path = grid_dir / f"{var}_hyras_{resolution}_{year}_v6-0_de.nc"
+        ds.to_netcdf(file_path, encoding={var: {'zlib': True, 'complevel': 1, '_FillValue': np.float32(np.nan)}})
+        files.append(file_path)
+    return files, (ny, nx)
+
+
+def write_cities(output_dir, count, rng):
+    """Write cities.csv with cities spread over the grid."""
+    cities = pd.DataFrame({
+        'name': [f"City {index}" for index in range(count)],
+        'lat': rng.uniform(48.0, 54.5, count).round(4),
+        'lon': rng.uniform(7.0, 14.5, count).round(4),
+    })
+    cities.to_csv(output_dir / 'cities.csv', index=False)
+    return cities
+
+
+def write_city_series(output_dir, cities, years, end_year, rng):
+    """Write daily series of every city in the layout of extract_hyras_data.py."""
+    series_dir = output_dir / 'city_series'
+    series_dir.mkdir(parents=True, exist_ok=True)
+    dates = pd.date_range(f"{end_year - years + 1}-01-01", f"{end_year}-12-31", freq='D')
+    seasonal = 10 + 10 * np.sin(2 * np.pi * (dates.dayofyear.to_numpy() - 100) / 365.25)
+    for index, city in cities.iterrows():
+        tas = seasonal + rng.normal(0, 3, len(dates))
+        df = pd.DataFrame({'date': dates.strftime('%Y-%m-%d'), 'tasmax': (tas + 5).round(2),
+                           'tas': tas.round(2), 'tasmin': (tas - 5).round(2)})
+        df.to_csv(series_dir / f"{index % 200}_{index // 200}_city_{index}.csv", index=False)
+    return len(dates)
+
+
+def write_description(file_path, station_ids, rng, to_date):
+    """Write a fixed-width *_Beschreibung_Stationen.txt file."""
+    lines = [
+        'Stations_id von_datum bis_datum Stationshoehe geoBreite geoLaenge Stationsname Bundesland Abgabe',
+        '----------- --------- --------- ------------- --------- --------- '
+        '----------------------------------------- ---------- --------',
+    ]
+    for station_id in station_ids:
+        name = f"Station {station_id} Nord"
+        state = STATES[station_id % len(STATES)]
+        lines.append(f"{station_id:05d} 20070101 {to_date} {int(rng.integers(0, 1500)):>14} "
+                     f"{rng.uniform(47.5, 54.8):>12.4f} {rng.uniform(6.0, 14.9):>9.4f} "
+                     f"{name:<41} {state:<40} Frei")
+    file_path.write_text('\n'.join(lines) + '\n', encoding='latin1')
+
+
+def format_values(values, gaps):
+    return ['-999' if gap else f"{value:.1f}" for value, gap in zip(values, gaps)]
+
+
+def write_10min_files(output_dir, station_ids, days, reference_date, gap_fraction, rng):
+    """Write 10-minute air temperature files ending on the reference date."""
+    now_dir = output_dir / 'now'
+    now_dir.mkdir(parents=True, exist_ok=True)
+    write_description(now_dir / 'zehn_now_tu_Beschreibung_Stationen.txt', station_ids, rng, reference_date)
+
+    end = datetime.datetime.strptime(reference_date, '%Y%m%d') + datetime.timedelta(days=1)
+    times = [end - datetime.timedelta(minutes=10 * step) for step in range(days * 144, 0, -1)]
+    stamps = [t.strftime('%Y%m%d%H%M') for t in times]
+    from_date, to_date = stamps[0][:8], reference_date
+    rows = len(stamps)
+
+    for station_id in station_ids:
+        station_dir = now_dir / f"10minutenwerte_TU_{station_id:05d}_now"
+        station_dir.mkdir(exist_ok=True)
+        temperature = 15 + 8 * np.sin(np.linspace(0, 2 * np.pi * days, rows)) + rng.normal(0, 0.5, rows)
+        columns = [
+            format_values(1000 + rng.normal(0, 5, rows), rng.random(rows) < gap_fraction),
+            format_values(temperature, rng.random(rows) < gap_fraction),
+            format_values(temperature - 1, rng.random(rows) < gap_fraction),
+            format_values(rng.uniform(30, 100, rows), rng.random(rows) < gap_fraction),
+            format_values(temperature - 8, rng.random(rows) < gap_fraction),
+        ]
+        lines = ['STATIONS_ID;MESS_DATUM;  QN;PP_10;TT_10;TM5_10;RF_10;TD_10;eor']
+        for row, stamp in enumerate(stamps):
+            values = ';'.join(f"{column[row]:>6}" for column in columns)
+            lines.append(f"{station_id:>11};{stamp};    3;{values};eor")
+        file_path = station_dir / f"produkt_zehn_now_tu_{from_date}_{to_date}_{station_id:05d}.txt"
+        file_path.write_text('\n'.join(lines) + '\n', encoding='latin1')
+    return rows
+
+
+def write_daily_files(output_dir, station_ids, days, reference_date, gap_fraction, rng):
+    """Write daily KL files ending on the reference date."""
+    daily_dir = output_dir / 'daily'
+    daily_dir.mkdir(parents=True, exist_ok=True)
+    write_description(daily_dir / 'KL_Tageswerte_Beschreibung_Stationen.txt', station_ids, rng, reference_date)
+
+    end = datetime.datetime.strptime(reference_date, '%Y%m%d')
+    stamps = [(end - datetime.timedelta(days=offset)).strftime('%Y%m%d') for offset in range(days - 1, -1, -1)]
+    header = 'STATIONS_ID;MESS_DATUM;QN_3;  FX;  FM;QN_4; RSK;RSKF; SDK;SHK_TAG;  NM; VPM;  PM; TMK; UPM; TXK; TNK; TGK;eor'
+
+    for station_id in station_ids:
+        station_dir = daily_dir / f"tageswerte_KL_{station_id:05d}_akt"
+        station_dir.mkdir(exist_ok=True)
+        tmk = 10 + 10 * np.sin(np.linspace(0, 2 * np.pi * days / 365.25, days)) + rng.normal(0, 2, days)
+        tmk_values = format_values(tmk, rng.random(days) < gap_fraction)
+        txk_values = format_values(tmk + 6, rng.random(days) < gap_fraction)
+        tnk_values = format_values(tmk - 6, rng.random(days) < gap_fraction)
+        upm_values = format_values(rng.uniform(40, 100, days), rng.random(days) < gap_fraction)
+        lines = [header]
+        for row, stamp in enumerate(stamps):
+            lines.append(f"{station_id:>5};{stamp};   10;   8.1;   3.2;    3;   0.0;   0;  -999;   0;   5.0;  "
+                         f"11.2; 1012.3;{tmk_values[row]:>6};{upm_values[row]:>7};{txk_values[row]:>6};"
+                         f"{tnk_values[row]:>6};   7.0;eor")
+        file_path = station_dir / f"produkt_klima_tag_{stamps[0]}_{stamps[-1]}_{station_id:05d}.txt"
+        file_path.write_text('\n'.join(lines) + '\n', encoding='latin1')
+    return days
+
+
+def main():
+    args = parse_arguments()
+    rng = np.random.default_rng(args.seed)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest = {'seed': args.seed, 'reference_date': args.reference_date, 'grids': {}}
+    for resolution, days in ((5, args.days_5km), (1, args.days_1km)):
+        files, shape = write_grids(output_dir, resolution, args.year, days, rng)
+        manifest['grids'][f"{resolution}km"] = {'files': [str(f.relative_to(output_dir)) for f in files],
+                                               'shape': list(shape), 'days': days}
+        print(f"Wrote {resolution} km grids {shape} with {days} days")
+
+    cities = write_cities(output_dir, args.cities, rng)
+    series_days = write_city_series(output_dir, cities, args.city_years, args.year, rng)
+    manifest['cities'] = {'count': len(cities), 'series_days': series_days}
+    print(f"Wrote {len(cities)} cities with {series_days} days each")
+
+    station_ids = sorted(rng.choice(np.arange(1, 20000), size=args.stations, replace=False).tolist())
+    rows_10min = write_10min_files(output_dir, station_ids, args.days_10min, args.reference_date,
+                                   args.gap_fraction, rng)
+    rows_daily = write_daily_files(output_dir, station_ids, args.days_daily, args.reference_date,
+                                   args.gap_fraction, rng)
+    manifest['stations'] = {'count': len(station_ids), 'rows_10min': rows_10min, 'rows_daily': rows_daily}
+    print(f"Wrote {len(station_ids)} stations with {rows_10min} 10-minute and {rows_daily} daily rows")
+
+    with open(output_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    print(f"Fixtures written to {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Time the hot paths of the pipeline on the synthetic fixtures of generate_fixtures.py.
+
+Every benchmark runs in a fresh (spawned) process, so its peak RSS is not inflated by the
+benchmarks before it. A benchmark prepares its inputs once, then runs the measured function
+--repeat times; the result records the minimum and median wall time, the throughput of the
+fastest run in items per second and the peak RSS of the process.
+
+Results are written to benchmarks/results/<commit>.json (with a -dirty suffix for uncommitted
+changes), so two commits can be compared:
+
+    python benchmarks/generate_fixtures.py
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<old>.json
+"""
+
+import io
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import contextlib
+import multiprocessing
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCHMARK_DIR.parent
+ANALYSIS_DIR = REPO_DIR / 'analysis'
+
+# Directories of the scripts under test, they import their siblings directly
+SCRIPT_DIRS = ['hyras', 'rolling_average', 'stations', 'common']
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Run the pipeline benchmarks')
+    parser.add_argument('--fixtures', type=str, default=str(BENCHMARK_DIR / 'fixtures'),
+                        help='Directory written by generate_fixtures.py')
+    parser.add_argument('--output-dir', type=str, default=str(BENCHMARK_DIR / 'results'),
+                        help='Directory for the result JSON files')
+    parser.add_argument('--only', action='append', help='Run only the named benchmark(s)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per benchmark')
+    parser.add_argument('--cities', type=int, default=10, help='Cities used by the per-city benchmarks')
+    parser.add_argument('--compare', type=str, help='Earlier result file to compare the throughput with')
+    parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+    return parser.parse_args()
+
+
+def import_scripts():
+    """Make the analysis scripts importable and silence their progress output."""
+    for name in SCRIPT_DIRS:
+        sys.path.insert(0, str(ANALYSIS_DIR / name))
+    logging.disable(logging.WARNING)
+
+
+def load_cities(fixtures, count):
+    import pandas as pd
+    cities = pd.read_csv(fixtures / 'cities.csv').head(count).to_dict(orient='records')
+    for index, city in enumerate(cities):
+        city['id'] = f"city_{index}"
+    return cities
+
+
+def grid_files(fixtures, resolution):
+    with open(fixtures / 'manifest.json', 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return [fixtures / name for name in manifest['grids'][f"{resolution}km"]['files']]
+
+
+def station_files(fixtures, subdir, pattern):
+    return sorted((fixtures / subdir).glob(pattern))
+
+
+def read_reference_date(fixtures):
+    with open(fixtures / 'manifest.json', 'r', encoding='utf-8') as f:
+        return json.load(f)['reference_date']
+
+
+# Every benchmark takes (fixtures, args) and returns (run, items): a function without arguments
+# that is timed and the number of items it processes per call.
+
+def bench_grid_centers(resolution):
+    def setup(fixtures, args):
+        import xarray as xr
+        from extract_hyras_data import calculate_grid_centers
+        with xr.open_dataset(grid_files(fixtures, resolution)[0]) as ds:
+            lat, lon = ds['lat'].values, ds['lon'].values
+        return (lambda: calculate_grid_centers(lat, lon)), lat.size
+    return setup
+
+
+def bench_nearest_grid_point(resolution):
+    def setup(fixtures, args):
+        import xarray as xr
+        from extract_hyras_data import calculate_grid_centers, find_nearest_grid_point
+        with xr.open_dataset(grid_files(fixtures, resolution)[0]) as ds:
+            centers_lat, centers_lon = calculate_grid_centers(ds['lat'].values, ds['lon'].values)
+        cities = load_cities(fixtures, args.cities)
+
+        def run():
+            for city in cities:
+                find_nearest_grid_point(centers_lat, centers_lon, city['lat'], city['lon'])
+        return run, len(cities)
+    return setup
+
+
+def bench_process_city(resolution):
+    def setup(fixtures, args):
+        import tempfile
+        import pandas as pd
+        from extract_hyras_data import process_city
+        files = [str(f) for f in grid_files(fixtures, resolution)]
+        params = ['tasmax', 'tas']
+        cities = load_cities(fixtures, args.cities)
+        output_dir = Path(tempfile.mkdtemp(prefix='bench_process_city_'))
+
+        def run():
+            cities_df = pd.DataFrame([{'city_id': city['id'], 'city_name': city['name'], 'city_lat': city['lat'],
+                                       'city_lon': city['lon'], 'grid_y': None, 'grid_x': None, 'grid_lat1': None,
+                                       'grid_lon1': None, 'grid_lat2': None, 'grid_lon2': None}
+                                      for city in cities])
+            for city in cities:
+                cities_df = process_city(city, files, params, output_dir, cities_df)
+        return run, len(cities)
+    return setup
+
+
+def bench_process_file(fixtures, args):
+    import tempfile
+    from calculate_rolling_average import process_file
+    files = station_files(fixtures, 'city_series', '*.csv')[:args.cities]
+    output_dir = tempfile.mkdtemp(prefix='bench_process_file_')
+
+    def run():
+        for file_path in files:
+            process_file(file_path, 1991, 2020, 7, output_dir)
+    return run, len(files)
+
+
+def bench_check_station_data(fixtures, args):
+    from extract_active_stations import check_station_data
+    files = station_files(fixtures, 'daily', 'tageswerte_KL_*/produkt_klima_tag_*.txt')
+    reference_date = read_reference_date(fixtures)
+
+    def run():
+        for file_path in files:
+            check_station_data(file_path, reference_date, 7, '-999', ['TMK', 'TXK', 'TNK', 'UPM'])
+    return run, len(files)
+
+
+def bench_process_station_data(fixtures, args):
+    from extract_10min_station_data import process_station_data
+    files = station_files(fixtures, 'now', '10minutenwerte_TU_*/produkt_zehn_now_tu_*.txt')
+    reference_date = read_reference_date(fixtures)
+
+    def run():
+        for file_path in files:
+            process_station_data(file_path, reference_date, '-999')
+    return run, len(files)
+
+
+def bench_extract_station_data(dataset, subdir, pattern):
+    def setup(fixtures, args):
+        from dwd_datasets import DATASETS, read_product_file, summarize_day
+        spec = DATASETS[dataset]
+        files = station_files(fixtures, subdir, pattern)
+        reference_date = read_reference_date(fixtures)
+
+        def run():
+            for file_path in files:
+                product = read_product_file(file_path, spec)
+                summarize_day(product.columns, product.timestamps, product.values, spec, reference_date)
+        return run, len(files)
+    return setup
+
+
+def bench_extract_station_data_cli(dataset, subdir):
+    """Run extract_station_data.py end to end like the station jobs do, a failing run fails the benchmark."""
+    def setup(fixtures, args):
+        import tempfile
+        script = ANALYSIS_DIR / 'stations' / 'extract_station_data.py'
+        output_file = Path(tempfile.mkdtemp(prefix='bench_extract_station_data_')) / 'station_data.csv'
+        command = [sys.executable, str(script), '--dataset', dataset, '--data-dir', str(fixtures / subdir),
+                   '--reference-date', read_reference_date(fixtures), '--output-file', str(output_file),
+                   '--workers', '1']
+
+        def run():
+            result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode:
+                raise RuntimeError(f"extract_station_data.py --dataset {dataset} exited with {result.returncode}: "
+                                   f"{result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ''}")
+        return run, len(list((fixtures / subdir).glob('*/*.txt')))
+    return setup
+
+
+def bench_check_product(dataset, subdir, pattern):
+    def setup(fixtures, args):
+        from data_quality import check_product
+        from dwd_datasets import DATASETS, read_product_file
+        spec = DATASETS[dataset]
+        products = [read_product_file(file_path, spec)
+                    for file_path in station_files(fixtures, subdir, pattern)]
+
+        def run():
+            for product in products:
+                check_product(product, spec)
+        return run, sum(len(product.timestamps) for product in products)
+    return setup
+
+
+BENCHMARKS = {
+    'calculate_grid_centers_5km': (bench_grid_centers(5), 'cells'),
+    'calculate_grid_centers_1km': (bench_grid_centers(1), 'cells'),
+    'find_nearest_grid_point_5km': (bench_nearest_grid_point(5), 'cities'),
+    'find_nearest_grid_point_1km': (bench_nearest_grid_point(1), 'cities'),
+    'process_city_5km': (bench_process_city(5), 'cities'),
+    'process_city_1km': (bench_process_city(1), 'cities'),
+    'process_file': (bench_process_file, 'files'),
+    'check_station_data': (bench_check_station_data, 'files'),
+    'process_station_data': (bench_process_station_data, 'files'),
+    'extract_station_data_10min': (bench_extract_station_data('10min', 'now', '10minutenwerte_TU_*/produkt_zehn_now_tu_*.txt'),
+                                   'files'),
+    'extract_station_data_daily': (bench_extract_station_data('daily', 'daily', 'tageswerte_KL_*/produkt_klima_tag_*.txt'),
+                                   'files'),
+    'extract_station_data_cli_10min': (bench_extract_station_data_cli('10min', 'now'), 'files'),
+    'check_product_10min': (bench_check_product('10min', 'now', '10minutenwerte_TU_*/produkt_zehn_now_tu_*.txt'), 'rows'),
+    'check_product_daily': (bench_check_product('daily', 'daily', 'tageswerte_KL_*/produkt_klima_tag_*.txt'), 'rows'),
+}
+
+
+def run_benchmark(name, fixtures, args, queue):
+    """Run one benchmark in the current (child) process and put its result on the queue."""
+    try:
+        import_scripts()
+        setup, unit = BENCHMARKS[name]
+        # The scripts print progress, which would distort the timings on a terminal
+        with contextlib.redirect_stdout(io.StringIO()):
+            run, items = setup(Path(fixtures), args)
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+        queue.put({
+            'name': name,
+            'unit': unit,
+            'items': items,
+            'seconds_min': min(timings),
+            'seconds_median': statistics.median(timings),
+            'throughput': items / min(timings) if min(timings) > 0 else None,
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                           / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+        })
+    except Exception as e:
+        queue.put({'name': name, 'error': f"{type(e).__name__}: {e}"})
+
+
+def git_revision():
+    """Return the short commit hash with a -dirty suffix for uncommitted changes, or 'unknown'."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_comparison(results, baseline_file):
+    """Print the throughput of every benchmark relative to an earlier result file."""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {entry['name']: entry for entry in json.load(f)['benchmarks']}
+
+    print(f"\nCompared with {baseline_file}:")
+    for entry in results:
+        old = baseline.get(entry['name'])
+        if not old or not old.get('throughput') or not entry.get('throughput'):
+            continue
+        ratio = entry['throughput'] / old['throughput']
+        print(f"  {entry['name']:<32} {ratio:6.2f}x  ({old['throughput']:,.1f} -> {entry['throughput']:,.1f} "
+              f"{entry['unit']}/s, peak RSS {old['peak_rss_mb']:.0f} -> {entry['peak_rss_mb']:.0f} MB)")
+
+
+def main():
+    args = parse_arguments()
+
+    if args.list:
+        for name, (_, unit) in BENCHMARKS.items():
+            print(f"{name} ({unit}/s)")
+        return
+
+    fixtures = Path(args.fixtures)
+    if not (fixtures / 'manifest.json').exists():
+        print(f"No fixtures found in {fixtures}, run generate_fixtures.py first")
+        sys.exit(1)
+
+    names = args.only or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(unknown)}")
+        sys.exit(1)
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name in names:
+        queue = context.Queue()
+        process = context.Process(target=run_benchmark, args=(name, str(fixtures), args, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        results.append(result)
+
+        if 'error' in result:
+            print(f"{name:<32} failed: {result['error']}")
+        else:
+            print(f"{name:<32} {result['throughput']:>12,.1f} {result['unit']}/s  "
+                  f"min {result['seconds_min']:.3f}s  median {result['seconds_median']:.3f}s  "
+                  f"peak RSS {result['peak_rss_mb']:.0f} MB")
+
+    revision = git_revision()
+    report = {
+        'commit': revision,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': multiprocessing.cpu_count(),
+        'repeat': args.repeat,
+        'cities': args.cities,
+        'benchmarks': results,
+    }
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / f"{revision}.json"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    print(f"Saved results to {output_file}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+    if any('error' in result for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
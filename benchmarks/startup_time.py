@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Measure the cold start of the station job's scripts and fail if it exceeds the budget.
+
+Each script is started with `python -X importtime <script> --help`, which imports everything
+the script imports at module level and exits before any work is done. The import time is the
+sum of the 'self' column of the importtime report; of --repeat runs the fastest one is kept.
+The budgets in startup_budget.json are in milliseconds of import time; a script that exceeds
+its budget (or regresses by more than --max-regression against a --baseline result) makes the
+benchmark exit with status 1, so it can run as a CI check:
+
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --output-file startup.json
+    python benchmarks/startup_time.py --baseline startup.json --max-regression 0.2
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCHMARK_DIR.parent
+
+# Scripts of the 10-minute station job, relative to the repository
+SCRIPTS = [
+    'analysis/stations/fetch_station_data.py',
+    'analysis/stations/extract_10min_station_data.py',
+    'analysis/stations/station_history.py',
+    'analysis/stations/compute_live_anomalies.py',
+    'analysis/stations/upload_to_s3.py',
+]
+
+# import time:       646 |      11233 |             pathlib._abc
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Measure the import time of the station job scripts')
+    parser.add_argument('--script', action='append', help='Script(s) to measure (default: the station job scripts)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per script, the fastest one is kept')
+    parser.add_argument('--budget-file', type=str, default=str(BENCHMARK_DIR / 'startup_budget.json'),
+                        help='JSON file mapping script names to their import time budget in ms')
+    parser.add_argument('--baseline', type=str, help='Earlier --output-file to compare with')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='Allowed relative increase of the import time over the baseline')
+    parser.add_argument('--top', type=int, default=5, help='Slowest top-level imports listed per script')
+    parser.add_argument('--output-file', type=str, help='Write the measurements to this JSON file')
+    return parser.parse_args()
+
+
+def parse_importtime(stderr):
+    """Return (total import time in ms, [(cumulative ms, module)] of the top-level imports)."""
+    total_us = 0
+    top_level = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        total_us += int(self_us)
+        # Top-level imports are indented by exactly one space after the separator
+        if len(indent) == 1:
+            top_level.append((int(cumulative_us) / 1000, module))
+    return total_us / 1000, sorted(top_level, reverse=True)
+
+
+def measure_script(script, repeat):
+    """Start a script with --help `repeat` times and return the measurements of the fastest run."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', str(REPO_DIR / script), '--help'],
+                                cwd=REPO_DIR, capture_output=True, text=True)
+        wall_ms = (time.perf_counter() - start) * 1000
+        if result.returncode != 0:
+            raise RuntimeError(f"{script} --help failed: {result.stderr.strip().splitlines()[-1]}")
+        import_ms, top_level = parse_importtime(result.stderr)
+        if best is None or import_ms < best['import_ms']:
+            best = {'import_ms': round(import_ms, 1), 'wall_ms': round(wall_ms, 1), 'top_level': top_level}
+    return best
+
+
+def main():
+    args = parse_arguments()
+    scripts = args.script or SCRIPTS
+
+    budgets = {}
+    if Path(args.budget_file).exists():
+        with open(args.budget_file, 'r', encoding='utf-8') as f:
+            budgets = json.load(f)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = {entry['script']: entry for entry in json.load(f)['scripts']}
+
+    results, failures = [], []
+    for script in scripts:
+        try:
+            measured = measure_script(script, args.repeat)
+        except RuntimeError as e:
+            print(f"{script}: {e}")
+            failures.append(script)
+            continue
+
+        name = Path(script).name
+        budget = budgets.get(name)
+        status = 'ok'
+        if budget is not None and measured['import_ms'] > budget:
+            status = f"over budget of {budget} ms"
+        old = baseline.get(script)
+        if old and measured['import_ms'] > old['import_ms'] * (1 + args.max_regression):
+            status = f"regressed from {old['import_ms']} ms"
+        if status != 'ok':
+            failures.append(script)
+
+        print(f"{name:<36} imports {measured['import_ms']:>7.1f} ms  process {measured['wall_ms']:>7.1f} ms  {status}")
+        for cumulative_ms, module in measured['top_level'][:args.top]:
+            print(f"    {cumulative_ms:>7.1f} ms  {module}")
+        results.append({'script': script, 'budget_ms': budget, 'import_ms': measured['import_ms'],
+                        'wall_ms': measured['wall_ms'], 'status': status,
+                        'top_level': [{'module': module, 'cumulative_ms': round(ms, 1)}
+                                      for ms, module in measured['top_level'][:args.top]]})
+
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'repeat': args.repeat, 'scripts': results}, f, indent=1)
+        print(f"Saved results to {args.output_file}")
+
+    if failures:
+        print(f"Startup check failed for {len(failures)} script(s): {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -51,8 +51,8 @@ const StationInfoPanel = ({ selectedStation }) => {
                 <div style={cellStyle}>
                     <span style={labelStyle}>Zuletzt</span>
                     <span style={valueStyle}>
-                        {selectedStation.mean_temperature !== undefined
-                            ? `${selectedStation.mean_temperature.toFixed(1)}°C`
+                        {selectedStation.temperature !== undefined
+                            ? `${selectedStation.temperature.toFixed(1)}°C`
                             : "N/A"}
                     </span>
                 </div>
@@ -124,11 +124,11 @@ const StationSearch = ({ stations, selectedStation, onStationSelect }) => {
                                     key={station.station_id || index}
                                     onClick={() => handleStationSelect(station)}
                                     className={`station-search-item ${selectedStation && selectedStation.station_id === station.station_id ? 'station-search-item-selected' : ''} ${focusedIndex === index ? 'station-search-item-focused' : ''}`}
-                                    title={`${station.station_name}: ${station.mean_temperature !== undefined ? `${station.mean_temperature.toFixed(1)}°C` : 'N/A'} | Luftfeuchtigkeit: ${station.humidity !== undefined ? `${station.humidity.toFixed(0)}%` : 'N/A'}`}
+                                    title={`${station.station_name}: ${station.temperature !== undefined ? `${station.temperature.toFixed(1)}°C` : 'N/A'} | Luftfeuchtigkeit: ${station.humidity !== undefined ? `${station.humidity.toFixed(0)}%` : 'N/A'}`}
                                 >
                                     <span>{station.station_name}</span>
                                     <span className="station-search-item-temperature">
-                                        {station.mean_temperature !== undefined ? `${station.mean_temperature.toFixed(1)}°C` : ''}
+                                        {station.temperature !== undefined ? `${station.temperature.toFixed(1)}°C` : ''}
                                     </span>
                                 </div>
                             ))
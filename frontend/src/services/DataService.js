@@ -1,20 +1,168 @@
 // Constants
 const DEBUG_MODE = process.env.NODE_ENV === 'development';
+// Payload layout written by extract_10min_station_data.py --payload-file
+const STATION_PAYLOAD_SCHEMA_VERSION = 1;
 
 /**
- * Service to fetch weather stations data from CSV file
- * @param {string} url - Name of the CSV file (default: '/active_stations_daily.csv')
+ * Build the URL of today's station data file in the bucket
+ * @param {string} extension - File extension ('csv' or 'json')
+ * @returns {string} URL of the file
+ */
+const todaysStationDataUrl = (extension) => {
+    // Get today's date in YYYYMMDD format
+    const today = new Date();
+    const year = today.getFullYear();
+    const month = String(today.getMonth() + 1).padStart(2, '0'); // Months are 0-indexed
+    const day = String(today.getDate()).padStart(2, '0');
+    return `/ist-es-gerade-warm/station_data/10min_station_data_${year}${month}${day}.${extension}`;
+};
+
+/**
+ * Decode the columnar station payload into station data objects
+ * @param {Object} payload - Parsed JSON payload
+ * @returns {Array} Array of station data objects
+ */
+export const decodeStationPayload = (payload) => {
+    if (payload.schema_version !== STATION_PAYLOAD_SCHEMA_VERSION) {
+        throw new Error(`Unsupported station payload schema version ${payload.schema_version}`);
+    }
+
+    const { columns, count } = payload;
+    const coordinate = (values, i) => values[i] / payload.coordinate_scale;
+    const metric = (name, i) => {
+        const values = columns[name];
+        return values && values[i] !== null ? values[i] / payload.value_scale : undefined;
+    };
+
+    const data = [];
+    for (let i = 0; i < count; i++) {
+        const dataDate = columns.data_date[i];
+        data.push({
+            station_id: String(columns.station_id[i]).padStart(5, '0'),
+            station_name: columns.station_name[i],
+            data_date: dataDate,
+            station_lat: coordinate(columns.lat, i),
+            station_lon: coordinate(columns.lon, i),
+            temperature: metric('temperature', i),
+            mean_temperature: metric('mean_temperature', i),
+            min_temperature: metric('min_temperature', i),
+            max_temperature: metric('max_temperature', i),
+            humidity: metric('humidity', i),
+            subtitle: `${dataDate ? dataDate + ' Uhr' : 'unbekannt'}`
+        });
+    }
+    return data;
+};
+
+/**
+ * Service to fetch weather stations data from the JSON payload
+ * @param {string} url - URL of the payload file
+ * @returns {Promise<Array>} Array of station data objects
+ */
+export const fetchLatestWeatherStationsPayload = async (url = todaysStationDataUrl('json')) => {
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error(`Failed to fetch data from ${url}: ${response.status} ${response.statusText}`);
+    }
+    return decodeStationPayload(await response.json());
+};
+
+// Station tiles written by station_tiles.py, see index.json for the zoom levels and tiles
+const STATION_TILES_URL = '/ist-es-gerade-warm/station_data/station_tiles';
+const STATION_TILE_SCHEMA_VERSION = 1;
+
+/**
+ * Web Mercator tile coordinates of a point
+ * @param {number} lat - Latitude
+ * @param {number} lon - Longitude
+ * @param {number} zoom - Integer zoom level
+ * @returns {Array} [x, y] of the tile
+ */
+const tileXY = (lat, lon, zoom) => {
+    const n = 2 ** zoom;
+    const latRad = Math.max(Math.min(lat, 85.05112878), -85.05112878) * Math.PI / 180;
+    const x = Math.floor((lon + 180) / 360 * n);
+    const y = Math.floor((1 - Math.asinh(Math.tan(latRad)) / Math.PI) / 2 * n);
+    return [Math.min(Math.max(x, 0), n - 1), Math.min(Math.max(y, 0), n - 1)];
+};
+
+/**
+ * Quadkey of a tile, one digit per zoom level
+ */
+const quadkey = (x, y, zoom) => {
+    let key = '';
+    for (let level = zoom; level > 0; level--) {
+        const mask = 1 << (level - 1);
+        key += ((x & mask) ? 1 : 0) + ((y & mask) ? 2 : 0);
+    }
+    return key;
+};
+
+/**
+ * Service to fetch only the stations of a viewport from the station tiles
+ * @param {Object} bounds - Viewport as { south, west, north, east } in degrees
+ * @param {number} zoom - Map zoom level, clamped to the zoom levels of the tiles
+ * @param {string} baseUrl - URL of the tiles directory
+ * @returns {Promise<Array>} Array of station data objects, thinned to the zoom level
+ */
+export const fetchStationsForView = async (bounds, zoom, baseUrl = STATION_TILES_URL) => {
+    const indexResponse = await fetch(`${baseUrl}/index.json`);
+    if (!indexResponse.ok) {
+        throw new Error(`Failed to fetch ${baseUrl}/index.json: ${indexResponse.status} ${indexResponse.statusText}`);
+    }
+    const index = await indexResponse.json();
+    if (index.tile_schema_version !== STATION_TILE_SCHEMA_VERSION) {
+        throw new Error(`Unsupported station tile schema version ${index.tile_schema_version}`);
+    }
+
+    const tileZoom = Math.min(Math.max(Math.round(zoom), index.min_zoom), index.max_zoom);
+    const available = index.tiles[String(tileZoom)] || {};
+    const [minX, minY] = tileXY(bounds.north, bounds.west, tileZoom);
+    const [maxX, maxY] = tileXY(bounds.south, bounds.east, tileZoom);
+
+    const keys = [];
+    for (let x = minX; x <= maxX; x++) {
+        for (let y = minY; y <= maxY; y++) {
+            const key = quadkey(x, y, tileZoom);
+            if (available[key]) keys.push(key);
+        }
+    }
+
+    const tiles = await Promise.all(keys.map(async (key) => {
+        const response = await fetch(`${baseUrl}/${tileZoom}/${key}.json`);
+        if (!response.ok) {
+            throw new Error(`Failed to fetch station tile ${tileZoom}/${key}: ${response.status} ${response.statusText}`);
+        }
+        return decodeStationPayload(await response.json());
+    }));
+    return tiles.flat();
+};
+
+/**
+ * Service to fetch weather stations data, preferring the JSON payload over the CSV file
+ * @param {string} url - Name of the CSV file (default: '/station_10min_data.csv')
  * @returns {Promise<Array>} Array of station data objects
  */
 export const fetchLatestWeatherStationsData = async (url = '/station_10min_data.csv') => {
+    if (!DEBUG_MODE) {
+        try {
+            return await fetchLatestWeatherStationsPayload();
+        } catch (error) {
+            console.warn('Falling back to the station CSV file:', error);
+        }
+    }
+    return fetchLatestWeatherStationsCsv(url);
+};
+
+/**
+ * Service to fetch weather stations data from CSV file
+ * @param {string} url - Name of the CSV file (default: '/station_10min_data.csv')
+ * @returns {Promise<Array>} Array of station data objects
+ */
+export const fetchLatestWeatherStationsCsv = async (url = '/station_10min_data.csv') => {
     try {
         if (!DEBUG_MODE) {
-            // Get today's date in YYYYMMDD format
-            const today = new Date();
-            const year = today.getFullYear();
-            const month = String(today.getMonth() + 1).padStart(2, '0'); // Months are 0-indexed
-            const day = String(today.getDate()).padStart(2, '0');
-            url = `/ist-es-gerade-warm/station_data/10min_station_data_${year}${month}${day}.csv`;
+            url = todaysStationDataUrl('csv');
         }
 
         const response = await fetch(url);
@@ -28,11 +176,8 @@ export const fetchLatestWeatherStationsData = async (url = '/station_10min_data.
 
         const lines = text.split('\n');
 
-        // Parse CSV data into array of station objects
-        const data = lines.slice(1).map(line => {
-            if (!line.trim()) return null; // Skip empty lines
-
-            // Custom parsing to handle commas within quoted fields
+        // Parse a CSV line, handling commas within quoted fields
+        const parseLine = (line) => {
             const cols = [];
             let currentValue = '';
             let inQuotes = false;
@@ -50,23 +195,42 @@ export const fetchLatestWeatherStationsData = async (url = '/station_10min_data.
                 }
             }
             cols.push(currentValue); // Add the last column
+            return cols;
+        };
+
+        // Map columns by header name, metric columns are not in a fixed order
+        const header = parseLine(lines[0].trim());
+        const index = Object.fromEntries(header.map((name, i) => [name, i]));
+        const value = (cols, name) => (index[name] !== undefined ? cols[index[name]] : undefined);
+        const number = (cols, name) => {
+            const raw = value(cols, name);
+            return raw === undefined || raw === '' ? undefined : parseFloat(raw);
+        };
+
+        // Parse CSV data into array of station objects
+        const data = lines.slice(1).map(line => {
+            if (!line.trim()) return null; // Skip empty lines
 
-            if (cols.length < 9) return null; // Ensure we have all required columns
+            const cols = parseLine(line);
+            if (cols.length < header.length) return null; // Ensure we have all required columns
 
             // Remove trailing commas and clean station name
-            const stationName = cols[1].replace(/,\s*$/, '').replace(/^"|"$/g, '');
+            const stationName = value(cols, 'station_name').replace(/,\s*$/, '').replace(/^"|"$/g, '');
+            const dataDate = value(cols, 'data_date');
 
             return {
-                station_id: cols[0],
+                station_id: value(cols, 'station_id'),
                 station_name: stationName,
-                data_date: cols[2],
-                station_lat: parseFloat(cols[3]), // Using city_lat for compatibility with CityMarker
-                station_lon: parseFloat(cols[4]), // Using city_lon for compatibility with CityMarker
-                mean_temperature: parseFloat(cols[7]),
-                min_temperature: parseFloat(cols[8]),
-                max_temperature: parseFloat(cols[6]),
-                humidity: parseFloat(cols[5]),
-                subtitle: `${cols[2] ? cols[2] + ' Uhr' : 'unbekannt'}`
+                data_date: dataDate,
+                station_lat: number(cols, 'lat'), // Using city_lat for compatibility with CityMarker
+                station_lon: number(cols, 'lon'), // Using city_lon for compatibility with CityMarker
+                // Older snapshots only carry the latest reading as mean_temperature
+                temperature: index.temperature !== undefined ? number(cols, 'temperature') : number(cols, 'mean_temperature'),
+                mean_temperature: number(cols, 'mean_temperature'),
+                min_temperature: number(cols, 'min_temperature'),
+                max_temperature: number(cols, 'max_temperature'),
+                humidity: number(cols, 'humidity'),
+                subtitle: `${dataDate ? dataDate + ' Uhr' : 'unbekannt'}`
             };
         }).filter(Boolean); // Remove null entries
 
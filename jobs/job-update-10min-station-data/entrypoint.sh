@@ -3,15 +3,44 @@
 # Get current date in YYYYMMDD format
 TODAY=$(date +"%Y%m%d")
 
+# Local history store of the 10-minute readings, mount a volume here to keep it across runs
+HISTORY_DIR=${HISTORY_DIR:-./data/history/10min}
+HISTORY_RETENTION_DAYS=${HISTORY_RETENTION_DAYS:-30}
+
+# Day-of-year climatology and the stations' HYRAS cells, the anomaly step is skipped without them
+CLIMATOLOGY_FILE=${CLIMATOLOGY_FILE:-./data/climatology/climatology.npz}
+CITIES_METADATA_FILE=${CITIES_METADATA_FILE:-./data/climatology/cities_metadata.csv}
+
+# Run reports of every step (JSON and Prometheus textfile), point a textfile collector at this directory
+REPORT_DIR=${REPORT_DIR:-./data/reports}
+mkdir -p "$REPORT_DIR"
+
+# Set PROFILE=1 to profile the fetch and extract steps, the profiles are written to PROFILE_DIR
+PROFILE=${PROFILE:-0}
+PROFILE_DIR=${PROFILE_DIR:-./data/profiles}
+
+# Report (and profiling) arguments of a step, e.g. $(report_args fetch_station_data)
+report_args() {
+    echo "--report-file $REPORT_DIR/$1.json --prometheus-file $REPORT_DIR/$1.prom"
+}
+profile_args() {
+    if [ "$PROFILE" = "1" ]; then
+        echo "--profile --profile-dir $PROFILE_DIR"
+    fi
+}
+
 echo "Starting data collection and processing for date: $TODAY"
 
 # 1. Fetch 10-minute station data
 echo "Fetching 10-minute station data..."
-python src/fetch_station_data.py --output-dir ./data --granularity 10min --type now
+python src/fetch_station_data.py --output-dir ./data --granularity 10min --type now $(report_args fetch_station_data) $(profile_args)
 
 # 2. Extract and process the data
 echo "Extracting and processing station data..."
-python src/extract_10min_station_data.py --data-dir ./data/now --reference-date $TODAY --output-file ./data/now/10min_station_data_$TODAY.csv
+python src/extract_10min_station_data.py --data-dir ./data/now --reference-date $TODAY --output-file ./data/now/10min_station_data_$TODAY.csv --payload-file ./data/now/10min_station_data_$TODAY.json --tiles-dir ./data/now/station_tiles --quality-file ./data/now/station_quality_$TODAY.csv --history-dir "$HISTORY_DIR" $(report_args extract_10min_station_data) $(profile_args)
+
+# Merge today's segments and drop readings older than the retention period
+python src/station_history.py compact --history-dir "$HISTORY_DIR" --retention-days "$HISTORY_RETENTION_DAYS"
 
 # 3. Check if the output file was created
 OUTPUT_FILE="./data/now/10min_station_data_${TODAY}.csv"
@@ -22,6 +51,19 @@ fi
 
 echo "Data processing complete. Output saved to $OUTPUT_FILE"
 
+# Compare the readings with the climatology
+UPLOAD_FILES=("$OUTPUT_FILE" "./data/now/10min_station_data_${TODAY}.json" "./data/now/station_tiles")
+if [ -f "$CLIMATOLOGY_FILE" ] && [ -f "$CITIES_METADATA_FILE" ]; then
+    echo "Computing anomalies against the climatology..."
+    ANOMALY_FILE="./data/now/station_anomalies_${TODAY}.csv"
+    python src/compute_live_anomalies.py --stations-file "$OUTPUT_FILE" --climatology "$CLIMATOLOGY_FILE" --cities-metadata "$CITIES_METADATA_FILE" --output-file "$ANOMALY_FILE"
+    if [ -f "$ANOMALY_FILE" ]; then
+        UPLOAD_FILES+=("$ANOMALY_FILE")
+    fi
+else
+    echo "No climatology found at $CLIMATOLOGY_FILE, skipping anomalies"
+fi
+
 # 4. Upload to S3
 echo "Uploading processed data to S3..."
 
@@ -31,18 +73,25 @@ if [ -z "$ACCESS_KEY" ] || [ -z "$SECRET_KEY" ] || [ -z "$BUCKET_NAME" ] || [ -z
     exit 1
 fi
 
-# Run the Python script for S3 upload
-python_output=$(python src/upload_to_s3.py --file $OUTPUT_FILE --bucket "$BUCKET_NAME" --region "$REGION" --endpoint-url "$ENDPOINT_URL" --directory "station_data" 2>&1)
-upload_exit_code=$?
+# Run the Python script for S3 upload of the CSV file, the frontend payload and the anomalies
+for UPLOAD_FILE in "${UPLOAD_FILES[@]}"; do
+    python_output=$(python src/upload_to_s3.py --file $UPLOAD_FILE --bucket "$BUCKET_NAME" --region "$REGION" --endpoint-url "$ENDPOINT_URL" --directory "station_data" $(report_args "upload_to_s3_$(basename "$UPLOAD_FILE" | cut -d. -f1)") 2>&1)
+    upload_exit_code=$?
 
-if [ $upload_exit_code -eq 0 ]; then
-    echo "Upload to S3 completed successfully."
-    echo "$python_output"
-else
-    echo "Upload to S3 failed with exit code $upload_exit_code"
-    echo "Error details:"
-    echo "$python_output"
-    exit $upload_exit_code
-fi
+    if [ $upload_exit_code -eq 0 ]; then
+        echo "Upload of $UPLOAD_FILE to S3 completed successfully."
+        echo "$python_output"
+    else
+        echo "Upload of $UPLOAD_FILE to S3 failed with exit code $upload_exit_code"
+        echo "Error details:"
+        echo "$python_output"
+        exit $upload_exit_code
+    fi
+done
+
+# Where did the time go?
+for REPORT_FILE in "$REPORT_DIR"/*.json; do
+    python src/instrumentation.py show --report-file "$REPORT_FILE"
+done
 
 echo "Job completed successfully!"
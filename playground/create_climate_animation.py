@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 import os
+import re
+import sys
+import shutil
 import argparse
+import subprocess
+import multiprocessing
 import xarray as xr
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
@@ -8,6 +13,21 @@ import numpy as np
 import pandas as pd
 from pathlib import Path
 from matplotlib.colors import Normalize
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'analysis' / 'common'))
+from instrumentation import add_report_arguments, configure_report, count, stage
+from profiling import add_profile_arguments, configure_profiling
+from artifact_cache import add_cache_arguments, code_version, open_cache
+
+# Number of frames sampled to estimate the color limits in fast mode
+COLOR_LIMIT_SAMPLE_FRAMES = 32
+# Height of the colorbar strip below each frame in fast mode
+COLORBAR_HEIGHT = 12
+# Year in HYRAS file names, e.g. tasmax_hyras_5_2019_v5-0_de.nc
+YEAR_PATTERN = re.compile(r'_(\d{4})_')
+# Pandas period frequencies of the --resample options
+RESAMPLE_FREQUENCIES = {'weekly': 'W', 'monthly': 'M'}
 
 
 def create_animation(file_path, output_format='gif', fps=10, dpi=100, year=None):
@@ -78,12 +98,13 @@ def create_animation(file_path, output_format='gif', fps=10, dpi=100, year=None)
         cmap = plt.get_cmap('viridis')
         
         # Calculate min/max values for consistent colormap scaling
-        if 'bnds' in dims:
-            min_val = float(ds[main_var].isel(bnds=0).min().values)
-            max_val = float(ds[main_var].isel(bnds=0).max().values)
-        else:
-            min_val = float(ds[main_var].min().values)
-            max_val = float(ds[main_var].max().values)
+        with stage('color_limits'):
+            if 'bnds' in dims:
+                min_val = float(ds[main_var].isel(bnds=0).min().values)
+                max_val = float(ds[main_var].isel(bnds=0).max().values)
+            else:
+                min_val = float(ds[main_var].min().values)
+                max_val = float(ds[main_var].max().values)
         
         print(f"Data range: {min_val:.2f} to {max_val:.2f}")
         norm = Normalize(vmin=min_val, vmax=max_val)
@@ -156,24 +177,26 @@ def create_animation(file_path, output_format='gif', fps=10, dpi=100, year=None)
         # Save the animation
         base_name = f"{main_var}_{year}_animation"
         
-        if output_format.lower() == 'mp4':
-            # For MP4 output
-            output_file = output_dir / f"{base_name}.mp4"
-            writer = animation.FFMpegWriter(fps=fps, metadata=dict(artist='Climate Data Tool'),
-                                          bitrate=1800)
-            ani.save(output_file, writer=writer, dpi=dpi)
-            print(f"Animation saved to: {output_file}")
+        with stage('render'):
+            if output_format.lower() == 'mp4':
+                # For MP4 output
+                output_file = output_dir / f"{base_name}.mp4"
+                writer = animation.FFMpegWriter(fps=fps, metadata=dict(artist='Climate Data Tool'),
+                                              bitrate=1800)
+                ani.save(output_file, writer=writer, dpi=dpi)
+                print(f"Animation saved to: {output_file}")
             
-        else:  # Default to GIF
-            output_file = output_dir / f"{base_name}.gif"
-            # Try using 'pillow' writer first, fall back to 'imagemagick' if needed
-            try:
-                ani.save(output_file, writer='pillow', fps=fps, dpi=dpi)
-            except:
-                print("Pillow writer failed, trying imagemagick...")
-                ani.save(output_file, writer='imagemagick', fps=fps, dpi=dpi)
+            else:  # Default to GIF
+                output_file = output_dir / f"{base_name}.gif"
+                # Try using 'pillow' writer first, fall back to 'imagemagick' if needed
+                try:
+                    ani.save(output_file, writer='pillow', fps=fps, dpi=dpi)
+                except:
+                    print("Pillow writer failed, trying imagemagick...")
+                    ani.save(output_file, writer='imagemagick', fps=fps, dpi=dpi)
                 
-            print(f"Animation saved to: {output_file}")
+                print(f"Animation saved to: {output_file}")
+            count(frames=num_days)
         
         # Close resources
         plt.close(fig)
@@ -184,6 +207,301 @@ def create_animation(file_path, output_format='gif', fps=10, dpi=100, year=None)
         print(f"Error creating animation: {e}")
 
 
+def build_color_lut(cmap_name='viridis'):
+    """Return a 256x3 uint8 RGB lookup table for a matplotlib colormap."""
+    cmap = plt.get_cmap(cmap_name)
+    return (cmap(np.linspace(0.0, 1.0, 256))[:, :3] * 255).round().astype(np.uint8)
+
+
+def select_variable(ds, var_name):
+    """Return a variable of the dataset, selecting the first value of a 'bnds' dimension if present."""
+    var = ds[var_name]
+    if 'bnds' in var.dims:
+        var = var.isel(bnds=0)
+    return var
+
+
+def find_variable_files(directory, var_name, start_year, end_year):
+    """Return the yearly HYRAS files ({var}_hyras_5_{year}_...nc) of a variable in a year range, sorted by year."""
+    files = []
+    for file_path in Path(directory).glob(f"{var_name}_*.nc"):
+        match = YEAR_PATTERN.search(file_path.name)
+        if match and start_year <= int(match.group(1)) <= end_year:
+            files.append((int(match.group(1)), file_path))
+    return [file_path for _, file_path in sorted(files)]
+
+
+def estimate_color_limits(files, var_name, percentiles=(1, 99)):
+    """Estimate color limits from percentiles of a sample of evenly spaced frames.
+
+    Reads COLOR_LIMIT_SAMPLE_FRAMES frames spread over all files instead of scanning the full
+    variable for min and max.
+    """
+    frames_per_file = max(1, -(-COLOR_LIMIT_SAMPLE_FRAMES // len(files)))
+    samples = []
+    for file_path in files:
+        with xr.open_dataset(file_path) as ds:
+            var = select_variable(ds, var_name)
+            num_frames = var.sizes['time']
+            sample_indices = np.unique(np.linspace(0, num_frames - 1, min(num_frames, frames_per_file)).astype(int))
+            samples.append(var.isel(time=sample_indices).values)
+    vmin, vmax = np.nanpercentile(np.concatenate(samples), percentiles)
+    return float(vmin), float(vmax)
+
+
+def iter_slabs(files, var_name, chunk_days, start_date=None, end_date=None):
+    """Yield (dates, values) chunks of consecutive frames from a sequence of files.
+
+    Files are opened one at a time and each chunk is read with a single read, so only one chunk of
+    frames is held in memory regardless of the length of the date range.
+    """
+    for file_path in files:
+        with xr.open_dataset(file_path) as ds:
+            var = select_variable(ds, var_name)
+            dates = pd.to_datetime(ds.time.values)
+            selected = np.ones(len(dates), dtype=bool)
+            if start_date is not None:
+                selected &= dates >= start_date
+            if end_date is not None:
+                selected &= dates <= end_date
+            time_indices = np.flatnonzero(selected)
+            if not len(time_indices):
+                continue
+
+            first, last = int(time_indices[0]), int(time_indices[-1]) + 1
+            for start in range(first, last, chunk_days):
+                stop = min(start + chunk_days, last)
+                yield dates[start:stop], var.isel(time=slice(start, stop)).values
+
+
+def iter_resampled(slabs, freq):
+    """Average chunks of daily frames into weekly ('W') or monthly ('M') frames on the fly.
+
+    Keeps a running sum and count of the current period, so periods may span chunk and file
+    boundaries. Yields (period start dates, mean frames) for every chunk that completes a period.
+    """
+    period = total = count = None
+    for dates, slab in slabs:
+        periods = dates.to_period(freq)
+        done_dates, done_frames = [], []
+        for index, day_period in enumerate(periods):
+            if day_period != period:
+                if period is not None:
+                    done_dates.append(period.start_time)
+                    done_frames.append((total / np.maximum(count, 1)).astype(np.float32)
+                                       * np.where(count > 0, 1, np.nan))
+                period = day_period
+                total = np.zeros(slab.shape[1:], dtype=np.float64)
+                count = np.zeros(slab.shape[1:], dtype=np.int32)
+            valid = np.isfinite(slab[index])
+            total[valid] += slab[index][valid]
+            count += valid
+
+        if done_frames:
+            yield pd.DatetimeIndex(done_dates), np.stack(done_frames)
+
+    if period is not None:
+        frame = (total / np.maximum(count, 1)).astype(np.float32) * np.where(count > 0, 1, np.nan)
+        yield pd.DatetimeIndex([period.start_time]), frame[np.newaxis]
+
+
+def iter_panels(slab_iterators):
+    """Zip the chunks of several variables into (dates, [values per variable]) chunks."""
+    for chunks in zip(*slab_iterators):
+        dates = chunks[0][0]
+        if any(len(other_dates) != len(dates) or (other_dates != dates).any() for other_dates, _ in chunks[1:]):
+            raise ValueError("Variables do not share the same time steps")
+        yield dates, [slab for _, slab in chunks]
+
+
+def colorize_frames(slab, lut, vmin, vmax, scale):
+    """Map a (time, y, x) slab to RGB frames with the lookup table.
+
+    Frames are flipped vertically (origin='lower'), upscaled by an integer factor, padded to even
+    dimensions for the video encoder and get a colorbar strip at the bottom. NaN cells are black.
+    """
+    scaled = (np.nan_to_num(slab, nan=vmin) - vmin) / (vmax - vmin)
+    indices = np.clip((scaled * 255).round(), 0, 255).astype(np.uint8)
+    frames = lut[indices[:, ::-1, :]]
+    frames[np.isnan(slab[:, ::-1, :])] = 0
+
+    if scale > 1:
+        frames = frames.repeat(scale, axis=1).repeat(scale, axis=2)
+
+    num_frames, height, width, _ = frames.shape
+    colorbar = lut[np.linspace(0, 255, width).astype(np.uint8)]
+    out = np.zeros((num_frames, height + COLORBAR_HEIGHT + (height + COLORBAR_HEIGHT) % 2,
+                    width + width % 2, 3), dtype=np.uint8)
+    out[:, :height, :width] = frames
+    out[:, height:height + COLORBAR_HEIGHT, :width] = colorbar[None, None, :, :]
+    return out
+
+
+def colorize_panels(slabs, lut, limits, scale):
+    """Colorize the slabs of several variables and place the panels side by side."""
+    return np.concatenate([colorize_frames(slab, lut, vmin, vmax, scale)
+                           for slab, (vmin, vmax) in zip(slabs, limits)], axis=2)
+
+
+def open_encoder(output_file, output_format, fps, width, height):
+    """Start an ffmpeg process reading raw RGB frames from stdin, or return None if ffmpeg is missing."""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return None
+
+    command = [ffmpeg, '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{width}x{height}", '-r', str(fps), '-i', '-']
+    if output_format == 'mp4':
+        command += ['-c:v', 'libx264', '-preset', 'fast', '-pix_fmt', 'yuv420p', str(output_file)]
+    else:
+        command += ['-filter_complex', '[0:v]split[a][b];[a]palettegen[p];[b][p]paletteuse', str(output_file)]
+    return subprocess.Popen(command, stdin=subprocess.PIPE)
+
+
+def encode_frames(panels, output_file, output_format, fps, lut, limits, scale=1, workers=None):
+    """Colorize chunks of frames in worker processes and stream them to the encoder.
+
+    `panels` yields (dates, [values per variable]) chunks. At most 2 * workers chunks are in flight,
+    so memory stays bounded no matter how many frames are encoded (except for the Pillow GIF
+    fallback, which has to keep all frames). Returns the number of frames written.
+    """
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    encoder = None
+    encoder_started = False
+    gif_frames = []
+    frame_count = 0
+
+    def write(frames):
+        nonlocal encoder, encoder_started
+        if not encoder_started:
+            # The frame size is only known once the first chunk is colorized
+            encoder = open_encoder(output_file, output_format, fps, frames.shape[2], frames.shape[1])
+            encoder_started = True
+            if encoder is None and output_format == 'mp4':
+                raise RuntimeError("ffmpeg is required for MP4 output in fast mode")
+        if encoder is not None:
+            encoder.stdin.write(frames.tobytes())
+        else:
+            # Without ffmpeg, collect the frames for Pillow's GIF writer
+            gif_frames.extend(Image.fromarray(frame) for frame in frames)
+
+    with multiprocessing.Pool(workers) as pool:
+        pending = []
+        for _, slabs in panels:
+            pending.append(pool.apply_async(colorize_panels, (slabs, lut, limits, scale)))
+            if len(pending) >= 2 * workers:
+                frames = pending.pop(0).get()
+                write(frames)
+                frame_count += len(frames)
+        for result in pending:
+            frames = result.get()
+            write(frames)
+            frame_count += len(frames)
+
+    if encoder is not None:
+        encoder.stdin.close()
+        if encoder.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed with exit code {encoder.returncode}")
+    elif gif_frames:
+        gif_frames[0].save(output_file, save_all=True, append_images=gif_frames[1:],
+                           duration=int(1000 / fps), loop=0)
+
+    return frame_count
+
+
+def create_animation_fast(file_path, output_format='gif', fps=10, year=None, workers=None,
+                          chunk_days=32, scale=2, vmin=None, vmax=None, variables=None,
+                          start_year=None, end_year=None, resample='daily', cache=None):
+    """
+    Create an animation without matplotlib's drawing pipeline.
+
+    Streams the frames of one file, or of all yearly files of a directory between start_year and
+    end_year, in chunks of `chunk_days` frames. Several variables are rendered as panels side by side,
+    and frames can be averaged to weekly or monthly means on the fly. Color limits are derived from
+    a sample of frames unless given. Frames are colorized with a lookup table in worker processes and
+    piped to ffmpeg. Frames have a colorbar strip per panel but no title or axes. With a cache, an
+    animation of unchanged files with the same rendering options is copied from the cache.
+    """
+    variables = variables or ["tasmax"]
+    try:
+        if os.path.isdir(file_path):
+            start_year = start_year or year
+            end_year = end_year or year or start_year
+            if start_year is None:
+                print("Please specify a year or a year range when providing a directory")
+                return
+
+            files_by_var = {var_name: find_variable_files(file_path, var_name, start_year, end_year)
+                            for var_name in variables}
+            missing = [var_name for var_name, files in files_by_var.items() if not files]
+            if missing:
+                print(f"No NetCDF files found for {', '.join(missing)} in {start_year}-{end_year}")
+                return
+            label = str(start_year) if start_year == end_year else f"{start_year}-{end_year}"
+        else:
+            files_by_var = {var_name: [Path(file_path)] for var_name in variables}
+            with xr.open_dataset(file_path) as ds:
+                missing = [var_name for var_name in variables if var_name not in ds.data_vars]
+                if missing:
+                    print(f"Error: {missing} not found in dataset. Available variables: {list(ds.data_vars)}")
+                    return
+                label = str(year or pd.to_datetime(ds.time.values[0]).year)
+
+        start_date = pd.Timestamp(f"{start_year}-01-01") if start_year else None
+        end_date = pd.Timestamp(f"{end_year}-12-31") if end_year else None
+
+        output_dir = Path("./data/animations")
+        output_dir.mkdir(exist_ok=True, parents=True)
+        suffix = "" if resample == 'daily' else f"_{resample}"
+        output_file = output_dir / f"{'_'.join(variables)}_{label}{suffix}_animation.{output_format}"
+
+        key = None
+        if cache is not None:
+            # chunk_days and workers only change how the frames are computed, not the frames
+            key = cache.key(inputs=[path for files in files_by_var.values() for path in files],
+                            params={'variables': variables, 'format': output_format, 'fps': fps, 'scale': scale,
+                                    'vmin': vmin, 'vmax': vmax, 'start_date': start_date, 'end_date': end_date,
+                                    'resample': resample},
+                            code=code_version(__file__))
+            meta = cache.restore(key, {'animation': output_file})
+            if meta is not None:
+                print(f"Animation with {meta['frames']} frames restored from the cache to: {output_file}")
+                return
+
+        limits = []
+        for var_name, files in files_by_var.items():
+            print(f"Animating {var_name} from {len(files)} file(s)")
+            var_min, var_max = vmin, vmax
+            if var_min is None or var_max is None:
+                with stage('color_limits'):
+                    estimated_min, estimated_max = estimate_color_limits(files, var_name)
+                var_min = estimated_min if var_min is None else var_min
+                var_max = estimated_max if var_max is None else var_max
+            print(f"Color limits of {var_name}: {var_min:.2f} to {var_max:.2f}")
+            limits.append((var_min, var_max))
+
+        slab_iterators = []
+        for var_name, files in files_by_var.items():
+            slabs = iter_slabs(files, var_name, chunk_days, start_date, end_date)
+            if resample != 'daily':
+                slabs = iter_resampled(slabs, RESAMPLE_FREQUENCIES[resample])
+            slab_iterators.append(slabs)
+
+        lut = build_color_lut('viridis')
+        # Reading, colorizing and encoding are interleaved, so they are measured as one stage
+        with stage('encode'):
+            frame_count = encode_frames(iter_panels(slab_iterators), output_file, output_format, fps,
+                                        lut, limits, scale, workers)
+            count(frames=frame_count)
+
+        print(f"Animation with {frame_count} frames saved to: {output_file}")
+        if key is not None:
+            cache.put(key, {'animation': output_file}, meta={'frames': frame_count})
+
+    except Exception as e:
+        print(f"Error creating animation: {e}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Create animations from NetCDF climate data")
     parser.add_argument("--file", type=str, help="Path to NetCDF file or directory containing NetCDF files",
@@ -193,14 +511,37 @@ def main():
     parser.add_argument("--fps", type=int, default=10, help="Frames per second")
     parser.add_argument("--dpi", type=int, default=100, help="DPI for output animation")
     parser.add_argument("--year", type=int, help="Specific year to animate (required if file is a directory)")
+    parser.add_argument("--fast", action="store_true",
+                        help="Render frames with a color lookup table and pipe them to ffmpeg instead of matplotlib")
+    parser.add_argument("--workers", type=int, help="Number of worker processes in fast mode")
+    parser.add_argument("--chunk-days", type=int, default=32, help="Frames read per NetCDF read in fast mode")
+    parser.add_argument("--scale", type=int, default=2, help="Integer upscaling factor of the grid in fast mode")
+    parser.add_argument("--vmin", type=float, help="Lower color limit in fast mode (default: 1st percentile)")
+    parser.add_argument("--vmax", type=float, help="Upper color limit in fast mode (default: 99th percentile)")
+    parser.add_argument("--var", action="append",
+                        help="Variable to animate, can be given multiple times for side-by-side panels (implies --fast)")
+    parser.add_argument("--start-year", type=int, help="First year of a multi-year animation (implies --fast)")
+    parser.add_argument("--end-year", type=int, help="Last year of a multi-year animation (implies --fast)")
+    parser.add_argument("--resample", type=str, choices=['daily', 'weekly', 'monthly'], default='daily',
+                        help="Average frames to weekly or monthly means (implies --fast when not daily)")
+    add_report_arguments(parser)
+    add_profile_arguments(parser)
+    add_cache_arguments(parser)
     
     args = parser.parse_args()
+    configure_report('create_climate_animation', args)
+    configure_profiling('create_climate_animation', args, './data/animations')
     
-    if os.path.isdir(args.file) and args.year is None:
-        print("Error: When providing a directory, you must specify a year with --year")
+    if os.path.isdir(args.file) and args.year is None and args.start_year is None:
+        print("Error: When providing a directory, you must specify a year with --year or --start-year")
         return
         
-    create_animation(args.file, args.format, args.fps, args.dpi, args.year)
+    if args.fast or args.var or args.start_year or args.end_year or args.resample != 'daily':
+        create_animation_fast(args.file, args.format, args.fps, args.year, args.workers,
+                              args.chunk_days, args.scale, args.vmin, args.vmax, args.var,
+                              args.start_year, args.end_year, args.resample, open_cache(args))
+    else:
+        create_animation(args.file, args.format, args.fps, args.dpi, args.year)
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,6 @@
 import os
+import sys
+import glob
 import argparse
 import xarray as xr
 import matplotlib.pyplot as plt
@@ -6,6 +8,145 @@ import numpy as np
 import pandas as pd
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'analysis' / 'common'))
+from profiling import add_profile_arguments, configure_profiling
+
+# Number of reservoir samples kept for approximate percentiles
+DEFAULT_SAMPLE_SIZE = 100000
+
+
+class StreamingStats:
+    """Single-pass statistics of a stream of array chunks.
+
+    Mean and variance are merged chunk by chunk with Chan's parallel variant of Welford's algorithm,
+    so the result is numerically stable without holding more than one chunk. Approximate percentiles
+    come from a uniform reservoir sample: every value gets a random key and the values with the
+    `sample_size` smallest keys are kept.
+    """
+
+    def __init__(self, sample_size=0, seed=None):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.total = 0
+        self.nan_count = 0
+        self.fill_count = 0
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+        self.sample_keys = np.empty(0)
+        self.sample_values = np.empty(0)
+
+    def update(self, values, fill_mask=None):
+        """Add a chunk of values. Cells in `fill_mask` are counted as fill values and skipped."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self.total += values.size
+        valid = np.isfinite(values)
+        if fill_mask is not None:
+            fill_mask = np.asarray(fill_mask).ravel()
+            self.fill_count += int(np.count_nonzero(fill_mask))
+            self.nan_count += int(np.count_nonzero(~valid & ~fill_mask))
+            valid &= ~fill_mask
+        else:
+            self.nan_count += int(np.count_nonzero(~valid))
+
+        values = values[valid]
+        if not values.size:
+            return
+
+        chunk_count = values.size
+        chunk_mean = values.mean()
+        chunk_m2 = np.square(values - chunk_mean).sum()
+
+        count = self.count + chunk_count
+        delta = chunk_mean - self.mean
+        self.mean += delta * chunk_count / count
+        self.m2 += chunk_m2 + delta * delta * self.count * chunk_count / count
+        self.count = count
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        if self.sample_size:
+            keys = np.concatenate([self.sample_keys, self.rng.random(chunk_count)])
+            candidates = np.concatenate([self.sample_values, values])
+            if keys.size > self.sample_size:
+                keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+                keys, candidates = keys[keep], candidates[keep]
+            self.sample_keys, self.sample_values = keys, candidates
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else float('nan')
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.variance))
+
+    def percentiles(self, percentiles):
+        """Approximate percentiles from the reservoir sample."""
+        if not self.sample_values.size:
+            return [float('nan')] * len(percentiles)
+        return [float(value) for value in np.percentile(self.sample_values, percentiles)]
+
+
+def iter_variable_chunks(file_paths, var_name, chunk_size):
+    """Yield (values, fill mask) chunks of a variable along its first dimension, file by file.
+
+    Files are opened without masking so fill values can be told apart from NaN, and the scale
+    factor and offset are applied per chunk.
+    """
+    for file_path in file_paths:
+        with xr.open_dataset(file_path, mask_and_scale=False) as ds:
+            if var_name not in ds.variables:
+                print(f"  ⚠️ Variable '{var_name}' not found in {os.path.basename(file_path)}, skipping")
+                continue
+
+            var = ds[var_name]
+            if 'bnds' in var.dims:
+                var = var.isel(bnds=0)
+            fill_values = [var.attrs[attr] for attr in ('_FillValue', 'missing_value') if attr in var.attrs]
+            scale_factor = var.attrs.get('scale_factor', 1)
+            add_offset = var.attrs.get('add_offset', 0)
+
+            length = var.shape[0] if var.ndim else 1
+            for start in range(0, length, chunk_size):
+                raw = var.isel({var.dims[0]: slice(start, start + chunk_size)}).values if var.ndim else var.values
+                fill_mask = np.zeros(raw.shape, dtype=bool)
+                for fill_value in np.ravel(fill_values):
+                    fill_mask |= raw == fill_value
+                values = raw.astype(np.float64)
+                if scale_factor != 1 or add_offset != 0:
+                    values = values * scale_factor + add_offset
+                yield values, fill_mask
+
+
+def compute_variable_stats(file_paths, var_name, chunk_size=32, sample_size=0, seed=None):
+    """Compute streaming statistics of a variable over one or many files in a single pass."""
+    stats = StreamingStats(sample_size=sample_size, seed=seed)
+    for values, fill_mask in iter_variable_chunks(file_paths, var_name, chunk_size):
+        stats.update(values, fill_mask)
+    return stats
+
+
+def print_variable_stats(var_name, file_paths, stats, percentiles=None):
+    """Print the statistics computed by compute_variable_stats."""
+    print(f"\n📊 STATISTICS FOR {var_name} ({len(file_paths)} file(s))")
+    print(f"    - Values: {stats.total}")
+    print(f"    - Valid: {stats.count}")
+    print(f"    - NaN: {stats.nan_count}")
+    print(f"    - Fill values: {stats.fill_count}")
+    if stats.count:
+        print(f"    - Mean: {stats.mean:.2f}")
+        print(f"    - Min: {stats.min:.2f}")
+        print(f"    - Max: {stats.max:.2f}")
+        print(f"    - Std Dev: {stats.std:.2f}")
+        if percentiles:
+            print(f"    - Approximate percentiles ({stats.sample_values.size} samples):")
+            for percentile, value in zip(percentiles, stats.percentiles(percentiles)):
+                print(f"      P{percentile:g}: {value:.2f}")
+
+
 def list_netcdf_files(directory):
     """List all NetCDF files in the specified directory."""
     netcdf_files = []
@@ -312,12 +453,35 @@ def explore_netcdf(file_path, specific_var=None):
 
 def main():
     parser = argparse.ArgumentParser(description="Debug and explore NetCDF files")
-    parser.add_argument("--file", type=str, help="Path to a specific NetCDF file to explore", required=True)
+    parser.add_argument("--file", type=str, required=True,
+                        help="Path to a specific NetCDF file to explore, or a glob of files with --stats")
     parser.add_argument("--var", type=str, help="Specific variable name to explore (e.g., tasmax)")
+    parser.add_argument("--stats", action="store_true",
+                        help="Only compute single-pass, chunked statistics of --var over all matching files")
+    parser.add_argument("--chunk-size", type=int, default=32,
+                        help="Number of steps along the first dimension read at once in --stats mode")
+    parser.add_argument("--percentiles", type=str,
+                        help="Comma-separated approximate percentiles to report in --stats mode, e.g. 1,50,99")
+    parser.add_argument("--sample-size", type=int, default=DEFAULT_SAMPLE_SIZE,
+                        help="Reservoir sample size for the approximate percentiles")
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
+    configure_profiling('debug_netcdf', args)
     
-    if os.path.exists(args.file):
+    if args.stats:
+        file_paths = sorted(glob.glob(args.file))
+        if not file_paths:
+            print(f"No files match {args.file}")
+            return
+        if not args.var:
+            print("Error: --stats requires --var")
+            return
+        percentiles = [float(p) for p in args.percentiles.split(',')] if args.percentiles else None
+        stats = compute_variable_stats(file_paths, args.var, args.chunk_size,
+                                       args.sample_size if percentiles else 0)
+        print_variable_stats(args.var, file_paths, stats, percentiles)
+    elif os.path.exists(args.file):
         explore_netcdf(args.file, args.var)
     else:
         print(f"File {args.file} does not exist")